@@ -11,38 +11,77 @@
 
 # Import modules and enable data to be overwritten
 import urllib
-import urllib2
 import httplib
 import json
 import sys
 import os
 import datetime
 import time
-import arcpy
-arcpy.env.overwriteOutput = True
+import math
+import csv
+import socket
+import functools
+import re
+import numpy
+from multiprocessing.pool import ThreadPool
+import ArcGISServerConnection
+import ArcGISServerToken
+import ArcGISServerCatalog
+import LatencyHistogram
+import ArcGISServerMessages
+
+# Headers sent with every request to the server
+headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain"}
+# Number of requests to send to the server at the same time
+maxConcurrency = 8
+# Number of times to retry a service operation that fails to reach the server, and the seconds to wait before the first retry
+operationRetries = 2
+retryDelay = 1
+# File to keep tokens in between runs e.g. ArcGISServerToken.defaultCacheFile, blank to only cache them for this run
+tokenCacheFile = ""
+# File to keep the list of folders and services in between runs e.g. ArcGISServerCatalog.defaultCatalogFile, blank to only keep it for this run
+catalogFile = ""
+# Columns parsed from the "Extent:" log messages and the pattern to pick them out of the text
+extentColumns = ["time", "xmin", "ymin", "xmax", "ymax", "width", "height", "scale"]
+extentPattern = re.compile(r"^(\d+)\|Extent:([^,;\n]+),([^,;\n]+),([^,;\n]+),([^,;\n]+)(?=;|$)(?=(?:[^\n]*?;Size:([^,;\n]+),([^,;\n]+)(?=;|$))?)(?=(?:[^\n]*?;Scale:([^;\n]+))?)", re.MULTILINE)
+# Fields written to the extents feature class and the number of rows to write at a time
+extentFields = ["SHAPE@WKT", "EventDate", "Scale", "InvScale", "Width", "Height"]
+insertBatchSize = 10000
+# Cell size and search radius in map units for the density grid, and the most cells to create
+densityCellSize = 50
+densitySearchRadius = 20000
+maxDensityCells = 25000000
               
 # Re-usable function to get a token required for admin changes
 def gentoken(server, port, adminUser, adminPass, expiration=60):
     
+    # Use the cached token for the server if it has not expired
+    tokenSite = "http://{}:{}".format(server, port)
+    cachedToken = ArcGISServerToken.getCachedToken(tokenSite, adminUser, adminPass, "requestip", tokenCacheFile, lambda: gentoken(server, port, adminUser, adminPass, expiration))
+    if cachedToken:
+        return cachedToken
+    
     query_dict = {'username':   adminUser,
                   'password':   adminPass,
                   'expiration': str(expiration),
                   'client':     'requestip'}
     
     query_string = urllib.urlencode(query_dict)
-    url = "http://{}:{}/arcgis/admin/generateToken?f=json".format(server, port)
+    url = "/arcgis/admin/generateToken?f=json"
    
     try:
-        token = json.loads(urllib2.urlopen(url, query_string).read())
+        response, data = ArcGISServerConnection.request(server, port, "http", "POST", url, query_string, headers, idempotent=True)
+        token = json.loads(data)
         if "token" not in token or token == None:
             print "Failed to get token, return message from server:"
             print token['messages']
             sys.exit()
         else:
-            # Return the token to the function which called for it
+            # Cache the token until it expires and return it to the function which called for it
+            ArcGISServerToken.storeToken(tokenSite, adminUser, adminPass, "requestip", token['token'], token.get('expires'), tokenCacheFile, lambda: gentoken(server, port, adminUser, adminPass, expiration))
             return token['token']
     
-    except urllib2.URLError, e:
+    except (socket.error, httplib.HTTPException), e:
         print "Could not connect to machine {} on port {}".format(server, port)
         print e
         sys.exit()
@@ -55,36 +94,137 @@ def gentoken(server, port, adminUser, adminPass, expiration=60):
 # stopStart = Stop|Start|Delete
 # serviceList = List of services. A service must be in the <name>.<type> notation
 # If a token exists, you can pass one in for use.  
-def stopStartServices(server, port, adminUser, adminPass, stopStart, serviceList, token=None):    
+# Up to concurrency services are actioned at once. batches is an optional ordered list of folder groups
+# e.g. "Base,Imagery;Operational" - services in each group are done before moving on to the next group
+# and any services not in a group are done last, use ROOT for the services in the root folder.
+# A table of the results is written to resultsFile as CSV, or printed if no file is given.
+def stopStartServices(server, port, adminUser, adminPass, stopStart, serviceList, token=None, concurrency=maxConcurrency, batches=None, resultsFile=None):    
     
     # Get and set the token
     if token is None:       
         token = gentoken(server, port, adminUser, adminPass)    
     
     if serviceList == "all":
-        serviceList = getServiceList(server, port, adminUser, adminPass, token)
+        serviceList = getCatalogServices(server, port, token)
     else: 
         serviceList = [serviceList]
         
+    concurrency = max(1, int(concurrency))
+    operationStart = time.time()
+    results = []
         
-    # modify the services(s)    
-    for service in serviceList:
-        op_service_url = "http://{}:{}/arcgis/admin/services/{}/{}?token={}&f=json".format(server, port, service, stopStart, token)
-        status = urllib2.urlopen(op_service_url, ' ').read()
-        
-        if 'success' in status:
-            print stopStart + " successfully performed on " + service
-        else: 
-            print "Failed to perform operation. Returned message from the server:"
-            print status
+    # modify the services(s), a batch at a time
+    pool = ThreadPool(concurrency)
+    try:
+        for batch in getServiceBatches(serviceList, batches):
+            if len(batch) == 0:
+                continue
+            operations = [(server, port, token, stopStart, service) for service in batch]
+            for result in pool.imap(serviceOperation, operations):
+                if result["status"] == "success":
+                    print stopStart + " successfully performed on " + result["service"]
+                else: 
+                    print "Failed to perform operation on " + result["service"] + ". Returned message from the server:"
+                    print result["message"]
+                results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    printTimings(time.time() - operationStart, [result["seconds"] for result in results])
+    writeResultsTable(results, resultsFile)
     
-    return 
+    return results
+
+
+# Function to split a list of services into ordered batches by folder
+def getServiceBatches(serviceList, batches):
+    if not batches:
+        return [serviceList]
+
+    folderBatches = [[folder.strip() for folder in batch.split(",") if folder.strip()] for batch in batches.split(";")]
+    serviceBatches = [[] for batch in folderBatches]
+    lastBatch = []
+    for service in serviceList:
+        # Services in a folder are listed as folder//service
+        if "/" in service:
+            folder = service.split("/")[0]
+        else:
+            folder = "ROOT"
+        for index, folderBatch in enumerate(folderBatches):
+            if folder in folderBatch:
+                serviceBatches[index].append(service)
+                break
+        else:
+            lastBatch.append(service)
+    serviceBatches.append(lastBatch)
+    return serviceBatches
+
+
+# Function to perform an operation on a service, retrying if the server could not be reached
+# Takes a tuple of (server, port, token, operation, service) so it can be mapped over a pool
+def serviceOperation(operation):
+    server, port, token, stopStart, service = operation
+    op_service_url = "/arcgis/admin/services/{}/{}?token={}&f=json".format(service, stopStart, token)
+
+    operationStart = time.time()
+    attempts = 0
+    status = "failed"
+    message = ""
+    while attempts <= operationRetries:
+        attempts += 1
+        try:
+            response, data = ArcGISServerConnection.request(server, port, "http", "POST", op_service_url, ' ', headers)
+            # Server errors may be transient so are retried, other responses will not change on a retry
+            if (response.status >= 500):
+                message = "HTTP " + str(response.status) + " " + response.reason
+                # The server may have deleted the service before the error, so a delete is only sent once
+                if (stopStart == "delete"):
+                    break
+            elif 'success' in data:
+                status = "success"
+                message = ""
+                break
+            else:
+                message = data
+                break
+        except ArcGISServerConnection.CircuitOpenError, e:
+            # The server has been failing, retrying now would only fail fast again
+            message = str(e)
+            break
+        except (httplib.HTTPException, socket.error), e:
+            message = str(e) or type(e).__name__
+            # A delete that timed out or lost its response may still have gone through on the server, so it is not sent again
+            if (stopStart == "delete"):
+                break
+        # Wait longer after each failed attempt
+        if attempts <= operationRetries:
+            time.sleep(retryDelay * (2 ** (attempts - 1)))
+
+    return {"service": service, "operation": stopStart, "status": status, "attempts": attempts, "seconds": round(time.time() - operationStart, 3), "message": message}
+
+
+# Function to write the results of the service operations as a CSV table
+def writeResultsTable(results, resultsFile=None):
+    if resultsFile:
+        tableFile = open(resultsFile, "wb")
+    else:
+        tableFile = sys.stdout
+    writer = csv.writer(tableFile)
+    writer.writerow(["Service", "Operation", "Status", "Attempts", "Seconds", "Message"])
+    for result in results:
+        writer.writerow([result["service"], result["operation"], result["status"], result["attempts"], result["seconds"], result["message"].replace("\n", " ")])
+    if resultsFile:
+        tableFile.close()
+        print "Results written to " + resultsFile
+
        
 # Function to create feature class from extents queried
-def generateFCExtent(server, port, adminUser, adminPass, logFC, mapService, workspace, featureClass, raster, token=None):
+# If a state file is given the feature class is updated incrementally - only logs newer than the last run
+# are queried and their extents are appended to the existing feature class.
+def generateFCExtent(server, port, adminUser, adminPass, logFC, mapService, workspace, featureClass, raster, token=None, stateFile=None):
 
     millisecondsToQuery = 6048000000 # One week 
-    hitDict = {}
     
     if token is None:    
         token = gentoken(server, port, adminUser, adminPass) 
@@ -103,155 +243,146 @@ def generateFCExtent(server, port, adminUser, adminPass, logFC, mapService, work
     if not fullExtent:
         return
 
-    # Construct URL to query the logs
-    logQueryURL = "/arcgis/admin/logs/query"
+    # Carry on from the last run if there is one
+    state = readState(stateFile)
+    append = "lastTime" in state
+
+    # Construct the filter and time window to query the logs
     logFilter = "{'services': ['" + mapService + "']}"
     startTime = int(round(time.time() * 1000))
-    endTime = startTime - millisecondsToQuery
-      
-    # Supply the log level, filter, token, and return format
-    params = urllib.urlencode({'level': 'FINE', 'startTime': startTime, 'endTime': endTime,'filter': logFilter, 'token': token, 'f': 'json', 'pageSize':10000})
-    
-    headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain"}
+    endTime = max(startTime - millisecondsToQuery, state.get("lastTime", 0))
     
-    # Connect to URL and post parameters
+    # Parse the extents from all the messages, a page of logs at a time
     print "Accessing Logs..."
-    httpConn = httplib.HTTPConnection(server, port)
-    httpConn.request("POST", logQueryURL, params, headers)
+    try:
+        extents = parseExtentMessages(newLogMessages(queryLogs(server, port, token, startTime, endTime, logFilter), state))
+    # Leave the feature class and state as they were if the logs could not all be read
+    except (httplib.HTTPException, socket.error), e:
+        print e
+        return
     
-    # Read response
-    response = httpConn.getresponse()
-    if (response.status != 200):
-        httpConn.close()
-        print "  Error while querying logs."
-        return    
-    else:
-        data = response.read()
-        
-        # Check that data returned is not an error object
-        if not assertJsonSuccess(data):
-            print "  Error returned by operation. " + data
-        else:
-            print "  Operation completed successfully!"
-        
-        # Deserialize response into Python object
-        dataObj = json.loads(data)
-        httpConn.close()
-        
-        # Open Insert Cursor on output
-        output = openCursor( workspace, featureClass, fullExtent[ "spatialReference"][ "wkid"])
-        
-        if not output:
-            return
-        
-        # Need this variable to track number of events found for ExportMapImage call
-        logEvents = 0
-        
-        # Need Array to hold Shape
-        shapeArray = arcpy.Array()
-        
-        # Iterate over messages
-        for item in dataObj[ "logMessages"]:
-            eventDateTime = datetime.datetime.fromtimestamp( float( item[ "time"]) / 1000)
-            
-            if item[ "message"].startswith( "Extent:"):
-                eventScale = None        # Scale
-                eventInvScale = None    # Inverse-Scale
-                eventWidth = None        # Width
-                eventHeight = None    # Height
-                
-                # Cycle through message details
-                for pair in item[ "message"].replace(" ", "").split( ";"):
-                    if pair.count( ":") == 1:
-                        key, val = pair.split( ":")
-                        
-                        # Pick out Extent
-                        if key == "Extent" and val.count( ",") == 3:
-                            # Split into ordinate values
-                            MinX, MinY, MaxX, MaxY = val.split( ",")
-                            MinX = float( MinX)
-                            MinY = float( MinY)
-                            MaxX = float( MaxX)
-                            MaxY = float( MaxY)
-                            
-                            # Make sure extent is within range
-                            if MinX > fullExtent[ "xmin"] and MaxX < fullExtent[ "xmax"] and MinY > fullExtent[ "ymin"] and MaxY < fullExtent[ "ymax"]:
-                                shapeArray.add( arcpy.Point( MinX, MinY))
-                                shapeArray.add( arcpy.Point( MinX, MaxY))
-                                shapeArray.add( arcpy.Point( MaxX, MaxY))
-                                shapeArray.add( arcpy.Point( MaxX, MinY))
-                                shapeArray.add( arcpy.Point( MinX, MinY))
-                        
-                        # Pick out Size
-                        if key == "Size" and val.count( ",") == 1:
-                            eventWidth, eventHeight = val.split( ",")
-                            eventWidth = float( eventWidth)
-                            eventHeight = float( eventHeight)
-                        
-                        # Pick out Scale
-                        if key == "Scale":
-                            eventScale = float( val)
-                            eventInvScale = 1 / eventScale
-                
-                # Save if Shape created
-                if shapeArray.count > 0:
-                    # Create new row
-                    newRow = output.newRow()
-                    
-                    # Add Shape and Event Date
-                    newRow.setValue( "Shape", shapeArray)
-                    newRow.setValue( "EventDate", eventDateTime)
-                    newRow.setValue( "Scale", eventScale)
-                    newRow.setValue( "InvScale", eventInvScale)
-                    newRow.setValue( "Width", eventWidth)
-                    newRow.setValue( "Height", eventHeight)
-                    
-                    output.insertRow( newRow)
-                    
-                    # Clear out Array points
-                    shapeArray.removeAll()
-                    
-                    logEvents += 1
-        
-        # Need ArcGIS Desktop Advanced and Spatial Analyst licensed
-        # Create a raster layer from the extents feature class if spatial analyst extension available
-        if (raster != "None"):
-            print "Creating raster from feature class..."
-            extentsFeatureClass = os.path.join(workspace, featureClass)
-            # Convert to points
-            arcpy.FeatureToPoint_management(extentsFeatureClass, "in_memory\\extentPoints", "CENTROID")         
-            arcpy.Integrate_management("in_memory\\extentPoints #", "5000 Meters")
-            arcpy.CollectEvents_stats("in_memory\\extentPoints", "in_memory\\extentCollectEvents")
-            # Create density raster
-            # Check out necessary license
-            arcpy.CheckOutExtension("spatial")
-            arcpy.gp.KernelDensity_sa("in_memory\\extentCollectEvents", "ICOUNT", "in_memory\\extentRaster", "50", "20000", "SQUARE_MAP_UNITS")
-            # Remove values that are 0
-            arcpy.gp.SetNull_sa("in_memory\\extentRaster", "in_memory\\extentRaster", os.path.join(workspace, raster), "VALUE = 0")
-        print "\nDone!\n\nTotal number of events found in logs: {0}".format( logEvents)
-        
+    # Make sure extents are within range
+    extents = filterExtents(extents, fullExtent)
+    
+    # Open Insert Cursor on output
+    output = openCursor( workspace, featureClass, fullExtent[ "spatialReference"][ "wkid"], append)
+    
+    if not output:
         return
+    
+    # Write the extents in batches
+    with output:
+        logEvents = writeExtents(output, extents)
+    
+    # Save the time processed up to for the next run
+    writeState(stateFile, state)
+    
+    # Create a density grid with NumPy if an ASCII grid or .npy file is given, no extensions are needed
+    if raster.lower().endswith(".asc") or raster.lower().endswith(".npy"):
+        print "Creating density grid from extents..."
+        if append:
+            # Use all the extents in the feature class, not just the ones added by this run
+            extents = readExtentCentroids(os.path.join(workspace, featureClass))
+        generateDensityGrid(extents, fullExtent, os.path.join(os.path.dirname(workspace), raster))
+    # Need ArcGIS Desktop Advanced and Spatial Analyst licensed
+    # Create a raster layer from the extents feature class if spatial analyst extension available
+    elif (raster != "None"):
+        print "Creating raster from feature class..."
+        arcpy = ArcGISServerMessages.getArcpy()
+        extentsFeatureClass = os.path.join(workspace, featureClass)
+        # Convert to points
+        arcpy.FeatureToPoint_management(extentsFeatureClass, "in_memory\\extentPoints", "CENTROID")         
+        arcpy.Integrate_management("in_memory\\extentPoints #", "5000 Meters")
+        arcpy.CollectEvents_stats("in_memory\\extentPoints", "in_memory\\extentCollectEvents")
+        # Create density raster
+        # Check out necessary license
+        arcpy.CheckOutExtension("spatial")
+        arcpy.gp.KernelDensity_sa("in_memory\\extentCollectEvents", "ICOUNT", "in_memory\\extentRaster", "50", "20000", "SQUARE_MAP_UNITS")
+        # Remove values that are 0
+        arcpy.gp.SetNull_sa("in_memory\\extentRaster", "in_memory\\extentRaster", os.path.join(workspace, raster), "VALUE = 0")
+    print "\nDone!\n\nTotal number of events found in logs: {0}".format( logEvents)
+    
+    # Return the parsed extents so they can be used for other outputs
+    return extents
+
+# Function to create a kernel density grid of the extent centroids, optionally weighted by inverse scale
+# so detailed views count for more. The centroids are binned onto a grid covering the full extent and then
+# smoothed with a separable Gaussian kernel truncated at the search radius, giving the density per square map unit.
+# Writes an ESRI ASCII grid (.asc) or a NumPy array (.npy) with a world file (.wld) and returns the grid.
+def generateDensityGrid(extents, fullExtent, outputFile, cellSize=densityCellSize, searchRadius=densitySearchRadius, weightByScale=False):
+    # Use a larger cell size if the grid would be too big
+    columns = int(math.ceil((fullExtent["xmax"] - fullExtent["xmin"]) / cellSize))
+    rows = int(math.ceil((fullExtent["ymax"] - fullExtent["ymin"]) / cellSize))
+    if (columns * rows > maxDensityCells):
+        cellSize = cellSize * math.sqrt(float(columns * rows) / maxDensityCells)
+        columns = int(math.ceil((fullExtent["xmax"] - fullExtent["xmin"]) / cellSize))
+        rows = int(math.ceil((fullExtent["ymax"] - fullExtent["ymin"]) / cellSize))
+        print "  Cell size increased to {0:.2f} to keep the grid under {1} cells".format(cellSize, maxDensityCells)
+    xEdges = fullExtent["xmin"] + numpy.arange(columns + 1) * cellSize
+    yEdges = fullExtent["ymin"] + numpy.arange(rows + 1) * cellSize
+
+    # Bin the centroids onto the grid
+    centroidX = (extents["xmin"] + extents["xmax"]) / 2
+    centroidY = (extents["ymin"] + extents["ymax"]) / 2
+    weights = None
+    if weightByScale:
+        with numpy.errstate(divide="ignore"):
+            weights = 1 / extents["scale"]
+        weights[~numpy.isfinite(weights)] = numpy.nan
+        # Weight relative to the average so the total stays about the same as the count, use 1 where scale is unknown
+        if numpy.any(numpy.isfinite(weights)):
+            weights = weights / numpy.nanmean(weights)
+        weights[numpy.isnan(weights)] = 1
+    grid = numpy.histogram2d(centroidY, centroidX, bins=[yEdges, xEdges], weights=weights)[0]
+
+    # Smooth the rows then the columns with the kernel, scaled so the grid is density per square map unit
+    radiusCells = max(1, int(searchRadius / cellSize))
+    distance = numpy.arange(-radiusCells, radiusCells + 1) * cellSize
+    kernel = numpy.exp(-0.5 * (distance / (searchRadius / 3.0)) ** 2)
+    kernel = kernel / kernel.sum()
+    grid = convolveAxis(convolveAxis(grid, kernel, 1), kernel, 0) / (cellSize * cellSize)
+    # Remove values that are 0, allowing for rounding in the convolution
+    grid[grid <= grid.max() * 1e-12] = numpy.nan
+
+    # Write out the grid with the first row at the top
+    grid = numpy.flipud(grid)
+    if outputFile.lower().endswith(".npy"):
+        numpy.save(outputFile, grid)
+        worldFile = open(os.path.splitext(outputFile)[0] + ".wld", "w")
+        worldFile.write("\n".join([repr(cellSize), "0.0", "0.0", repr(-cellSize), repr(fullExtent["xmin"] + cellSize / 2), repr(yEdges[-1] - cellSize / 2)]) + "\n")
+        worldFile.close()
+    else:
+        header = "ncols {0}\nnrows {1}\nxllcorner {2!r}\nyllcorner {3!r}\ncellsize {4!r}\nNODATA_value -9999".format(columns, rows, fullExtent["xmin"], fullExtent["ymin"], cellSize)
+        numpy.savetxt(outputFile, numpy.where(numpy.isnan(grid), -9999, grid), fmt="%.6g", header=header, comments="")
+    print "  Density grid written to " + outputFile
+    
+    return grid
+
+# Function to convolve every line of a grid along an axis with a 1D kernel using an FFT, keeping the grid size
+def convolveAxis(grid, kernel, axis):
+    size = grid.shape[axis]
+    fftSize = int(2 ** math.ceil(math.log(size + len(kernel) - 1, 2)))
+    kernelShape = [1, 1]
+    kernelShape[axis] = fftSize // 2 + 1
+    transformed = numpy.fft.rfft(grid, fftSize, axis=axis) * numpy.fft.rfft(kernel, fftSize).reshape(kernelShape)
+    result = numpy.fft.irfft(transformed, fftSize, axis=axis)
+    offset = len(kernel) // 2
+    return numpy.take(result, range(offset, offset + size), axis=axis)
 
 # Function to query service for Extent and Spatial Reference details
 def getFullExtent( serverName, serverPort, serviceURL):
     # Supply the return format
     params = urllib.urlencode({'f': 'json'})
     
-    headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain"}
-    
-    # Connect to URL and post parameters
-    httpConn = httplib.HTTPConnection(serverName, serverPort)
+    # Post parameters over a pooled connection
     print serviceURL
-    httpConn.request("POST", serviceURL, params, headers)
+    response, data = ArcGISServerConnection.request(serverName, serverPort, "http", "POST", serviceURL, params, headers, idempotent=True)
     
     # Read response
-    response = httpConn.getresponse()
     if (response.status != 200):
-        httpConn.close()
         print "Error while querying Service details."
         return
     else:
-        data = response.read()
         
         # Check that data returned is not an error object
         if not assertJsonSuccess(data):
@@ -259,7 +390,6 @@ def getFullExtent( serverName, serverPort, serviceURL):
         
         # Deserialize response into Python object
         dataObj = json.loads(data)
-        httpConn.close()
         
         if not 'fullExtent' in dataObj:
             print "Unable to find Extent detail for '{0}'!".format( serviceURL)
@@ -274,16 +404,22 @@ def getFullExtent( serverName, serverPort, serviceURL):
     return
 
 # Function to create new feature class and return an Insert Cursor, used to store map query extents.
-def openCursor( workspace, featureclassName, srid):
+# If append is true and the feature class already exists the cursor is opened on the existing feature class.
+def openCursor( workspace, featureclassName, srid, append=False):
+    arcpy = ArcGISServerMessages.getArcpy()
     if not arcpy.Exists( workspace):
         print "Unable to find Workspace '{0}'...".format( workspace)
         return
     
+    Featureclass = workspace + os.sep + featureclassName
+    
+    if append and arcpy.Exists( Featureclass):
+        print "  Opening Insert Cursor on existing feature class..."
+        return arcpy.da.InsertCursor( Featureclass, extentFields)
+    
     print "Creating output feature class..."
     arcpy.CreateFeatureclass_management( workspace, featureclassName, "POLYGON", None, None, None, srid)
     
-    Featureclass = workspace + os.sep + featureclassName
-    
     print "  Adding field(s)..."
     arcpy.AddField_management( Featureclass, "EventDate", "DATE", None, None, None, None, "NULLABLE", "NON_REQUIRED")
     arcpy.AddField_management( Featureclass, "Scale", "DOUBLE", 19, 2, None, None, "NULLABLE", "NON_REQUIRED")
@@ -292,7 +428,65 @@ def openCursor( workspace, featureclassName, srid):
     arcpy.AddField_management( Featureclass, "Height", "LONG", 9, None, None, None, "NULLABLE", "NON_REQUIRED")
     
     print "  Opening Insert Cursor..."
-    return arcpy.InsertCursor( Featureclass)
+    return arcpy.da.InsertCursor( Featureclass, extentFields)
+
+# Function to parse the extent, size and scale out of "Extent:" log messages into columnar NumPy arrays
+# Takes any iterable of log messages (e.g. from queryLogs) and returns a dictionary of arrays with the
+# keys time, xmin, ymin, xmax, ymax, width, height and scale. Size and scale are NaN if not logged.
+def parseExtentMessages(logMessages):
+    # Keep just the time and text of the extent messages, one message per line
+    lines = [str(item["time"]) + "|" + item["message"] for item in logMessages if item["message"].startswith("Extent:")]
+    
+    # Pick out all the values in one pass over the text
+    matches = extentPattern.findall("\n".join(lines).replace(" ", ""))
+    lines = None
+    
+    columns = numpy.array(matches, dtype=str).reshape(len(matches), len(extentColumns))
+    matches = None
+    
+    extents = {}
+    for index, column in enumerate(extentColumns):
+        values = columns[:, index]
+        # Size and scale may not be in the message
+        values[values == ""] = "nan"
+        extents[column] = values.astype(numpy.float64)
+    extents["time"] = extents["time"].astype(numpy.int64)
+    return extents
+
+# Function to keep only the extents that are within the full extent of the service
+def filterExtents(extents, fullExtent):
+    withinExtent = (extents["xmin"] > fullExtent["xmin"]) & (extents["xmax"] < fullExtent["xmax"]) & (extents["ymin"] > fullExtent["ymin"]) & (extents["ymax"] < fullExtent["ymax"])
+    return dict((column, values[withinExtent]) for column, values in extents.items())
+
+# Function to write parsed extents to an Insert Cursor in batches, returns the number of rows written
+def writeExtents(output, extents):
+    rowCount = len(extents["time"])
+    with numpy.errstate(divide="ignore"):
+        invScale = 1 / extents["scale"]
+    
+    for batchStart in range(0, rowCount, insertBatchSize):
+        batch = slice(batchStart, batchStart + insertBatchSize)
+        
+        # Build the polygon for each extent
+        corners = zip(extents["xmin"][batch].tolist(), extents["ymin"][batch].tolist(), extents["xmax"][batch].tolist(), extents["ymax"][batch].tolist())
+        shapes = ["POLYGON (({0!r} {1!r}, {0!r} {3!r}, {2!r} {3!r}, {2!r} {1!r}, {0!r} {1!r}))".format(*corner) for corner in corners]
+        
+        eventDates = [datetime.datetime.fromtimestamp(eventTime / 1000.0) for eventTime in extents["time"][batch].tolist()]
+        rows = zip(shapes, eventDates, toNullable(extents["scale"][batch]), toNullable(invScale[batch]), toNullable(extents["width"][batch]), toNullable(extents["height"][batch]))
+        for row in rows:
+            output.insertRow(row)
+    
+    return rowCount
+
+# Function to read the centroids and scales of the extents in a feature class, in the same form as parseExtentMessages
+def readExtentCentroids(featureClass):
+    arcpy = ArcGISServerMessages.getArcpy()
+    rows = arcpy.da.FeatureClassToNumPyArray(featureClass, ["SHAPE@X", "SHAPE@Y", "Scale"], null_value={"Scale": numpy.nan})
+    return {"xmin": rows["SHAPE@X"], "xmax": rows["SHAPE@X"], "ymin": rows["SHAPE@Y"], "ymax": rows["SHAPE@Y"], "scale": rows["Scale"]}
+
+# Function to convert an array of floats to a list, with None in place of missing values
+def toNullable(values):
+    return [None if numpy.isnan(value) or numpy.isinf(value) else value for value in values.tolist()]
 
 # Function that checks that the input JSON object
 # is not an error object.
@@ -305,56 +499,102 @@ def assertJsonSuccess(data):
         return True
 
 
+# Function to query the logs a page at a time and yield each log message
+# Follows the hasMore/endTime paging of logs/query so a long time window is not truncated at the
+# page size, and only one page of messages is held in memory at once.
+# startTime is the most recent time to query from and endTime the oldest, both in milliseconds.
+# Raises httplib.HTTPException if a page can't be read, so a stream that stopped early is not taken as complete.
+def queryLogs(server, port, token, startTime, endTime, logFilter, level="FINE", pageSize=10000):
+
+    logQueryURL = "/arcgis/admin/logs/query"
+
+    # Messages already yielded at the page boundary time, as the next page starts from that time again
+    boundaryTime = None
+    boundaryMessages = set()
+    pages = 0
+    
+    while True:
+        # Supply the log level, filter, token, and return format
+        params = urllib.urlencode({'level': level, 'startTime': startTime, 'endTime': endTime, 'filter': logFilter, 'token': token, 'f': 'json', 'pageSize': pageSize})
+        
+        # Post parameters over a pooled connection
+        response, data = ArcGISServerConnection.request(server, port, "http", "POST", logQueryURL, params, headers, idempotent=True)
+        
+        # Read response
+        if (response.status != 200):
+            raise httplib.HTTPException("Error while querying logs, HTTP " + str(response.status) + " " + response.reason + " returned after " + str(pages) + " page(s)")
+
+        # Check that data returned is not an error object
+        if not assertJsonSuccess(data):
+            raise httplib.HTTPException("Error returned by the log query after " + str(pages) + " page(s) - " + "; ".join(json.loads(data).get("messages", [data])))
+
+        # Deserialize response into Python object and release the raw page
+        dataObj = json.loads(data)
+        data = None
+        pages += 1
+
+        # Remember the messages at the oldest time on this page, the next page starts from that time
+        pageEndTime = dataObj.get("endTime")
+        if pageEndTime == boundaryTime:
+            nextBoundaryMessages = set(boundaryMessages)
+        else:
+            nextBoundaryMessages = set()
+
+        newMessages = 0
+        for item in dataObj["logMessages"]:
+            if item["time"] == boundaryTime or item["time"] == pageEndTime:
+                messageKey = json.dumps(item, sort_keys=True)
+                # Skip messages already returned at the end of the previous page
+                if item["time"] == boundaryTime and messageKey in boundaryMessages:
+                    continue
+                if item["time"] == pageEndTime:
+                    nextBoundaryMessages.add(messageKey)
+            newMessages += 1
+            yield item
+
+        # Stop if there are no more messages
+        if not dataObj.get("hasMore") or pageEndTime is None:
+            break
+        # Stop if the server did not move the window on
+        if newMessages == 0 or pageEndTime > startTime:
+            print "Log query did not advance past " + str(startTime) + ", stopping."
+            break
+
+        # Query the next page from the oldest time on this page
+        boundaryTime = pageEndTime
+        boundaryMessages = nextBoundaryMessages
+        startTime = pageEndTime
+        dataObj = None
+
+    print "Read " + str(pages) + " page(s) of logs."
+    return
+
+
 # Function to get service stats
-def generateserviceStats(server, port, adminUser, adminPass, serviceStats, textFile, token=None):      
+# The report has the hits, mean and p50/p90/p99/max seconds per draw for each service, and the latency
+# histograms are written alongside it to <textFile>Histogram.
+# If a state file is given the stats are updated incrementally - only logs newer than the last run are
+# queried and their stats are added to the running totals kept in the state file.
+def generateserviceStats(server, port, adminUser, adminPass, serviceStats, textFile, token=None, stateFile=None):      
 
     millisecondsToQuery = 604800000 # One week 
-    hitDict = {}
     
     if token is None:    
         token = gentoken(server, port, adminUser, adminPass) 
 
-    # Construct URL to query the logs
-    logQueryURL = "/arcgis/admin/logs/query"
+    # Carry on from the last run if there is one
+    state = readState(stateFile)
+    hitDict = state.setdefault("services", {})
+
+    # Construct the filter and time window to query the logs
     startTime = int(round(time.time() * 1000))
-    endTime = startTime - millisecondsToQuery
+    endTime = max(startTime - millisecondsToQuery, state.get("lastTime", 0))
     logFilter = "{'services':'*','server':'*','machines':'*'}"
     
-    params = urllib.urlencode({'level': 'FINE', 'startTime': startTime, 'endTime': endTime, 'filter':logFilter, 'token': token, 'f': 'json', 'pageSize':10000})
-    
-    headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain"}
-    
-    # Connect to URL and post parameters    
-    httpConn = httplib.HTTPConnection(server, port)
-    httpConn.request("POST", logQueryURL, params, headers)
-    
-    # Read response
-    response = httpConn.getresponse()
-    if (response.status != 200):
-        httpConn.close()
-        print "Error while querying logs."
-        return
-    else:
-        data = response.read()
-
-        # Check that data returned is not an error object
-        if not assertJsonSuccess(data):          
-            print "Error returned by operation. " + data
-        else:
-            print "Operation completed successfully!"
-
-        # Deserialize response into Python object
-        dataObj = json.loads(data)
-        httpConn.close()
-
-        # Need these variables to calculate average draw time for an ExportMapImage call
-        mapDraws = 0
-        totalDrawTime = 0 
+    # Iterate over messages, a page of logs at a time so the whole week is counted
+    try:
+        for item in newLogMessages(queryLogs(server, port, token, startTime, endTime, logFilter), state):
         
-        # Iterate over messages        
-        for item in dataObj["logMessages"]:
-            
-                       
             if item["message"] == "End ExportMapImage":
 
                 elapsed = float(item["elapsed"])
@@ -365,82 +605,245 @@ def generateserviceStats(server, port, adminUser, adminPass, serviceStats, textF
 
                     # Add 1 to tally of hits
                     stats[0] += 1
-                    
+                
                     # Add elapsed time to total elapsed time
                     stats[1] += elapsed
                 else:
                     # Add key with one hit and total elapsed time
-                    hitDict[keyCheck] = [1,elapsed]
-
-        # Open text file and write header line       
-        summaryFile = open(textFile, "w")        
-        header = "Service,Number of hits,Average seconds per draw\n"
-        summaryFile.write(header)
+                    stats = [1,elapsed]
+                    hitDict[keyCheck] = stats
+
+                # Add elapsed time to the latency histogram, state from before histograms were kept will not have one
+                if len(stats) < 3:
+                    stats.append(LatencyHistogram.newHistogram())
+                LatencyHistogram.addValue(stats[2], elapsed)
+    # Leave the stats and state as they were if the logs could not all be read
+    except (httplib.HTTPException, socket.error), e:
+        print e
+        return
 
-        # Read through dictionary and write totals into file 
-        for key in hitDict:
+    # Open text file and write header line       
+    summaryFile = open(textFile, "w")        
+    header = "Service,Number of hits,Average seconds per draw,P50 seconds,P90 seconds,P99 seconds,Max seconds\n"
+    summaryFile.write(header)
+
+    # Read through dictionary and write totals into file 
+    for key in hitDict:
+
+        # Calculate average elapsed time
+        totalDraws = hitDict[key][0]
+        totalElapsed = hitDict[key][1]
+        avgElapsed = 0
+
+        if totalDraws > 0:     
+            avgElapsed = (1.0 * (totalElapsed / totalDraws)) #Elapsed time divided by hits
+
+        # Get the latency percentiles
+        histogram = LatencyHistogram.newHistogram()
+        if len(hitDict[key]) > 2:
+            histogram = hitDict[key][2]
+        percentiles = [LatencyHistogram.getPercentile(histogram, percent) for percent in [50, 90, 99]] + [histogram['max']]
+
+        # Construct and write the comma-separated line         
+        line = key + "," + str(totalDraws) + "," + str(avgElapsed) + "," + ",".join(str(round(value, 4)) for value in percentiles) + "\n"
+        summaryFile.write(line)
+
+    summaryFile.close()
+
+    # Write out the latency histograms next to the stats
+    histogramFile = open(os.path.splitext(textFile)[0] + "Histogram" + os.path.splitext(textFile)[1], "w")
+    histogramFile.write("Service,Lower seconds,Upper seconds,Number of draws\n")
+    for key in hitDict:
+        if len(hitDict[key]) > 2:
+            for lowerBound, upperBound, count in LatencyHistogram.getBuckets(hitDict[key][2]):
+                histogramFile.write(key + "," + repr(lowerBound) + "," + repr(upperBound) + "," + str(count) + "\n")
+    histogramFile.close()
+
+    # Save the totals and the time processed up to for the next run
+    writeState(stateFile, state)
+    return
 
-            # Calculate average elapsed time
-            totalDraws = hitDict[key][0]
-            totalElapsed = hitDict[key][1]
-            avgElapsed = 0
 
-            if totalDraws > 0:     
-                avgElapsed = (1.0 * (totalElapsed / totalDraws)) #Elapsed time divided by hits
+# Function to read the state saved by the last incremental run, returns an empty state if there is none
+def readState(stateFile):
+    if not stateFile or not os.path.exists(stateFile):
+        return {}
+    with open(stateFile, "r") as f:
+        return json.load(f)
 
-            # Construct and write the comma-separated line         
-            line = key + "," + str(totalDraws) + "," + str(avgElapsed) + "\n"
-            summaryFile.write(line)
 
-        summaryFile.close()
+# Function to save the state for the next incremental run, replacing the previous state file
+def writeState(stateFile, state):
+    if not stateFile:
         return
+    tempFile = stateFile + ".tmp"
+    with open(tempFile, "w") as f:
+        json.dump(state, f)
+    if os.path.exists(stateFile):
+        os.remove(stateFile)
+    os.rename(tempFile, stateFile)
+
+
+# Function to pass on only the log messages newer than the last time processed in the state. Messages at the
+# last time are remembered so they are not counted twice. The logs come newest first, so the last time processed
+# is only moved on once every message has been read, a stream that stops with an error leaves the state as it was.
+def newLogMessages(logMessages, state):
+    lastTime = state.get("lastTime")
+    processedMessages = set(state.get("lastMessages", []))
+    newestTime = lastTime
+    newestMessages = list(state.get("lastMessages", []))
+    for item in logMessages:
+        messageKey = None
+        # Skip messages processed by the last run
+        if lastTime is not None and item["time"] <= lastTime:
+            messageKey = json.dumps(item, sort_keys=True)
+            if item["time"] < lastTime or messageKey in processedMessages:
+                continue
+        # Keep track of the newest time read
+        if newestTime is None or item["time"] >= newestTime:
+            messageKey = messageKey or json.dumps(item, sort_keys=True)
+            if item["time"] != newestTime:
+                newestTime = item["time"]
+                newestMessages = []
+            newestMessages.append(messageKey)
+        yield item
+    # All the logs have been read, so move the last time processed on
+    if newestTime is not None:
+        state["lastTime"] = newestTime
+        state["lastMessages"] = newestMessages
     
 
+# Function to request a URL on the server and return the JSON response along with the seconds the request took
+def timedJsonRequest(server, port, URL):
+    requestStart = time.time()
+    response, data = ArcGISServerConnection.request(server, port, "http", "GET", URL, None, headers)
+    if (response.status != 200):
+        raise httplib.HTTPException("HTTP " + str(response.status) + " " + response.reason + " returned for " + URL.split("?")[0])
+    return json.loads(data), time.time() - requestStart
+
+
+# Function to get the value at a percentile (0-100) from a list of values, using the nearest rank
+def percentile(values, percent):
+    if len(values) == 0:
+        return 0
+    sortedValues = sorted(values)
+    rank = int(math.ceil((percent / 100.0) * len(sortedValues))) - 1
+    return sortedValues[max(0, min(rank, len(sortedValues) - 1))]
+
+
+# Function to print the total wall time, the request latency percentiles and the connections used
+def printTimings(wallTime, latencies):
+    print "{0} requests in {1:.2f} seconds".format(len(latencies), wallTime)
+    if len(latencies) > 0:
+        print "Request latency (seconds) - p50: {0:.3f}, p90: {1:.3f}, p99: {2:.3f}, max: {3:.3f}".format(percentile(latencies, 50), percentile(latencies, 90), percentile(latencies, 99), max(latencies))
+    poolStatistics = ArcGISServerConnection.getPoolStatistics()
+    print "Connections opened: {0}, reused: {1}, reconnects: {2}".format(poolStatistics['connectionsCreated'], poolStatistics['connectionsReused'], poolStatistics['reconnects'])
+    print "Requests succeeded: {0}, server errors: {1}, timeouts: {2}, connection errors: {3}, retries: {4}, failed fast: {5}".format(poolStatistics['successes'], poolStatistics['serverErrors'], poolStatistics['timeouts'], poolStatistics['connectionErrors'], poolStatistics['retries'], poolStatistics['breakerRejected'])
+
+
+# Function to get the status of every service in a folder from the folder report (ArcGIS Server 10.2+)
+# Returns a list of (service, status) and the seconds the request took, or None if the server has no report resource
+def getFolderReport(server, port, token, folder):
+    URL = "/arcgis/admin/services/{}report?f=pjson&token={}".format(folder + "/" if folder else "", token)
+    requestStart = time.time()
+    try:
+        report, latency = timedJsonRequest(server, port, URL)
+    except (httplib.HTTPException, ValueError):
+        return None, time.time() - requestStart
+    if "reports" not in report:
+        return None, latency
+    folderPrefix = folder + "//" if folder else ""
+    return [(folderPrefix + single['serviceName'] + '.' + single['type'], single['status']['realTimeState']) for single in report["reports"]], latency
+
+
+# Function to get all services from the catalog, without their status
+# Note: Will not return any services in the Utilities or System folder
+def getCatalogServices(server, port, token):
+    try:
+        catalog = ArcGISServerCatalog.getCatalog(server, port, "http", token, catalogFile)
+    except (socket.error, httplib.HTTPException, ValueError), e:
+        print e
+        sys.exit()
+    services = []
+    for folder in catalog['folders']:
+        if folder not in ["Utilities", "System"]:
+            services.extend((folder + "//" if folder else "") + service for service in catalog['services'][folder])
+    return services
+
+
 # Function to get all services
 # Requires Admin user/password, as well as server and port (necessary to construct token if one does not exist).
 # If a token exists, you can pass one in for use.  
+# The folders and services come from the catalog. Status checks are run concurrently, concurrency sets how many requests run at once.
+# On 10.2+ the status of all the services in each folder comes from one folder report request.
 # Note: Will not return any services in the Utilities or System folder
-def getServiceList(server, port, adminUser, adminPass, token=None):   
+def getServiceList(server, port, adminUser, adminPass, token=None, concurrency=maxConcurrency):   
         
     if token is None:    
         token = gentoken(server, port, adminUser, adminPass)    
     
-    services = []    
-    folder = ''    
-    URL = "http://{}:{}/arcgis/admin/services{}?f=pjson&token={}".format(server, port, folder, token)    
-
+    concurrency = max(1, int(concurrency))
+    listStart = time.time()
+    latencies = []
+    
     try:
-        serviceList = json.loads(urllib2.urlopen(URL).read())
-    except urllib2.URLError, e:
+        catalog = ArcGISServerCatalog.getCatalog(server, port, "http", token, catalogFile)
+    except (socket.error, httplib.HTTPException, ValueError), e:
         print e
         sys.exit()
 
     # Build up list of services at the root level
-    for single in serviceList["services"]:
-        services.append(single['serviceName'] + '.' + single['type'])
+    services = list(catalog['services'][""])
      
-    # Build up list of folders and remove the System and Utilities folder (we dont want anyone playing with them)
-    folderList = serviceList["folders"]
-    folderList.remove("Utilities")             
-    folderList.remove("System")
+    # Build up list of folders without the System and Utilities folder (we dont want anyone playing with them)
+    folderList = [folder for folder in catalog['folders'][1:] if folder not in ["Utilities", "System"]]
         
-    if len(folderList) > 0:
-        for folder in folderList:                                              
-            URL = "http://{}:{}/arcgis/admin/services/{}?f=pjson&token={}".format(server, port, folder, token)    
-            fList = json.loads(urllib2.urlopen(URL).read())
-            
-            for single in fList["services"]:
-                services.append(folder + "//" + single['serviceName'] + '.' + single['type'])                
-    
-    if len(services) == 0:
-        print "No services found"
-    else:
-        print "Services on " + server +":"
-        for service in services: 
-            statusURL = "http://{}:{}/arcgis/admin/services/{}/status?f=pjson&token={}".format(server, port, service, token)
-            status = json.loads(urllib2.urlopen(statusURL).read())
-            print "  " + status["realTimeState"] + " > " + service
+    pool = ThreadPool(concurrency)
+    serverRequest = functools.partial(timedJsonRequest, server, port)
+    try:
+        # Try the report for the root folder first, if it works get the reports for the other folders at the same time
+        rootReport, latency = getFolderReport(server, port, token, "")
+        latencies.append(latency)
+        if rootReport is not None:
+            folderReports = [rootReport]
+            for fReport, latency in pool.map(functools.partial(getFolderReport, server, port, token), folderList):
+                latencies.append(latency)
+                folderReports.append(fReport)
+            servicesStatus = [serviceStatus for fReport in folderReports if fReport is not None for serviceStatus in fReport]
+            services = [service for service, status in servicesStatus]
+            # Fall back to the catalog for any folder the report failed for
+            folderList = [folder for folder, fReport in zip(folderList, folderReports[1:]) if fReport is None]
+            # The folder may have been deleted since the catalog was read, so read it again
+            if len(folderList) > 0 and ArcGISServerCatalog.isCached(catalog, listStart):
+                catalog = ArcGISServerCatalog.refreshCatalog(server, port, "http", token, catalogFile)
+                folderList = [folder for folder in folderList if folder in catalog['folders']]
+        else:
+            servicesStatus = []
+
+        # Add the services in the other folders from the catalog
+        for folder in folderList:
+            for service in catalog['services'][folder]:
+                services.append(folder + "//" + service)
+        
+        if len(services) == 0:
+            print "No services found"
+        else:
+            print "Services on " + server +":"
+            # Print the statuses from the reports, then get the status of the other services
+            for service, status in servicesStatus:
+                print "  " + status + " > " + service
+            reportedServices = set(service for service, status in servicesStatus)
+            otherServices = [service for service in services if service not in reportedServices]
+            statusURLs = ["/arcgis/admin/services/{}/status?f=pjson&token={}".format(service, token) for service in otherServices]
+            # Print each status in service order as soon as it is available
+            for service, (status, latency) in zip(otherServices, pool.imap(serverRequest, statusURLs)):
+                latencies.append(latency)
+                print "  " + status["realTimeState"] + " > " + service
+    finally:
+        pool.close()
+        pool.join()
             
+    printTimings(time.time() - listStart, latencies)
      
     return services
 
@@ -466,12 +869,16 @@ if __name__ == "__main__":
             
             print "Usage:"
             print "Generate extents feature class: agsAdmin.exe server port adminUser adminPass logFC SpliceGroup/SpliceOffice.MapServer D:\Data\Temp\Scratch.gdb LogExtents None"
+            print "The raster can be a .asc or .npy file to create a density grid without Spatial Analyst e.g. ... LogExtents LogDensity.asc"
             print "Map service stats: agsAdmin.exe server port adminUser adminPass serviceStats D:\Data\Temp\Stats.txt"
-            print "List services: agsAdmin.exe server port adminUser adminPass list"
+            print "logFC and serviceStats take an optional state file to only process logs since the last run e.g. ... serviceStats D:\Data\Temp\Stats.txt D:\Data\Temp\StatsState.json"
+            print "List services: agsAdmin.exe server port adminUser adminPass list [concurrency]"
             print "Stop a service: agsAdmin.exe server port adminUser adminPass stop Map.MapService"
             print "Start a service: agsAdmin.exe server port adminUser adminPass start Buffer.GPService"
             print "Delete a service: agsAdmin.exe server port adminUser adminPass delete Find.GeocodeServer"
-            print "The 'all' keyword can be used in place of a service name to stop, start or delete all services \n"
+            print "The 'all' keyword can be used in place of a service name to stop, start or delete all services"
+            print "Stop, start and delete also take optional concurrency, folder batches and results file arguments"
+            print "Start all services in batches: agsAdmin.exe server port adminUser adminPass start all 8 \"Base;Operational,ROOT\" D:\Data\Temp\Results.csv \n"
             print "e.g. agsAdmin.exe myServer 6080 admin p@$$w0rd list"
             print "e.g. agsAdmin.exe myServer 6080 admin p@$$w0rd start ForestCover.MapService"
             print "e.g. agsAdmin.exe myServer 6080 admin p@$$w0rd stop all"
@@ -484,12 +891,15 @@ if __name__ == "__main__":
             else:
                 # Go to function depending on what is entered
                 if args[5] == "list":    
-                    getServiceList(*args[1:5])        
+                    if len(args) > 6:
+                        getServiceList(*args[1:5], concurrency=args[6])
+                    else:
+                        getServiceList(*args[1:5])        
                 elif args[5] == "start" or args[5] == "stop" or args[5] == "delete":
-                    stopStartServices(*args[1:7])
+                    stopStartServices(*args[1:7], concurrency=args[7] if len(args) > 7 else maxConcurrency, batches=args[8] if len(args) > 8 else None, resultsFile=args[9] if len(args) > 9 else None)
                 elif args[5] == "logFC":    
-                    generateFCExtent(*args[1:10])
+                    generateFCExtent(*args[1:10], stateFile=args[10] if len(args) > 10 else None)
                 elif args[5] == "serviceStats":    
-                    generateserviceStats(*args[1:7])                    
+                    generateserviceStats(*args[1:7], stateFile=args[7] if len(args) > 7 else None)                    
                 else:
                     print "Unknown command:   " + str(args[5]) + " ,use '/?' for help"
\ No newline at end of file
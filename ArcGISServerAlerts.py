@@ -0,0 +1,102 @@
+#-------------------------------------------------------------
+# Name:       ArcGIS Server Alerts
+# Purpose:    Keeps the last known status of each service checked by the admin toolkit scripts in a
+#             state file, so alerts are only sent when a service goes down or recovers rather than
+#             on every run. All the alerts for a run are sent in one email over one SMTP session.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import os
+import json
+import socket
+import smtplib
+import datetime
+
+# Set variables
+# Statuses kept for this process when there is no state file, e.g. when monitoring
+memoryState = {'statuses': {}}
+
+
+# Start of read alert state function
+def readAlertState(stateFile):
+    if not stateFile:
+        return memoryState
+    try:
+        with open(stateFile, "r") as f:
+            alertState = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {'statuses': {}}
+    alertState.setdefault('statuses', {})
+    return alertState
+# End of read alert state function
+
+
+# Start of write alert state function
+def writeAlertState(stateFile, alertState):
+    if not stateFile:
+        return
+    # Write to a temporary file first so the state is never left half written
+    tempFile = stateFile + ".tmp"
+    with open(tempFile, "w") as f:
+        json.dump(alertState, f, indent=1, sort_keys=True)
+    if (os.name == "nt") and os.path.exists(stateFile):
+        os.remove(stateFile)
+    os.rename(tempFile, stateFile)
+# End of write alert state function
+
+
+# Start of get transitions function
+# statuses is the status of everything checked this run keyed by name. Anything with a status not in
+# healthyStatuses is down. details are extra text for the alerts keyed by name. Names starting with one
+# of prunePrefixes that were not checked this run (e.g. deleted services) are removed from the state.
+def getTransitions(alertState, statuses, healthyStatuses, details={}, prunePrefixes=[]):
+    alerts = []
+    previousStatuses = alertState['statuses']
+    for name in sorted(statuses):
+        status = str(statuses[name])
+        previousStatus = previousStatuses.get(name)
+        # Anything not seen before is treated as having been healthy, so it alerts if it starts off down
+        wasHealthy = (previousStatus is None) or (previousStatus in healthyStatuses)
+        isHealthy = status in healthyStatuses
+        if wasHealthy and not isHealthy:
+            alerts.append("DOWN - " + name + " is " + status + (" - " + details[name] if details.get(name) else ""))
+        elif isHealthy and not wasHealthy:
+            alerts.append("RECOVERED - " + name + " is " + status + " (was " + previousStatus + ")")
+        previousStatuses[name] = status
+
+    for name in previousStatuses.keys():
+        if (name not in statuses) and any(name.startswith(prefix + " ") for prefix in prunePrefixes):
+            del previousStatuses[name]
+    alertState['lastChecked'] = datetime.datetime.now().strftime("%d/%m/%Y - %H:%M:%S")
+    return alerts
+# End of get transitions function
+
+
+# Start of send email function
+def sendEmail(emailServer, emailPort, emailUser, emailPassword, emailTo, emailSubject, message, useTLS=True):
+    # One SMTP session for the whole message
+    smtpserver = smtplib.SMTP(emailServer, int(emailPort))
+    try:
+        if useTLS:
+            smtpserver.ehlo()
+            smtpserver.starttls()
+            smtpserver.ehlo()
+        # Login with sender email address and password
+        if emailPassword:
+            smtpserver.login(emailUser, emailPassword)
+        # Email content
+        header = 'To:' + emailTo + '\n' + 'From: ' + emailUser + '\n' + 'Subject:' + emailSubject + '\n'
+        # Send the email to each address
+        smtpserver.sendmail(emailUser, [address.strip() for address in emailTo.split(",") if address.strip()], header + '\n' + message)
+    finally:
+        try:
+            smtpserver.quit()
+        except (smtplib.SMTPException, socket.error):
+            smtpserver.close()
+# End of send email function
@@ -10,17 +10,27 @@
 # Python Version:   2.7
 #--------------------------------
 
-# Import modules and enable data to be overwritten
+# Import modules
 import os
 import sys
+import time
+import csv
 import datetime
-import smtplib
-import httplib
+import threading
 import json
 import urllib
 import urlparse
-import arcpy
-arcpy.env.overwriteOutput = True
+import socket
+import httplib
+import functools
+from multiprocessing.pool import ThreadPool
+import ArcGISServerConnection
+import ArcGISServerToken
+import ArcGISServerCatalog
+import ArcGISServerAlerts
+import ArcGISServerMetrics
+import LatencyHistogram
+import ArcGISServerMessages
 
 # Set variables
 logging = "false"
@@ -31,10 +41,39 @@ emailUser = ""
 emailPassword = ""
 emailSubject = ""
 emailMessage = ""
+emailServer = "smtp.gmail.com"
+emailPort = 587
+emailTLS = "true"
+alertStateFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ArcGISServerAvailabilityAlerts.json") # Last known status of each service, so emails are only sent when services go down or recover
+healthyStatuses = ["AVAILABLE", "STARTED", "HEALTHY", "SLOW"] # Statuses that do not need an alert
+tokenCacheFile = "" # ArcGISServerToken.defaultCacheFile to keep tokens between runs
+catalogFile = "" # ArcGISServerCatalog.defaultCatalogFile to keep the list of folders and services between runs
+folderListRefresh = 600 # Seconds between re-reading the list of folders when monitoring
+monitorChecks = 0 # Number of checks to run when monitoring, 0 to keep checking until stopped
+reportSupported = {} # Whether each server has the services report resource, found when the server first answers a report request
+siteTimeout = 60 # Seconds to wait for the sites to respond when checking several sites at once
+probeServices = "false" # Also send a small request to each started service to check it is working
+probeMethod = "export" # For map services "export" a small image or "query" the count of the first layer
+probeSlowSeconds = 2 # Services that take longer than this to respond to the probe are reported as slow
+probeTimeout = 10 # Services that take longer than this to respond to the probe have failed
+probeConcurrency = 8 # Number of services to probe at the same time
+serviceExtents = {} # Extents of the map services probed, so they are only requested once
+checkMachines = "false" # Check the services on each machine in the site directly, rather than through the site
+machineMatrixFile = "" # CSV file to write the status of every service on every machine to when checking machines
+metricsFile = "" # File to keep the status and response time of every check in e.g. os.path.join(os.path.dirname(os.path.abspath(__file__)), "ArcGISServerAvailability.metrics")
+metricsCapacity = 1000000 # Samples kept in the metrics file before the oldest are overwritten, 20 bytes each
+prometheusFile = "" # Prometheus textfile exporter file to write the results of the latest check to e.g. C:\node_exporter\textfile\arcgis.prom
 output = None
+runErrors = [] # Errors logged during the current check, sent with the alerts
 
 # Start of main function
-def mainFunction(agsServerSite,username,password,service): # Get parameters from ArcGIS Desktop tool by seperating by comma e.g. (var1 is 1st parameter,var2 is 2nd parameter,var3 is 3rd parameter)  
+def mainFunction(agsServerSite,username,password,service,checkInterval="",probe="",machines=""): # Get parameters from ArcGIS Desktop tool by seperating by comma e.g. (var1 is 1st parameter,var2 is 2nd parameter,var3 is 3rd parameter)  
+    # Services status for each site checked, or -1 if the site could not be checked
+    checkResults = {}
+    # Seconds each site took to check
+    checkSeconds = {}
+    mainStart = time.time()
+    del runErrors[:]
     try:
         # Log start
         if (logging == "true") or (sendErrorEmail == "true"):
@@ -42,73 +81,98 @@ def mainFunction(agsServerSite,username,password,service): # Get parameters from
 
         # --------------------------------------- Start of code --------------------------------------- #        
 
-        # Get the server site details
-        protocol, serverName, serverPort, context = splitSiteURL(agsServerSite)
+        # Probe the services if set
+        if (len(str(probe)) == 0):
+            probe = probeServices
+        # Check each machine if set
+        if (len(str(machines)) == 0):
+            machines = checkMachines
 
-        # If any of the variables are blank
-        if (serverName == None or serverPort == None or protocol == None or context == None):
-            return -1
+        # Several sites can be provided separated by semicolons
+        sites = [eachSite.strip() for eachSite in str(agsServerSite).split(";") if eachSite.strip()]
+
+        # If several sites are provided, check them all at the same time
+        if (len(sites) > 1):
+            if (len(str(checkInterval)) > 0):
+                ArcGISServerMessages.addWarning("A check interval can only be used with one site, checking the sites once...")
+            siteResults = checkSites(sites, username, password, service, probe)
+            for siteResult in siteResults:
+                checkResults[siteResult['site']] = siteResult['servicesStatus'] if siteResult['result'] == "OK" else -1
+                checkSeconds[siteResult['site']] = siteResult['seconds']
+            reportSites(siteResults)
+
+        # Otherwise check the one site
+        else:
+            # Get the server site details
+            protocol, serverName, serverPort, context = splitSiteURL(agsServerSite)
 
-        # Add on slash to context if necessary
-        if not context.endswith('/'):
-            context += '/'
+            # If any of the variables are blank
+            if (serverName == None or serverPort == None or protocol == None or context == None):
+                return -1
 
-        # Add on admin to context if necessary   
-        if not context.endswith('admin/'):
-            context += 'admin/'
+            # Add on slash to context if necessary
+            if not context.endswith('/'):
+                context += '/'
 
-        # Get token
-        token = getToken(username, password, serverName, serverPort, protocol)
+            # Add on admin to context if necessary   
+            if not context.endswith('admin/'):
+                context += 'admin/'
 
-        # If token received
-        if (token != -1):
-            # List to hold services and their status
-            servicesStatus = []
-            
-            # If a service is provided
-            if (len(str(service)) > 0): 
-                # Query the service status
-                realtimeStatus = getServiceStatus(serverName, serverPort, protocol, service, token)
-                serviceDetails = {'status': realtimeStatus, 'service': service}
-                servicesStatus.append(serviceDetails)
-            # Else
-            else:
-                # Get all services
-                services = getServices(serverName, serverPort, protocol, token)
-                # Query all services
-                # Iterate through services
-                for eachService in services:
-                    # Query the service status
-                    realtimeStatus = getServiceStatus(serverName, serverPort, protocol, eachService, token)
-                    serviceDetails = {'status': realtimeStatus, 'service': eachService}
-                    servicesStatus.append(serviceDetails)
-
-            stoppedServices = 0
-            # Iterate through services
-            for eachServicesStatus in servicesStatus:
-                # If status is stopped at to counter
-                if (eachServicesStatus['status'] == "STOPPED"):
-                    stoppedServices = stoppedServices + 1
-
-            # If any services are stopped
-            if (stoppedServices > 0):
-                arcpy.AddError(str(stoppedServices) + " services are stopped...")
-                # If logging
-                if (logging == "true") or (sendErrorEmail == "true"):
-                    loggingFunction(logFile,"error",str(stoppedServices) + " services are stopped")
-                    sys.exit()
+            # If checking each machine, check them all at the same time
+            if (machines == "true"):
+                if (len(str(checkInterval)) > 0):
+                    ArcGISServerMessages.addWarning("A check interval can't be used when checking each machine, checking the machines once...")
+                    checkInterval = ""
+                machineResults = checkSiteMachines(serverName, serverPort, protocol, username, password, service, probe)
+                if (machineResults == -1):
+                    checkResults[agsServerSite] = -1
+                else:
+                    for machineResult in machineResults:
+                        # A machine that is not started or could not be checked is down
+                        checkResults[machineResult['site']] = machineResult['servicesStatus'] if (machineResult['result'] == "OK") and (machineResult['state'] == "STARTED") else -1
+                        checkSeconds[machineResult['site']] = machineResult['seconds']
+                    reportMachines(machineResults)
+
+            # If a check interval is provided, keep running and check the site on that interval
+            elif (len(str(checkInterval)) > 0):
+                monitorSite(serverName, serverPort, protocol, username, password, service, float(checkInterval), probe, agsServerSite)
+
+            # Otherwise check the site once
             else:
-                arcpy.AddMessage("All services are running...")
-                # If logging
-                if (logging == "true") or (sendErrorEmail == "true"):
-                    loggingFunction(logFile,"info","All services are running...")            
+                servicesStatus = checkSite(serverName, serverPort, protocol, username, password, service, None, probe)
+                checkResults[agsServerSite] = servicesStatus
+                checkSeconds[agsServerSite] = time.time() - mainStart
+
+            # If services were checked
+            if (machines != "true") and (len(str(checkInterval)) == 0) and (servicesStatus != -1):
+                problems, warnings = getProblems(servicesStatus)
+
+                # If any services are slow
+                if (len(warnings) > 0):
+                    ArcGISServerMessages.addWarning(", ".join(warnings) + "...")
+                    # If logging
+                    if (logging == "true"):
+                        loggingFunction(logFile,"warning",", ".join(warnings))
+
+                # If any services are stopped or failed
+                if (len(problems) > 0):
+                    ArcGISServerMessages.addError(", ".join(problems) + "...")
+                    # If logging
+                    if (logging == "true") or (sendErrorEmail == "true"):
+                        loggingFunction(logFile,"error",", ".join(problems))
+                        sys.exit()
+                else:
+                    ArcGISServerMessages.addMessage("All services are running...")
+                    # If logging
+                    if (logging == "true") or (sendErrorEmail == "true"):
+                        loggingFunction(logFile,"info","All services are running...")            
         # --------------------------------------- End of code --------------------------------------- #  
             
         # If called from gp tool return the arcpy parameter   
         if __name__ == '__main__':
             # Return the output if there is any
             if output:
-                arcpy.SetParameterAsText(1, output)
+                ArcGISServerMessages.setParameter(1, output)
         # Otherwise return the result          
         else:
             # Return the output if there is any
@@ -119,37 +183,670 @@ def mainFunction(agsServerSite,username,password,service): # Get parameters from
             loggingFunction(logFile,"end","")        
         pass
     # If arcpy error
-    except arcpy.ExecuteError:
+    except ArcGISServerMessages.ExecuteError:
         # Show the message
-        arcpy.AddError(arcpy.GetMessages(2))        
+        ArcGISServerMessages.addError(ArcGISServerMessages.getMessages(2))        
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):
-            loggingFunction(logFile,"error",arcpy.GetMessages(2))
+            loggingFunction(logFile,"error",ArcGISServerMessages.getMessages(2))
     # If python error
     except Exception as e:
         # Show the message
-        arcpy.AddError(e.args[0])          
+        ArcGISServerMessages.addError(e.args[0])          
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error",e.args[0])
+    finally:
+        # Email any services that have gone down or recovered, monitor mode does this after every check
+        if (len(str(checkInterval)) == 0):
+            # If the check did not get as far as the site
+            if (len(checkResults) == 0) and (len(runErrors) > 0):
+                checkResults[agsServerSite] = -1
+            sendAlerts(checkResults, service)
+            recordMetrics(checkResults, checkSeconds, time.time() - mainStart)
 # End of main function
 
 
-# Start of get services function
-def getServices(serverName, serverPort, protocol, token):
+# Start of send alerts function
+def sendAlerts(checkResults, service):
+    if (sendErrorEmail != "true"):
+        return []
+    # Status of each site and the services on it
+    statuses = {}
+    details = {}
+    for site, servicesStatus in checkResults.items():
+        if (servicesStatus == -1):
+            statuses[site] = "ERROR"
+            details[site] = "; ".join(str(error) for error in runErrors)
+        else:
+            statuses[site] = "AVAILABLE"
+            for eachServicesStatus in servicesStatus:
+                statuses[site + " " + eachServicesStatus['service']] = getServiceState(eachServicesStatus)
+    # Forget deleted services when all the services on a site were checked
+    prunePrefixes = [site for site, servicesStatus in checkResults.items() if servicesStatus != -1] if (len(str(service)) == 0) else []
+
+    try:
+        alertState = ArcGISServerAlerts.readAlertState(alertStateFile)
+        alerts = ArcGISServerAlerts.getTransitions(alertState, statuses, healthyStatuses, details, prunePrefixes)
+        ArcGISServerAlerts.writeAlertState(alertStateFile, alertState)
+        # Send all the alerts in one email
+        if (len(alerts) > 0):
+            ArcGISServerMessages.addMessage("Sending email...")
+            ArcGISServerAlerts.sendEmail(emailServer, emailPort, emailUser, emailPassword, emailTo, emailSubject, emailMessage + "\n\n" + "\n".join(alerts), emailTLS == "true")
+    except Exception as e:
+        ArcGISServerMessages.addError("Unable to send alerts - " + str(e))
+        return []
+    return alerts
+# End of send alerts function
+
+
+# Start of record metrics function
+def recordMetrics(checkResults, checkSeconds, defaultSeconds=None):
+    if not (metricsFile or prometheusFile):
+        return []
+    # A sample for each site with the time it took to check, and for each service with the time the probe took
+    sampleTime = time.time()
+    samples = []
+    for site, servicesStatus in sorted(checkResults.items()):
+        if (servicesStatus == -1):
+            samples.append((sampleTime, site, "", "ERROR", checkSeconds.get(site, defaultSeconds)))
+        else:
+            samples.append((sampleTime, site, "", "AVAILABLE", checkSeconds.get(site, defaultSeconds)))
+            for eachServicesStatus in servicesStatus:
+                samples.append((sampleTime, site, eachServicesStatus['service'], getServiceState(eachServicesStatus), eachServicesStatus.get('seconds')))
+
+    try:
+        if metricsFile:
+            ArcGISServerMetrics.appendSamples(metricsFile, samples, metricsCapacity)
+        if prometheusFile:
+            ArcGISServerMetrics.writePrometheusFile(prometheusFile, samples)
+    except Exception as e:
+        ArcGISServerMessages.addError("Unable to record metrics - " + str(e))
+        return []
+    return samples
+# End of record metrics function
+
+
+# Start of check sites function
+def checkSites(sites, username, password, service, probe="false"):
+    # Check each site on its own thread so a slow or dead site does not hold up the others
+    siteResults = dict((site, {'site': site, 'result': "TIMEOUT", 'servicesStatus': [], 'seconds': siteTimeout}) for site in sites)
+    resultsLock = threading.Lock()
+    threads = []
+    for site in sites:
+        thread = threading.Thread(target=checkSiteThread, args=(site, username, password, service, probe, siteResults, resultsLock))
+        # Don't keep the process running for a site that never responds
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    # Wait for the sites up to the timeout, any site still running is reported as timed out
+    deadline = time.time() + siteTimeout
+    for thread in threads:
+        thread.join(max(0, deadline - time.time()))
+    with resultsLock:
+        return [dict(siteResults[site]) for site in sites]
+# End of check sites function
+
+
+# Start of check site thread function
+def checkSiteThread(site, username, password, service, probe, siteResults, resultsLock):
+    checkStart = time.time()
+    servicesStatus = -1
+    try:
+        # Get the server site details
+        protocol, serverName, serverPort, context = splitSiteURL(site)
+        if (serverName != None):
+            servicesStatus = checkSite(serverName, serverPort, protocol, username, password, service, None, probe)
+    # Errors are reported in the results rather than ending the process
+    except (SystemExit, Exception):
+        servicesStatus = -1
+    with resultsLock:
+        # Ignore the result if the site has already timed out
+        if (time.time() - checkStart <= siteTimeout):
+            siteResults[site] = {'site': site, 'result': "FAILED" if servicesStatus == -1 else "OK", 'servicesStatus': [] if servicesStatus == -1 else servicesStatus, 'seconds': time.time() - checkStart}
+# End of check site thread function
+
+
+# Start of report sites function
+def reportSites(siteResults):
+    # Show the result for each site and report any problems on all the sites together
+    problems = []
+    for siteResult in siteResults:
+        if (siteResult['result'] == "OK"):
+            siteProblems, siteWarnings = getProblems(siteResult['servicesStatus'])
+            if (len(siteProblems) > 0):
+                problems.append(siteResult['site'] + " - " + ", ".join(siteProblems + siteWarnings))
+                ArcGISServerMessages.addError(problems[-1] + " (" + "%.3f" % siteResult['seconds'] + " seconds)...")
+            elif (len(siteWarnings) > 0):
+                ArcGISServerMessages.addWarning(siteResult['site'] + " - " + ", ".join(siteWarnings) + " (" + "%.3f" % siteResult['seconds'] + " seconds)...")
+            else:
+                ArcGISServerMessages.addMessage(siteResult['site'] + " - All " + str(len(siteResult['servicesStatus'])) + " services are running (" + "%.3f" % siteResult['seconds'] + " seconds)...")
+        elif (siteResult['result'] == "TIMEOUT"):
+            problems.append(siteResult['site'] + " - No response after " + str(siteTimeout) + " seconds")
+            ArcGISServerMessages.addError(problems[-1] + "...")
+        else:
+            problems.append(siteResult['site'] + " - Unable to check the site")
+            ArcGISServerMessages.addError(problems[-1] + "...")
+
+    # If any sites have problems
+    if (len(problems) > 0):
+        ArcGISServerMessages.addError(str(len(problems)) + " of " + str(len(siteResults)) + " sites have problems...")
+        # If logging
+        if (logging == "true") or (sendErrorEmail == "true"):
+            loggingFunction(logFile,"error","\n".join(problems))
+            sys.exit()
+    else:
+        ArcGISServerMessages.addMessage("All services are running on all " + str(len(siteResults)) + " sites...")
+        # If logging
+        if (logging == "true") or (sendErrorEmail == "true"):
+            loggingFunction(logFile,"info","All services are running on all " + str(len(siteResults)) + " sites...")
+    return problems
+# End of report sites function
+
+
+# Start of check site machines function
+def checkSiteMachines(serverName, serverPort, protocol, username, password, service, probe="false"):
+    # Get token
+    token = getToken(username, password, serverName, serverPort, protocol)
+    if (token == -1):
+        return -1
+
+    # Get the machines in the site
+    machineList = getMachines(serverName, serverPort, protocol, token)
+    if (machineList == -1):
+        return -1
+    # Site URL of each machine from its admin URL e.g. https://machine:6443/arcgis/admin
+    machineSites = []
+    for machineName, adminURL in machineList:
+        machineSite = adminURL.rstrip("/")
+        if machineSite.endswith("/admin"):
+            machineSite = machineSite[:-len("/admin")]
+        machineSites.append(machineSite)
+
+    # Get the state of each machine from the site while the services on each machine are checked directly
+    pool = ThreadPool(max(1, min(len(machineList), probeConcurrency)))
+    try:
+        machineStates = pool.map_async(functools.partial(getMachineStatus, serverName, serverPort, protocol, token), [machineName for machineName, adminURL in machineList])
+        siteResults = checkSites(machineSites, username, password, service, probe)
+        machineStates = machineStates.get(siteTimeout)
+    finally:
+        pool.close()
+        pool.join()
+
+    machineResults = []
+    for (machineName, adminURL), state, siteResult in zip(machineList, machineStates, siteResults):
+        siteResult['machine'] = machineName
+        siteResult['state'] = state
+        machineResults.append(siteResult)
+    return machineResults
+# End of check site machines function
+
+
+# Start of get machines function
+def getMachines(serverName, serverPort, protocol, token):
     params = urllib.urlencode({'token': token, 'f': 'json'})
 
-    # Services list
-    services = []
-    
-    # Construct URL to get services
-    url = "/arcgis/admin/services"
+    # Post to the server
+    try:
+        response, data = postToServer(serverName, serverPort, protocol, "/arcgis/admin/machines", params)
+    except:
+        ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+        # Log error
+        if (logging == "true") or (sendErrorEmail == "true"):
+            loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+            sys.exit()
+        return -1
+
+    # If there is an error
+    if (response.status != 200) or (not assertJsonSuccess(data)):
+        ArcGISServerMessages.addError("Error getting the machines in the site.")
+        # Log error
+        if (logging == "true") or (sendErrorEmail == "true"):
+            loggingFunction(logFile,"error","Error getting the machines in the site.")
+            sys.exit()
+        return -1
+    # Name and admin URL of each machine
+    return [(machine['machineName'], machine['adminURL']) for machine in json.loads(data)['machines']]
+# End of get machines function
+
+
+# Start of get machine status function
+def getMachineStatus(serverName, serverPort, protocol, token, machineName):
+    params = urllib.urlencode({'token': token, 'f': 'json'})
+    try:
+        response, data = postToServer(serverName, serverPort, protocol, "/arcgis/admin/machines/" + machineName + "/status", params)
+        return json.loads(data)['realTimeState'] if (response.status == 200) else "UNKNOWN"
+    # The state is only informational, the machine is still checked directly
+    except (httplib.HTTPException, socket.error, ValueError, KeyError):
+        return "UNKNOWN"
+# End of get machine status function
+
+
+# Start of report machines function
+def reportMachines(machineResults):
+    # Show the state of each machine, then the services that are not healthy on every machine
+    problems = []
+    machineColumns = [machineResult['machine'] for machineResult in machineResults]
+    serviceStates = {}
+    for machineResult in machineResults:
+        if (machineResult['result'] == "OK"):
+            machineProblems, machineWarnings = getProblems(machineResult['servicesStatus'])
+            summary = str(len(machineResult['servicesStatus'])) + " services" + (" - " + ", ".join(machineProblems + machineWarnings) if (machineProblems or machineWarnings) else "")
+            for eachServicesStatus in machineResult['servicesStatus']:
+                serviceStates.setdefault(eachServicesStatus['service'], {})[machineResult['machine']] = getServiceState(eachServicesStatus)
+        elif (machineResult['result'] == "TIMEOUT"):
+            summary = "No response after " + str(siteTimeout) + " seconds"
+        else:
+            summary = "Unable to check the machine"
+        if (machineResult['result'] != "OK") or (machineResult['state'] != "STARTED"):
+            problems.append(machineResult['machine'] + " is " + machineResult['state'] + " - " + summary)
+        ArcGISServerMessages.addMessage("{0:<24} {1:<10} {2:>8.3f}s  {3}".format(machineResult['machine'], machineResult['state'], machineResult['seconds'], summary))
+
+    # Health matrix of the services that are not healthy on every machine that was checked
+    checkedColumns = [machineResult['machine'] for machineResult in machineResults if machineResult['result'] == "OK"]
+    matrixRows = []
+    for serviceName in sorted(serviceStates):
+        states = [serviceStates[serviceName].get(machineName, "MISSING") for machineName in checkedColumns]
+        if any(state not in healthyStatuses for state in states):
+            matrixRows.append(serviceName)
+            problems.append(serviceName + " - " + ", ".join(machineName + " " + state for machineName, state in zip(checkedColumns, states) if state not in healthyStatuses))
+    if (len(matrixRows) > 0):
+        ArcGISServerMessages.addMessage("{0:<48} ".format("Service") + " ".join("{0:<12}".format(machineName[:12]) for machineName in checkedColumns))
+        for serviceName in matrixRows:
+            ArcGISServerMessages.addMessage("{0:<48} ".format(serviceName) + " ".join("{0:<12}".format(serviceStates[serviceName].get(machineName, "MISSING")) for machineName in checkedColumns))
+
+    # Write the status of every service on every machine
+    if machineMatrixFile:
+        with open(machineMatrixFile, "wb") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Service"] + machineColumns)
+            writer.writerow(["(machine)"] + [machineResult['state'] if machineResult['result'] == "OK" else machineResult['result'] for machineResult in machineResults])
+            for serviceName in sorted(serviceStates):
+                writer.writerow([serviceName.encode("utf-8")] + [serviceStates[serviceName].get(machineName, "MISSING" if machineName in checkedColumns else "") for machineName in machineColumns])
+
+    # If any machines or services have problems
+    if (len(problems) > 0):
+        ArcGISServerMessages.addError(str(len(problems)) + " problems on " + str(len(machineResults)) + " machines...")
+        # If logging
+        if (logging == "true") or (sendErrorEmail == "true"):
+            loggingFunction(logFile,"error","\n".join(problems))
+            sys.exit()
+    else:
+        ArcGISServerMessages.addMessage("All services are running on all " + str(len(machineResults)) + " machines...")
+        # If logging
+        if (logging == "true") or (sendErrorEmail == "true"):
+            loggingFunction(logFile,"info","All services are running on all " + str(len(machineResults)) + " machines...")
+    return problems
+# End of report machines function
+
+
+# Start of get service state function
+def getServiceState(eachServicesStatus):
+    # Use the probe result for started services if they were probed
+    if (eachServicesStatus['status'] == "STARTED") and ('health' in eachServicesStatus):
+        return eachServicesStatus['health']
+    # The status could not be read
+    if (eachServicesStatus['status'] == -1):
+        return "ERROR"
+    return str(eachServicesStatus['status'])
+# End of get service state function
+
+
+# Start of monitor site function
+def monitorSite(serverName, serverPort, protocol, username, password, service, checkInterval, probe="false", agsServerSite=""):
+    # The token, connections and list of folders are kept between checks, so each check only queries the service status
+    checkTimes = LatencyHistogram.newHistogram()
+    folders = None
+    foldersRead = 0
+    previousProblems = []
+    checkNumber = 0
+    nextCheck = time.time()
+    ArcGISServerMessages.addMessage("Checking services every " + str(checkInterval) + " seconds...")
+
+    try:
+        while (monitorChecks == 0) or (checkNumber < monitorChecks):
+            checkNumber = checkNumber + 1
+            checkStart = time.time()
+
+            del runErrors[:]
+            try:
+                # Re-read the list of folders periodically to pick up new and deleted folders
+                if (len(str(service)) == 0) and ((folders is None) or (checkStart - foldersRead > folderListRefresh)):
+                    folders = None
+                    token = getToken(username, password, serverName, serverPort, protocol)
+                    if (token != -1):
+                        folders = getFolders(serverName, serverPort, protocol, token)
+                        foldersRead = checkStart
+                    if (folders == -1):
+                        folders = None
+
+                servicesStatus = checkSite(serverName, serverPort, protocol, username, password, service, folders, probe)
+            # Carry on to the next check if this one fails
+            except SystemExit:
+                servicesStatus = -1
+            checkSeconds = time.time() - checkStart
+            LatencyHistogram.addValue(checkTimes, checkSeconds)
+
+            if (servicesStatus == -1):
+                # Get a new token and list of folders on the next check
+                ArcGISServerToken.clearToken(protocol + "://" + serverName + ":" + str(serverPort), username, password, "referer:backuputility", tokenCacheFile)
+                folders = None
+                ArcGISServerMessages.addError("Check " + str(checkNumber) + " failed after " + "%.3f" % checkSeconds + " seconds...")
+                checkProblems = None
+            else:
+                problems, warnings = getProblems(servicesStatus)
+                checkProblems = problems + warnings
+                if (len(problems) > 0):
+                    ArcGISServerMessages.addError("Check " + str(checkNumber) + " - " + ", ".join(checkProblems) + " (" + str(len(servicesStatus)) + " services, " + "%.3f" % checkSeconds + " seconds)...")
+                elif (len(warnings) > 0):
+                    ArcGISServerMessages.addWarning("Check " + str(checkNumber) + " - " + ", ".join(checkProblems) + " (" + str(len(servicesStatus)) + " services, " + "%.3f" % checkSeconds + " seconds)...")
+                else:
+                    ArcGISServerMessages.addMessage("Check " + str(checkNumber) + " - All " + str(len(servicesStatus)) + " services are running (" + "%.3f" % checkSeconds + " seconds)...")
+
+            # Email any services that have gone down or recovered since the last check
+            sendAlerts({agsServerSite: servicesStatus}, service)
+            recordMetrics({agsServerSite: servicesStatus}, {agsServerSite: checkSeconds})
+
+            # Only log when the problems change, rather than on every check
+            if (checkProblems != previousProblems) and (logging == "true"):
+                if (checkProblems == []):
+                    loggingFunction(logFile,"info","All services are running...")
+                elif (checkProblems is None):
+                    loggingFunction(logFile,"error","Unable to check the ArcGIS Server site on " + serverName)
+                else:
+                    loggingFunction(logFile,"error",", ".join(checkProblems))
+            previousProblems = checkProblems
+
+            # Wait until the next check is due, skipping any checks missed while this one ran
+            nextCheck = nextCheck + checkInterval
+            if (nextCheck < time.time()):
+                nextCheck = time.time()
+            if (monitorChecks == 0) or (checkNumber < monitorChecks):
+                time.sleep(max(0, nextCheck - time.time()))
+    # Stop monitoring on Ctrl+C
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ArcGISServerConnection.closeConnections()
+
+    ArcGISServerMessages.addMessage("Ran " + str(checkTimes['count']) + " checks - Check time P50 " + "%.3f" % LatencyHistogram.getPercentile(checkTimes, 50) + " seconds, P90 " + "%.3f" % LatencyHistogram.getPercentile(checkTimes, 90) + " seconds, Max " + "%.3f" % checkTimes['max'] + " seconds...")
+    poolStatistics = ArcGISServerConnection.getPoolStatistics()
+    ArcGISServerMessages.addMessage("Requests - " + str(poolStatistics['successes']) + " succeeded, " + str(poolStatistics['serverErrors']) + " server errors, " + str(poolStatistics['timeouts']) + " timed out, " + str(poolStatistics['connectionErrors']) + " connection errors, " + str(poolStatistics['retries']) + " retried, " + str(poolStatistics['breakerRejected']) + " failed fast...")
+    return checkTimes
+# End of monitor site function
+
+
+# Start of check site function
+def checkSite(serverName, serverPort, protocol, username, password, service, folders=None, probe="false"):
+    # Get token
+    token = getToken(username, password, serverName, serverPort, protocol)
+
+    # If token not received
+    if (token == -1):
+        return -1
+
+    # List to hold services and their status
+    servicesStatus = []
+
+    # If a service is provided
+    if (len(str(service)) > 0):
+        # Query the service status
+        realtimeStatus = getServiceStatus(serverName, serverPort, protocol, service, token)
+        serviceDetails = {'status': realtimeStatus, 'service': service}
+        servicesStatus.append(serviceDetails)
+    # Else
+    else:
+        # Get all folders if they have not been provided
+        if (folders is None):
+            folders = getFolders(serverName, serverPort, protocol, token)
+            if (folders == -1):
+                return -1
+
+        # Iterate through folders
+        for folder in folders:
+            folderStatus = getFolderStatus(serverName, serverPort, protocol, folder, token)
+            if (folderStatus == -1):
+                return -1
+            servicesStatus.extend(folderStatus)
+
+    # Check the started services respond to requests
+    if (probe == "true"):
+        probeSite(serverName, serverPort, protocol, servicesStatus, token)
+    return servicesStatus
+# End of check site function
+
+
+# Start of probe site function
+def probeSite(serverName, serverPort, protocol, servicesStatus, token):
+    # Probe the started services at the same time, adding the health and response time to each one
+    startedServices = [eachServicesStatus for eachServicesStatus in servicesStatus if eachServicesStatus['status'] == "STARTED"]
+    pool = ThreadPool(max(1, int(probeConcurrency)))
+    try:
+        probeResults = pool.map(functools.partial(probeService, serverName, serverPort, protocol, token), [eachServicesStatus['service'] for eachServicesStatus in startedServices])
+    finally:
+        pool.close()
+        pool.join()
+
+    for eachServicesStatus, (health, seconds, message) in zip(startedServices, probeResults):
+        eachServicesStatus['health'] = health
+        eachServicesStatus['seconds'] = seconds
+        if (health == "FAILED"):
+            ArcGISServerMessages.addError(eachServicesStatus['service'] + " failed the probe - " + message + "...")
+        elif (health == "SLOW"):
+            ArcGISServerMessages.addWarning(eachServicesStatus['service'] + " took " + "%.3f" % seconds + " seconds to respond...")
+    return servicesStatus
+# End of probe site function
+
+
+# Start of probe service function
+def probeService(serverName, serverPort, protocol, token, service):
+    # Returns the health (HEALTHY, SLOW or FAILED), the seconds the probe took and a message
+    serviceName, serviceType = service.rsplit(".", 1)
+    url = "/arcgis/rest/services/" + serviceName + "/" + serviceType
+    params = {'token': token, 'f': 'json'}
+    requestStart = time.time()
+    try:
+        # Count the features in the first layer
+        if (serviceType == "MapServer") and (probeMethod == "query"):
+            url = url + "/0/query"
+            params.update({'where': '1=1', 'returnCountOnly': 'true'})
+        # Export a small image from the middle of the map
+        elif (serviceType == "MapServer"):
+            extent = getServiceExtent(serverName, serverPort, protocol, url, token)
+            width = (extent['xmax'] - extent['xmin']) / 100
+            height = (extent['ymax'] - extent['ymin']) / 100
+            centreX = (extent['xmin'] + extent['xmax']) / 2
+            centreY = (extent['ymin'] + extent['ymax']) / 2
+            url = url + "/export"
+            params.update({'bbox': ",".join(str(value) for value in [centreX - width, centreY - height, centreX + width, centreY + height]), 'size': '16,16', 'format': 'png', 'f': 'image'})
+        # Otherwise just get the service description
+        requestStart = time.time()
+        # Not retried, so a failing service is not hidden by a retry that works
+        response, data = postToServer(serverName, serverPort, protocol, url, urllib.urlencode(params), probeTimeout, False)
+    except socket.timeout:
+        return "FAILED", time.time() - requestStart, "No response after " + str(probeTimeout) + " seconds"
+    except (httplib.HTTPException, socket.error, ValueError, KeyError), e:
+        return "FAILED", time.time() - requestStart, str(e) or type(e).__name__
+    seconds = time.time() - requestStart
+
+    # If there is an error
+    if (response.status != 200):
+        return "FAILED", seconds, "HTTP " + str(response.status) + " " + response.reason
+    if not (response.getheader("Content-Type") or "").startswith("image/"):
+        try:
+            dataObject = json.loads(data)
+        except ValueError:
+            return "FAILED", seconds, "Invalid response"
+        if "error" in dataObject:
+            return "FAILED", seconds, str(dataObject['error'].get('message'))
+
+    if (seconds >= probeSlowSeconds):
+        return "SLOW", seconds, ""
+    return "HEALTHY", seconds, ""
+# End of probe service function
+
+
+# Start of get service extent function
+def getServiceExtent(serverName, serverPort, protocol, serviceURL, token):
+    extentKey = (protocol, serverName, str(serverPort), serviceURL)
+    if extentKey not in serviceExtents:
+        response, data = postToServer(serverName, serverPort, protocol, serviceURL, urllib.urlencode({'token': token, 'f': 'json'}), probeTimeout)
+        dataObject = json.loads(data)
+        if "error" in dataObject:
+            raise ValueError(str(dataObject['error'].get('message')))
+        serviceExtents[extentKey] = dataObject.get('initialExtent') or dataObject['fullExtent']
+    return serviceExtents[extentKey]
+# End of get service extent function
+
+
+# Start of get problems function
+def getProblems(servicesStatus):
+    # Services that are stopped or failed the probe, and services that were slow to respond
+    problems = []
+    warnings = []
+    stoppedServices = countStoppedServices(servicesStatus)
+    if (stoppedServices > 0):
+        problems.append(str(stoppedServices) + " services are stopped")
+    failedServices = len([eachServicesStatus for eachServicesStatus in servicesStatus if eachServicesStatus.get('health') == "FAILED"])
+    if (failedServices > 0):
+        problems.append(str(failedServices) + " services failed the probe")
+    slowServices = len([eachServicesStatus for eachServicesStatus in servicesStatus if eachServicesStatus.get('health') == "SLOW"])
+    if (slowServices > 0):
+        warnings.append(str(slowServices) + " services are slow")
+    return problems, warnings
+# End of get problems function
+
+
+# Start of count stopped services function
+def countStoppedServices(servicesStatus):
+    stoppedServices = 0
+    # Iterate through services
+    for eachServicesStatus in servicesStatus:
+        # If status is stopped at to counter
+        if (eachServicesStatus['status'] == "STOPPED"):
+            stoppedServices = stoppedServices + 1
+    return stoppedServices
+# End of count stopped services function
+
+
+# Start of get folders function
+def getFolders(serverName, serverPort, protocol, token):
+    # Root folder and the folders in it
+    folderListing = getFolderListing(serverName, serverPort, protocol, "", token)
+    if (folderListing == -1):
+        return -1
+    return [""] + folderListing['folders']
+# End of get folders function
+
+
+# Start of get folder status function
+def getFolderStatus(serverName, serverPort, protocol, folder, token):
+    # List to hold services and their status
+    servicesStatus = []
+    siteKey = (protocol, serverName, str(serverPort))
+
+    # Use the folder report to get the status of all the services in one request, unless the server does not support it
+    if (reportSupported.get(siteKey) != False):
+        report = getFolderReport(serverName, serverPort, protocol, folder, token)
+        if (report is None):
+            # Only fall back for good if the server says it has no report and it has never worked on this server
+            if (reportSupported.get(siteKey) is None):
+                reportSupported[siteKey] = False
+        elif (report != -1):
+            reportSupported[siteKey] = True
+            return report
+        # If the report could not be read this time, check the services one by one for this check only
+
+    # Otherwise get the services in the folder from the catalog, or list them, and query the status of each one
+    folderServices = getCatalogServices(serverName, serverPort, protocol, folder, token)
+    if (folderServices is None):
+        folderListing = getFolderListing(serverName, serverPort, protocol, folder, token)
+        if (folderListing == -1):
+            return -1
+        folderServices = [eachService['serviceName'] + "." + eachService['type'] for eachService in folderListing['services']]
+    # Iterate through services
+    for eachService in folderServices:
+        serviceName = (folder + "/" if folder else "") + eachService
+        # Query the service status
+        realtimeStatus = getServiceStatus(serverName, serverPort, protocol, serviceName, token)
+        serviceDetails = {'status': realtimeStatus, 'service': serviceName}
+        servicesStatus.append(serviceDetails)
+    return servicesStatus
+# End of get folder status function
+
+
+# Start of get catalog services function
+def getCatalogServices(serverName, serverPort, protocol, folder, token):
+    try:
+        catalog = ArcGISServerCatalog.getCatalog(serverName, serverPort, protocol, token, catalogFile)
+        # Read the catalog again if the folder is new
+        if (folder not in catalog['services']):
+            catalog = ArcGISServerCatalog.refreshCatalog(serverName, serverPort, protocol, token, catalogFile)
+        return catalog['services'].get(folder)
+    # List the folder instead
+    except Exception:
+        return None
+# End of get catalog services function
+
+
+# Start of get folder report function
+# Returns the status of the services in the folder, None if the server does not have the report, or -1 if it could not be read
+def getFolderReport(serverName, serverPort, protocol, folder, token):
+    params = urllib.urlencode({'token': token, 'f': 'json'})
+
+    # Construct URL to get the report for the folder (ArcGIS Server 10.2+)
+    url = "/arcgis/admin/services/" + (folder + "/" if folder else "") + "report"
+
+    # Post to the server
+    try:
+        response, data = postToServer(serverName, serverPort, protocol, url, params)
+    except (httplib.HTTPException, socket.error):
+        return -1
+    # The server does not have the report (ArcGIS Server 10.1)
+    if (response.status == 404):
+        return None
+    if (response.status != 200):
+        return -1
+    try:
+        dataObject = json.loads(data)
+    except ValueError:
+        return -1
+
+    # The server answered without a report, unless it was an error other than not found
+    if ('reports' not in dataObject):
+        if (dataObject.get('code', 404) != 404):
+            return -1
+        return None
+
+    # Iterate through services
+    servicesStatus = []
+    for eachService in dataObject['reports']:
+        serviceDetails = {'status': eachService['status']['realTimeState'], 'service': getServiceName(folder, eachService)}
+        servicesStatus.append(serviceDetails)
+    return servicesStatus
+# End of get folder report function
+
+
+# Start of get service name function
+def getServiceName(folder, serviceDetails):
+    # Service name in the form used in admin URLs e.g. Folder/Service.MapServer
+    return (folder + "/" if folder else "") + serviceDetails['serviceName'] + "." + serviceDetails['type']
+# End of get service name function
+
+
+# Start of get folder listing function
+def getFolderListing(serverName, serverPort, protocol, folder, token):
+    params = urllib.urlencode({'token': token, 'f': 'json'})
+
+    # Construct URL to get services for the folder
+    url = "/arcgis/admin/services" + ("/" + folder if folder else "")
 
     # Post to the server
     try:
         response, data = postToServer(serverName, serverPort, protocol, url, params)
     except:
-        arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+        ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
@@ -158,71 +855,24 @@ def getServices(serverName, serverPort, protocol, token):
 
     # If there is an error
     if (response.status != 200):
-        arcpy.AddError("Error getting services.")
-        arcpy.AddError(str(data))
+        ArcGISServerMessages.addError("Error getting services.")
+        ArcGISServerMessages.addError(str(data))
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error getting services.")
             sys.exit()
         return -1
     if (not assertJsonSuccess(data)):
-        arcpy.AddError("Error getting services. Please check if the server is running and ensure that the username/password provided are correct.")
+        ArcGISServerMessages.addError("Error getting services. Please check if the server is running and ensure that the username/password provided are correct.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
-            loggingFunction(logFile,"error","Error getting services. Please check if the server is running and ensure that the username/password provided are correct.")  
+            loggingFunction(logFile,"error","Error getting services. Please check if the server is running and ensure that the username/password provided are correct.")
             sys.exit()
         return -1
     # On successful query
     else: 
-        dataObject = json.loads(data)
-        
-        # Iterate through services
-        for eachService in dataObject['services']:
-            # Add to list
-            services.append(eachService['serviceName'] + "." + eachService['type'])
-                    
-        # Iterate through folders
-        for folder in dataObject['folders']:
-
-            # Construct URL to get services for the folder
-            url = "/arcgis/admin/services/" + folder
-
-            # Post to the server
-            try:
-                response, data = postToServer(serverName, serverPort, protocol, url, params)
-            except:
-                arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
-                # Log error
-                if (logging == "true") or (sendErrorEmail == "true"):       
-                    loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
-                    sys.exit()
-                return -1
-    
-            # If there is an error
-            if (response.status != 200):
-                arcpy.AddError("Error getting services.")
-                arcpy.AddError(str(data))
-                # Log error
-                if (logging == "true") or (sendErrorEmail == "true"):       
-                    loggingFunction(logFile,"error","Error getting services.")
-                    sys.exit()
-                return -1
-            if (not assertJsonSuccess(data)):
-                arcpy.AddError("Error getting services. Please check if the server is running and ensure that the username/password provided are correct.")
-                # Log error
-                if (logging == "true") or (sendErrorEmail == "true"):       
-                    loggingFunction(logFile,"error","Error getting services. Please check if the server is running and ensure that the username/password provided are correct.")
-                    sys.exit()
-                return -1
-            # On successful query
-            else: 
-                dataObject = json.loads(data)
-                # Iterate through services
-                for eachService in dataObject['services']:                
-                    services.append(folder + "/" + eachService['serviceName']+ "." + eachService['type'])
-        # Return a list of services
-        return services                    
-# End of get services function
+        return json.loads(data)
+# End of get folder listing function
 
 
 # Start of get service status function
@@ -236,7 +886,7 @@ def getServiceStatus(serverName, serverPort, protocol, service, token):
     try:
         response, data = postToServer(serverName, serverPort, protocol, url, params)
     except:
-        arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+        ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
@@ -245,15 +895,15 @@ def getServiceStatus(serverName, serverPort, protocol, service, token):
 
     # If there is an error
     if (response.status != 200):
-        arcpy.AddError("Error getting service status.")
+        ArcGISServerMessages.addError("Error getting service status.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error getting service status.")
             sys.exit()
-        arcpy.AddError(str(data))
+        ArcGISServerMessages.addError(str(data))
         return -1
     if (not assertJsonSuccess(data)):
-        arcpy.AddError("Error getting service status. Please check if the server is running and ensure that the username/password provided are correct.")
+        ArcGISServerMessages.addError("Error getting service status. Please check if the server is running and ensure that the username/password provided are correct.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error getting service status. Please check if the server is running and ensure that the username/password provided are correct.")
@@ -269,6 +919,12 @@ def getServiceStatus(serverName, serverPort, protocol, service, token):
 
 # Start of get token function
 def getToken(username, password, serverName, serverPort, protocol):
+    # Use the cached token for the site if it has not expired
+    tokenSite = protocol + "://" + serverName + ":" + str(serverPort)
+    token = ArcGISServerToken.getCachedToken(tokenSite, username, password, "referer:backuputility", tokenCacheFile, lambda: getToken(username, password, serverName, serverPort, protocol))
+    if token:
+        return token
+
     params = urllib.urlencode({'username': username.decode(sys.stdin.encoding or sys.getdefaultencoding()).encode('utf-8'), 'password': password.decode(sys.stdin.encoding or sys.getdefaultencoding()).encode('utf-8'),'client': 'referer','referer':'backuputility','f': 'json'})
            
     # Construct URL to get a token
@@ -277,7 +933,7 @@ def getToken(username, password, serverName, serverPort, protocol):
     try:
         response, data = postToServer(serverName, serverPort, protocol, url, params)
     except:
-        arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+        ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
@@ -285,15 +941,15 @@ def getToken(username, password, serverName, serverPort, protocol):
         return -1    
     # If there is an error getting the token
     if (response.status != 200):
-        arcpy.AddError("Error while generating the token.")
-        arcpy.AddError(str(data))
+        ArcGISServerMessages.addError("Error while generating the token.")
+        ArcGISServerMessages.addError(str(data))
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error while generating the token.")
             sys.exit()
         return -1
     if (not assertJsonSuccess(data)):
-        arcpy.AddError("Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
+        ArcGISServerMessages.addError("Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
@@ -306,45 +962,29 @@ def getToken(username, password, serverName, serverPort, protocol):
 
         # Return the token if available
         if "error" in dataObject:
-            arcpy.AddError("Error retrieving token.")
+            ArcGISServerMessages.addError("Error retrieving token.")
             # Log error
             if (logging == "true") or (sendErrorEmail == "true"):       
                 loggingFunction(logFile,"error","Error retrieving token.")
                 sys.exit()
             return -1        
         else:
+            # Cache the token until it expires
+            ArcGISServerToken.storeToken(tokenSite, username, password, "referer:backuputility", dataObject['token'], dataObject.get('expires'), tokenCacheFile, lambda: getToken(username, password, serverName, serverPort, protocol))
             return dataObject['token']
 # End of get token function
 
 
 # Start of HTTP POST request to the server function
-def postToServer(serverName, serverPort, protocol, url, params):
-    # If on standard port
-    if (serverPort == -1 and protocol == 'http'):
-        serverPort = 80
-
-    # If on secure port
-    if (serverPort == -1 and protocol == 'https'):
-        serverPort = 443
-        
-    if (protocol == 'http'):
-        httpConn = httplib.HTTPConnection(serverName, int(serverPort))
-
-    if (protocol == 'https'):
-        httpConn = httplib.HTTPSConnection(serverName, int(serverPort))
-        
+# idempotent requests only read from the server, so are retried if they fail
+def postToServer(serverName, serverPort, protocol, url, params, timeout=None, idempotent=True):
     headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain",'referer':'backuputility','referrer':'backuputility'}
      
     # URL encode the resource URL
     url = urllib.quote(url.encode('utf-8'))
 
-    # Build the connection to add the roles to the server
-    httpConn.request("POST", url, params, headers) 
-
-    response = httpConn.getresponse()
-    data = response.read()
-
-    httpConn.close()
+    # Post to the server over a pooled connection
+    response, data = ArcGISServerConnection.request(serverName, serverPort, protocol, "POST", url, params, headers, timeout, idempotent)
 
     # Return response
     return (response, data)
@@ -385,7 +1025,7 @@ def splitSiteURL(siteURL):
         # Return variables
         return protocol, serverName, serverPort, context  
     except:
-        arcpy.AddError("The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
+        ArcGISServerMessages.addError("The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
@@ -401,7 +1041,7 @@ def assertJsonSuccess(data):
         if ('messages' in obj):
             errMsgs = obj['messages']
             for errMsg in errMsgs:
-                arcpy.AddError(errMsg)
+                ArcGISServerMessages.addError(errMsg)
                 # Log error
                 if (logging == "true") or (sendErrorEmail == "true"):       
                     loggingFunction(logFile,"error",errMsg)
@@ -437,21 +1077,8 @@ def loggingFunction(logFile,result,info):
             f.write("Error: " + str(info) + "\n")        
             f.write("---" + "\n")
     if (result == "error") and (sendErrorEmail == "true"):            
-        # Send an email
-        arcpy.AddMessage("Sending email...")
-        # Server and port information
-        smtpserver = smtplib.SMTP("smtp.gmail.com",587) 
-        smtpserver.ehlo()
-        smtpserver.starttls() 
-        smtpserver.ehlo
-        # Login with sender email address and password
-        smtpserver.login(emailUser, emailPassword)
-        # Email content
-        header = 'To:' + emailTo + '\n' + 'From: ' + emailUser + '\n' + 'Subject:' + emailSubject + '\n'
-        message = header + '\n' + emailMessage + '\n' + '\n' + info
-        # Send the email and close the connection
-        smtpserver.sendmail(emailUser, emailTo, message)
-        smtpserver.close()                
+        # Keep the error to send with the alerts at the end of the check
+        runErrors.append(info)
 # End of logging function    
 
 # This test allows the script to be used from the operating
@@ -460,7 +1087,6 @@ def loggingFunction(logFile,result,info):
 # another script
 if __name__ == '__main__':
     # Arguments are optional - If running from ArcGIS Desktop tool, parameters will be loaded into *argv
-    argv = tuple(arcpy.GetParameterAsText(i)
-        for i in range(arcpy.GetArgumentCount()))
+    argv = ArcGISServerMessages.getParameters()
     mainFunction(*argv)
     
@@ -0,0 +1,185 @@
+#-------------------------------------------------------------
+# Name:       ArcGIS Server Benchmark
+# Purpose:    Benchmarks the admin toolkit against the local ArcGIS Server stand-in. Measures the
+#             throughput and request latency of listing services, checking service status,
+#             stopping/starting all services, generating log stats and importing users at
+#             different numbers of services, and how long each script takes to start.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import os
+import sys
+import csv
+import time
+import tempfile
+import subprocess
+import ArcGISServerStandIn
+import ArcGISServerConnection
+import LatencyHistogram
+import ArcGISServerAdmin
+import ArcGISServerAvailability
+import ImportArcGISServerUsers
+
+# Set variables
+scales = [10, 1000, 10000]
+# Log messages to generate for each service in the log stats benchmark
+logMessagesPerService = 10
+# Modules to time starting Python and importing, "" is Python on its own
+startupModules = ["", "ArcGISServerAdmin", "ArcGISServerAvailability", "ArcGISServerPermissions", "ImportArcGISServerUsers", "BackupRestoreAGSSite", "arcpy"]
+startupRepeats = 5
+
+# Latencies of the requests made during a benchmark
+requestHistogram = LatencyHistogram.newHistogram()
+
+
+# Start of timed request function
+def timedRequest(*args, **kwargs):
+    requestStart = time.time()
+    try:
+        return untimedRequest(*args, **kwargs)
+    finally:
+        LatencyHistogram.addValue(requestHistogram, time.time() - requestStart)
+# End of timed request function
+
+# Time every request the tools make through the shared connection pool
+untimedRequest = ArcGISServerConnection.request
+ArcGISServerConnection.request = timedRequest
+
+
+# Start of main function
+# scaleList is a comma separated list of service counts e.g. "10,1000,10000"
+def mainFunction(scaleList="", latency=0.0, failureRate=0.0, resultsFile=""):
+    if scaleList:
+        benchmarkScales = [int(scale) for scale in str(scaleList).split(",")]
+    else:
+        benchmarkScales = scales
+    username = ArcGISServerStandIn.siteUsername
+    password = ArcGISServerStandIn.sitePassword
+    results = []
+
+    # Time starting each script in a new Python process
+    for moduleName in startupModules:
+        result = timeStartup(moduleName)
+        if result:
+            results.append(result)
+            printResult(result)
+        else:
+            print "{0:<36} could not be imported".format("startup " + moduleName)
+
+    for serviceCount in benchmarkScales:
+        server, site, port = ArcGISServerStandIn.startServer(serviceCount=serviceCount, latency=latency, failureRate=failureRate, logMessageCount=max(1000, serviceCount * logMessagesPerService))
+        siteURL = "http://127.0.0.1:{0}/arcgis".format(port)
+        statsFile = os.path.join(tempfile.gettempdir(), "ArcGISServerBenchmarkStats.txt")
+        usersFile = writeUsersFile(serviceCount)
+
+        scenarios = [("list", lambda: ArcGISServerAdmin.getServiceList("127.0.0.1", port, username, password)),
+                     ("status", lambda: ArcGISServerAvailability.mainFunction(siteURL, username, password, "")),
+                     ("stop all", lambda: ArcGISServerAdmin.stopStartServices("127.0.0.1", port, username, password, "stop", "all")),
+                     ("start all", lambda: ArcGISServerAdmin.stopStartServices("127.0.0.1", port, username, password, "start", "all")),
+                     ("log stats", lambda: ArcGISServerAdmin.generateserviceStats("127.0.0.1", port, username, password, "serviceStats", statsFile)),
+                     ("user import", lambda: ImportArcGISServerUsers.mainFunction(siteURL, username, password, usersFile))]
+        for scenarioName, scenario in scenarios:
+            results.append(runScenario(scenarioName, serviceCount, scenario, site))
+            printResult(results[-1])
+
+        server.shutdown()
+        server.server_close()
+        ArcGISServerConnection.closeConnections()
+        os.remove(usersFile)
+
+    # Write out the results
+    if resultsFile:
+        with open(resultsFile, "wb") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Scenario", "Services", "Requests", "Failed requests", "Seconds", "Requests per second", "P50 ms", "P90 ms", "P99 ms", "Max ms", "Completed"])
+            for result in results:
+                writer.writerow([result['scenario'], result['services'], result['requests'], result['failures'], result['seconds'], result['throughput'], result['p50'], result['p90'], result['p99'], result['max'], result['completed']])
+        print "Results written to " + resultsFile
+    return results
+# End of main function
+
+
+# Start of run scenario function
+def runScenario(scenarioName, serviceCount, scenario, site):
+    global requestHistogram
+    requestHistogram = LatencyHistogram.newHistogram()
+    requestCount = site['requestCount']
+    failureCount = site['failureCount']
+
+    # Hide the output of the tools while they run
+    standardOutput = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    completed = True
+    scenarioStart = time.time()
+    try:
+        scenario()
+    except (Exception, SystemExit):
+        completed = False
+    finally:
+        seconds = time.time() - scenarioStart
+        sys.stdout.close()
+        sys.stdout = standardOutput
+
+    requests = site['requestCount'] - requestCount
+    return {'scenario': scenarioName, 'services': serviceCount, 'requests': requests, 'failures': site['failureCount'] - failureCount,
+            'seconds': round(seconds, 3), 'throughput': round(requests / seconds, 1) if seconds > 0 else 0,
+            'p50': round(LatencyHistogram.getPercentile(requestHistogram, 50) * 1000, 2), 'p90': round(LatencyHistogram.getPercentile(requestHistogram, 90) * 1000, 2),
+            'p99': round(LatencyHistogram.getPercentile(requestHistogram, 99) * 1000, 2), 'max': round(requestHistogram['max'] * 1000, 2), 'completed': completed}
+# End of run scenario function
+
+
+# Start of time startup function
+def timeStartup(moduleName, repeats=startupRepeats):
+    startupHistogram = LatencyHistogram.newHistogram()
+    toolkitFolder = os.path.dirname(os.path.abspath(__file__))
+    startupStart = time.time()
+    with open(os.devnull, "w") as devnull:
+        for repeat in range(repeats):
+            importStart = time.time()
+            returnCode = subprocess.call([sys.executable, "-c", "import " + moduleName if moduleName else "pass"], cwd=toolkitFolder, stdout=devnull, stderr=devnull)
+            LatencyHistogram.addValue(startupHistogram, time.time() - importStart)
+            # Module is not installed, e.g. arcpy without ArcGIS Desktop
+            if (returnCode != 0):
+                return None
+    seconds = time.time() - startupStart
+
+    return {'scenario': "startup " + (moduleName or "python"), 'services': 0, 'requests': repeats, 'failures': 0,
+            'seconds': round(seconds, 3), 'throughput': round(repeats / seconds, 1) if seconds > 0 else 0,
+            'p50': round(LatencyHistogram.getPercentile(startupHistogram, 50) * 1000, 2), 'p90': round(LatencyHistogram.getPercentile(startupHistogram, 90) * 1000, 2),
+            'p99': round(LatencyHistogram.getPercentile(startupHistogram, 99) * 1000, 2), 'max': round(startupHistogram['max'] * 1000, 2), 'completed': True}
+# End of time startup function
+
+
+# Start of print result function
+def printResult(result):
+    if result['scenario'].startswith("startup "):
+        print "{0:<36} {1:>3} runs  p50 {2:.2f}ms p90 {3:.2f}ms max {4:.2f}ms".format(result['scenario'], result['requests'], result['p50'], result['p90'], result['max'])
+        return
+    print "{0:<12} {1:>6} services {2:>7} requests {3:>8.2f}s {4:>9.1f} req/s  p50 {5:.2f}ms p90 {6:.2f}ms p99 {7:.2f}ms max {8:.2f}ms{9}".format(
+        result['scenario'], result['services'], result['requests'], result['seconds'], result['throughput'], result['p50'], result['p90'], result['p99'], result['max'], "" if result['completed'] else "  (did not complete)")
+# End of print result function
+
+
+# Start of write users file function
+def writeUsersFile(userCount):
+    # Users CSV in the format used by Import ArcGIS Server Users
+    usersFile = os.path.join(tempfile.gettempdir(), "ArcGISServerBenchmarkUsers.csv")
+    with open(usersFile, "w") as f:
+        f.write("Username,Role,Privilege,Password,Email,Full Name,Description\n")
+        for number in range(userCount):
+            f.write("user{0},Role{1},ACCESS,Passw0rd,user{0}@example.com,User {0},Benchmark user\n".format(number, number % 10))
+    return usersFile
+# End of write users file function
+
+
+# Run the benchmark from the command prompt
+# e.g. python ArcGISServerBenchmark.py 10,1000,10000 0.005 0.01 C:\Temp\Benchmark.csv
+# (service counts, stand-in latency in seconds, fraction of requests to fail, results file)
+if __name__ == '__main__':
+    mainFunction(*sys.argv[1:])
@@ -0,0 +1,216 @@
+#-------------------------------------------------------------
+# Name:       ArcGIS Server Catalog
+# Purpose:    Caches the folders and services on each ArcGIS Server site, so the admin toolkit scripts
+#             can start work straight away rather than listing the root and every folder first. Once
+#             the catalog is older than the refresh period the folder listings are read again in the
+#             background and compared, and the catalog is only read before the run if it is very old.
+#             The catalog can optionally be kept in a local file to share it between runs.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import os
+import json
+import time
+import urllib
+import httplib
+import functools
+import threading
+from multiprocessing.pool import ThreadPool
+import ArcGISServerConnection
+
+# Set variables
+# Seconds after the catalog was last read that it is read again in the background
+refreshSeconds = 300
+# Seconds after the catalog was last read that it is read again before it is used
+maxAgeSeconds = 86400
+# Seconds to wait for each folder listing
+requestTimeout = 30
+# Number of folder listings to request at the same time
+concurrency = 8
+# Default location of the catalog file
+defaultCatalogFile = os.path.join(os.path.expanduser("~"), ".ArcGISAdminToolkitCatalog.json")
+
+# Catalogs for this process keyed by site, each has the folders, the services in each folder and when it was read
+cachedCatalogs = {}
+catalogLock = threading.Lock()
+# Background refreshes running for each site
+refreshThreads = {}
+catalogStatistics = {'hits': 0, 'reads': 0, 'backgroundReads': 0, 'changes': 0}
+
+
+# Start of get catalog function
+# Returns the catalog for the site, reading the folder listings if there is no catalog or it is too old.
+# The catalog is {'folders': ["", "Folder", ...], 'services': {folder: ["Service.MapServer", ...]}, 'validated': time}
+def getCatalog(serverName, serverPort, protocol, token, catalogFile=None):
+    site = getSiteKey(serverName, serverPort, protocol)
+    with catalogLock:
+        catalog = cachedCatalogs.get(site)
+        # If not in memory, look in the catalog file
+        if (catalog is None) and catalogFile:
+            catalog = readCatalogFile(catalogFile).get(site)
+            if catalog is not None:
+                cachedCatalogs[site] = catalog
+
+    # Read the catalog now if there is none or it is too old to use
+    if (catalog is None) or (time.time() - catalog['validated'] > maxAgeSeconds):
+        return refreshCatalog(serverName, serverPort, protocol, token, catalogFile)
+
+    # Otherwise use it and read it again in the background if it is due
+    with catalogLock:
+        catalogStatistics['hits'] += 1
+    if (time.time() - catalog['validated'] > refreshSeconds):
+        startRefresh(serverName, serverPort, protocol, token, catalogFile)
+    return catalog
+# End of get catalog function
+
+
+# Start of is cached function
+def isCached(catalog, since):
+    # Whether the catalog was read before the time given, i.e. it came from the cache
+    return catalog['validated'] < since
+# End of is cached function
+
+
+# Start of refresh catalog function
+def refreshCatalog(serverName, serverPort, protocol, token, catalogFile=None):
+    catalog = readSiteCatalog(serverName, serverPort, protocol, token)
+    storeCatalog(getSiteKey(serverName, serverPort, protocol), catalog, catalogFile)
+    with catalogLock:
+        catalogStatistics['reads'] += 1
+    return catalog
+# End of refresh catalog function
+
+
+# Start of start refresh function
+def startRefresh(serverName, serverPort, protocol, token, catalogFile=None):
+    site = getSiteKey(serverName, serverPort, protocol)
+    with catalogLock:
+        # Only one refresh of a site at a time
+        if (site in refreshThreads) and refreshThreads[site].is_alive():
+            return refreshThreads[site]
+        # Not a daemon thread, so a run that finishes first waits for the catalog to be saved
+        refreshThread = threading.Thread(target=backgroundRefresh, args=(serverName, serverPort, protocol, token, catalogFile))
+        refreshThreads[site] = refreshThread
+    refreshThread.start()
+    return refreshThread
+# End of start refresh function
+
+
+# Start of background refresh function
+def backgroundRefresh(serverName, serverPort, protocol, token, catalogFile):
+    try:
+        catalog = readSiteCatalog(serverName, serverPort, protocol, token)
+    except Exception:
+        # Keep using the catalog there is and try again on the next run
+        return
+    storeCatalog(getSiteKey(serverName, serverPort, protocol), catalog, catalogFile)
+    with catalogLock:
+        catalogStatistics['backgroundReads'] += 1
+# End of background refresh function
+
+
+# Start of wait for refreshes function
+def waitForRefreshes(timeout=None):
+    for refreshThread in refreshThreads.values():
+        refreshThread.join(timeout)
+# End of wait for refreshes function
+
+
+# Start of clear catalog function
+def clearCatalog(serverName, serverPort, protocol, catalogFile=None):
+    # Forget the catalog for a site, e.g. when a folder in it no longer exists
+    site = getSiteKey(serverName, serverPort, protocol)
+    with catalogLock:
+        cachedCatalogs.pop(site, None)
+        if catalogFile:
+            fileCatalogs = readCatalogFile(catalogFile)
+            if fileCatalogs.pop(site, None):
+                writeCatalogFile(catalogFile, fileCatalogs)
+# End of clear catalog function
+
+
+# Start of store catalog function
+def storeCatalog(site, catalog, catalogFile=None):
+    with catalogLock:
+        previousCatalog = cachedCatalogs.get(site)
+        if (previousCatalog is not None) and ((previousCatalog['folders'] != catalog['folders']) or (previousCatalog['services'] != catalog['services'])):
+            catalogStatistics['changes'] += 1
+        cachedCatalogs[site] = catalog
+        if catalogFile:
+            fileCatalogs = readCatalogFile(catalogFile)
+            fileCatalogs[site] = catalog
+            writeCatalogFile(catalogFile, fileCatalogs)
+# End of store catalog function
+
+
+# Start of read site catalog function
+def readSiteCatalog(serverName, serverPort, protocol, token):
+    readStart = time.time()
+    # List the root folder, then the other folders at the same time
+    rootListing = getListing(serverName, serverPort, protocol, token, "")
+    folders = rootListing['folders']
+    services = {"": [eachService['serviceName'] + "." + eachService['type'] for eachService in rootListing['services']]}
+    if (len(folders) > 0):
+        pool = ThreadPool(max(1, min(int(concurrency), len(folders))))
+        try:
+            folderListings = pool.map(functools.partial(getListing, serverName, serverPort, protocol, token), folders)
+        finally:
+            pool.close()
+            pool.join()
+        for folder, folderListing in zip(folders, folderListings):
+            services[folder] = [eachService['serviceName'] + "." + eachService['type'] for eachService in folderListing['services']]
+    return {'folders': [""] + folders, 'services': services, 'validated': readStart}
+# End of read site catalog function
+
+
+# Start of get listing function
+def getListing(serverName, serverPort, protocol, token, folder):
+    headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain", 'referer': 'backuputility', 'referrer': 'backuputility'}
+    params = urllib.urlencode({'token': token, 'f': 'json'})
+    url = urllib.quote(("/arcgis/admin/services" + ("/" + folder if folder else "")).encode('utf-8'))
+    response, data = ArcGISServerConnection.request(serverName, serverPort, protocol, "POST", url, params, headers, requestTimeout, True)
+    if (response.status != 200):
+        raise httplib.HTTPException("HTTP " + str(response.status) + " " + response.reason + " returned for " + url)
+    listing = json.loads(data)
+    if ('services' not in listing):
+        raise ValueError("Unable to list the services in " + (folder or "the root folder") + " - " + str(listing.get('messages', listing)))
+    return listing
+# End of get listing function
+
+
+# Start of get site key function
+def getSiteKey(serverName, serverPort, protocol):
+    return protocol + "://" + serverName + ":" + str(serverPort)
+# End of get site key function
+
+
+# Start of read catalog file function
+def readCatalogFile(catalogFile):
+    try:
+        with open(catalogFile, "r") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+# End of read catalog file function
+
+
+# Start of write catalog file function
+def writeCatalogFile(catalogFile, fileCatalogs):
+    tempFile = catalogFile + ".tmp"
+    try:
+        with open(tempFile, "w") as f:
+            json.dump(fileCatalogs, f)
+        # Replace the previous file
+        if (os.name == "nt") and os.path.exists(catalogFile):
+            os.remove(catalogFile)
+        os.rename(tempFile, catalogFile)
+    except (IOError, OSError):
+        # The catalog is only an optimisation, so carry on without it
+        pass
+# End of write catalog file function
@@ -0,0 +1,301 @@
+#-------------------------------------------------------------
+# Name:       ArcGIS Server Connection
+# Purpose:    Shared HTTP client used by the admin toolkit scripts. Keeps a pool of persistent
+#             HTTP/HTTPS connections per host so repeated requests to the same ArcGIS Server
+#             reuse a handful of sockets instead of opening a new connection for every request.
+#             Requests time out rather than waiting forever on a hung server, requests that only read
+#             are retried with a growing random delay, and requests to a host that keeps failing fail
+#             straight away for a while rather than each waiting to time out. A request the server
+#             rejects because its token is invalid or has expired is sent again once with a new token.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import time
+import random
+import socket
+import httplib
+import threading
+import ArcGISServerToken
+
+# Set variables
+maxIdleConnectionsPerHost = 10
+# Seconds to wait to connect to a server, and for the response once connected, None to wait forever
+connectTimeout = 10
+readTimeout = 60
+# Times to retry a request that only reads from the server, and the most seconds to wait before the first and any retry
+retries = 2
+retryDelay = 0.5
+maxRetryDelay = 10
+# Failures in a row before requests to a host fail straight away, and the seconds before the host is tried again, 0 to never
+breakerFailures = 5
+breakerResetSeconds = 30
+# HTTP statuses that mean the server itself is unavailable
+unavailableStatuses = [502, 503, 504]
+
+# Idle connections for each host, keyed by (protocol, server name, port)
+idleConnections = {}
+poolLock = threading.Lock()
+# Failures in a row and the time requests started failing straight away for each host
+hostBreakers = {}
+poolStatistics = {'requests': 0, 'connectionsCreated': 0, 'connectionsReused': 0, 'reconnects': 0, 'connectionsClosed': 0,
+                  'successes': 0, 'serverErrors': 0, 'timeouts': 0, 'connectionErrors': 0, 'retries': 0, 'breakerOpened': 0, 'breakerRejected': 0}
+
+
+# Raised instead of sending a request to a host that keeps failing
+class CircuitOpenError(socket.error):
+    pass
+
+
+# Start of get host key function
+def getHostKey(serverName, serverPort, protocol):
+    # If on standard port
+    if (str(serverPort) == "-1" and protocol == 'http'):
+        serverPort = 80
+
+    # If on secure port
+    if (str(serverPort) == "-1" and protocol == 'https'):
+        serverPort = 443
+
+    return (protocol, serverName, int(serverPort))
+# End of get host key function
+
+
+# Start of get connection function
+def getConnection(serverName, serverPort, protocol):
+    hostKey = getHostKey(serverName, serverPort, protocol)
+
+    # Reuse an idle connection to the host if there is one
+    with poolLock:
+        if (len(idleConnections.get(hostKey, [])) > 0):
+            poolStatistics['connectionsReused'] += 1
+            return hostKey, idleConnections[hostKey].pop(), True
+        poolStatistics['connectionsCreated'] += 1
+
+    # Otherwise open a new connection
+    if (protocol == 'https'):
+        httpConn = httplib.HTTPSConnection(hostKey[1], hostKey[2])
+    else:
+        httpConn = httplib.HTTPConnection(hostKey[1], hostKey[2])
+    return hostKey, httpConn, False
+# End of get connection function
+
+
+# Start of release connection function
+def releaseConnection(hostKey, httpConn):
+    with poolLock:
+        hostConnections = idleConnections.setdefault(hostKey, [])
+        # Keep the connection open for the next request unless the pool is full
+        if (len(hostConnections) < maxIdleConnectionsPerHost):
+            hostConnections.append(httpConn)
+            return
+        poolStatistics['connectionsClosed'] += 1
+    httpConn.close()
+# End of release connection function
+
+
+# Start of discard connection function
+def discardConnection(httpConn):
+    with poolLock:
+        poolStatistics['connectionsClosed'] += 1
+    httpConn.close()
+# End of discard connection function
+
+
+# Start of HTTP request function
+# timeout is the seconds to wait to connect and for the response, None uses connectTimeout and readTimeout.
+# Only failures of requests on the default timeout count towards failing the host straight away.
+# idempotent requests are retried if they fail, by default GET and HEAD requests. Set it for POST requests that only read.
+def request(serverName, serverPort, protocol, method, url, body=None, headers={}, timeout=None, idempotent=None):
+    hostKey = getHostKey(serverName, serverPort, protocol)
+    if idempotent is None:
+        idempotent = method in ["GET", "HEAD"]
+
+    # Requests with their own timeout (e.g. service probes and site backups) expect to be slow or to fail on their own,
+    # so only requests on the default timeout count the host as failing. Any response shows the host is up
+    countFailures = timeout is None
+    # Send any token that has been renewed as its new token
+    if ArcGISServerToken.renewedTokens:
+        url, body = ArcGISServerToken.replaceTokens(url, body)
+    tokenRenewed = False
+    attempt = 0
+    while True:
+        checkBreaker(hostKey)
+        try:
+            response, data = sendRequest(serverName, serverPort, protocol, method, url, body, headers, timeout, idempotent)
+        except socket.timeout:
+            countOutcome('timeouts')
+            if countFailures:
+                recordFailure(hostKey)
+            if not retryRequest(idempotent, attempt):
+                raise
+        except (httplib.HTTPException, socket.error):
+            countOutcome('connectionErrors')
+            if countFailures:
+                recordFailure(hostKey)
+            if not retryRequest(idempotent, attempt):
+                raise
+        else:
+            if (response.status < 500):
+                countOutcome('successes')
+                recordSuccess(hostKey)
+                # If the token was rejected, e.g. after the server restarted, get a new one and send the request again once
+                if (not tokenRenewed) and ArcGISServerToken.isTokenRejected(response.status, data):
+                    token = ArcGISServerToken.findToken(url, body)
+                    newToken = ArcGISServerToken.renewToken(token) if token else None
+                    if newToken:
+                        url, body = ArcGISServerToken.replaceTokens(url, body, token, newToken)
+                        tokenRenewed = True
+                        continue
+                return (response, data)
+            countOutcome('serverErrors')
+            if (response.status in unavailableStatuses) and countFailures:
+                recordFailure(hostKey)
+            elif response.status not in unavailableStatuses:
+                recordSuccess(hostKey)
+            # Return the error response once there are no retries left
+            if not retryRequest(idempotent, attempt):
+                return (response, data)
+        attempt += 1
+# End of HTTP request function
+
+
+# Start of send request function
+def sendRequest(serverName, serverPort, protocol, method, url, body, headers, timeout, idempotent=False):
+    hostKey, httpConn, reused = getConnection(serverName, serverPort, protocol)
+    with poolLock:
+        poolStatistics['requests'] += 1
+
+    requestSent = False
+    try:
+        openConnection(httpConn, timeout)
+        httpConn.request(method, url, body, headers)
+        requestSent = True
+        response = httpConn.getresponse()
+        data = response.read()
+    # Don't send the request again if the server is too slow
+    except socket.timeout:
+        discardConnection(httpConn)
+        raise
+    except (httplib.HTTPException, socket.error):
+        discardConnection(httpConn)
+        # If the server closed an idle connection, send the request again on a new connection.
+        # Once a request that changes something has been sent the server may have acted on it, so don't send it twice
+        if (not reused) or (requestSent and not idempotent):
+            raise
+        with poolLock:
+            poolStatistics['reconnects'] += 1
+            poolStatistics['connectionsCreated'] += 1
+        if (protocol == 'https'):
+            httpConn = httplib.HTTPSConnection(hostKey[1], hostKey[2])
+        else:
+            httpConn = httplib.HTTPConnection(hostKey[1], hostKey[2])
+        try:
+            openConnection(httpConn, timeout)
+            httpConn.request(method, url, body, headers)
+            response = httpConn.getresponse()
+            data = response.read()
+        except:
+            discardConnection(httpConn)
+            raise
+
+    # Return the connection to the pool if the server will keep it open
+    if response.will_close:
+        discardConnection(httpConn)
+    else:
+        releaseConnection(hostKey, httpConn)
+
+    # Return response
+    return (response, data)
+# End of send request function
+
+
+# Start of open connection function
+def openConnection(httpConn, timeout):
+    # Connect with the connect timeout, then wait up to the read timeout for each response.
+    # Pooled connections are shared, so set the timeout for every request
+    httpConn.timeout = connectTimeout if timeout is None else timeout
+    if httpConn.sock is None:
+        httpConn.connect()
+    httpConn.sock.settimeout(readTimeout if timeout is None else timeout)
+# End of open connection function
+
+
+# Start of retry request function
+def retryRequest(idempotent, attempt):
+    # Only retry requests that can safely be sent again
+    if (not idempotent) or (attempt >= retries):
+        return False
+    countOutcome('retries')
+    # Wait a random time up to a limit that doubles after each attempt, so clients don't all retry at once
+    time.sleep(random.uniform(0, min(maxRetryDelay, retryDelay * (2 ** attempt))))
+    return True
+# End of retry request function
+
+
+# Start of check breaker function
+def checkBreaker(hostKey):
+    with poolLock:
+        hostBreaker = hostBreakers.get(hostKey)
+        if (hostBreaker is None) or (hostBreaker['openedAt'] is None):
+            return
+        secondsOpen = time.time() - hostBreaker['openedAt']
+        if (secondsOpen < breakerResetSeconds):
+            poolStatistics['breakerRejected'] += 1
+            raise CircuitOpenError("Requests to " + hostKey[1] + ":" + str(hostKey[2]) + " are failing, trying again in " + str(int(breakerResetSeconds - secondsOpen) + 1) + " seconds")
+        # Let this request through to try the host again, others fail straight away until it succeeds
+        hostBreaker['openedAt'] = time.time()
+# End of check breaker function
+
+
+# Start of record failure function
+def recordFailure(hostKey):
+    with poolLock:
+        hostBreaker = hostBreakers.setdefault(hostKey, {'failures': 0, 'openedAt': None})
+        hostBreaker['failures'] += 1
+        if (breakerFailures > 0) and (hostBreaker['failures'] >= breakerFailures) and (hostBreaker['openedAt'] is None):
+            hostBreaker['openedAt'] = time.time()
+            poolStatistics['breakerOpened'] += 1
+# End of record failure function
+
+
+# Start of record success function
+def recordSuccess(hostKey):
+    with poolLock:
+        if hostKey in hostBreakers:
+            del hostBreakers[hostKey]
+# End of record success function
+
+
+# Start of count outcome function
+def countOutcome(outcome):
+    with poolLock:
+        poolStatistics[outcome] += 1
+# End of count outcome function
+
+
+# Start of get pool statistics function
+def getPoolStatistics():
+    with poolLock:
+        statistics = dict(poolStatistics)
+        statistics['idleConnections'] = sum(len(hostConnections) for hostConnections in idleConnections.values())
+        statistics['hosts'] = len(idleConnections)
+        statistics['openBreakers'] = len([hostBreaker for hostBreaker in hostBreakers.values() if hostBreaker['openedAt'] is not None])
+    return statistics
+# End of get pool statistics function
+
+
+# Start of close connections function
+def closeConnections():
+    with poolLock:
+        hostConnections = [httpConn for connections in idleConnections.values() for httpConn in connections]
+        idleConnections.clear()
+        poolStatistics['connectionsClosed'] += len(hostConnections)
+    for httpConn in hostConnections:
+        httpConn.close()
+# End of close connections function
@@ -0,0 +1,128 @@
+#-------------------------------------------------------------
+# Name:       ArcGIS Server Messages
+# Purpose:    Messages and parameters for the admin toolkit scripts that only talk to the ArcGIS
+#             Server REST API. arcpy is only imported when the script is running as a geoprocessing
+#             tool or a function needs it, otherwise messages are written to the console so the
+#             scripts start quickly and run without an ArcGIS Desktop license.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import os
+import sys
+
+# Set variables
+# "auto" uses arcpy when running inside ArcGIS, "true" always uses arcpy, "false" never does
+useArcpy = "auto"
+# Applications that run script tools in process
+geoprocessingApplications = ["arcmap", "arccatalog", "arcglobe", "arcscene", "arcgispro"]
+
+# arcpy once it has been imported
+arcpyModule = None
+# Messages added when not using arcpy, as (severity, message) with 0 message, 1 warning and 2 error
+messages = []
+
+
+# Exception that is never raised, caught in place of arcpy.ExecuteError until arcpy is imported
+class ExecuteError(Exception):
+    pass
+
+
+# Start of is geoprocessing function
+def isGeoprocessing():
+    if (useArcpy == "true"):
+        return True
+    if (useArcpy == "false"):
+        return False
+    # Already imported by ArcGIS or another script
+    if ("arcpy" in sys.modules) or ("arcgisscripting" in sys.modules):
+        return True
+    # Running in an ArcGIS application
+    applicationName = os.path.splitext(os.path.basename(sys.executable or ""))[0].lower()
+    return applicationName in geoprocessingApplications
+# End of is geoprocessing function
+
+
+# Start of get arcpy function
+def getArcpy():
+    global arcpyModule, ExecuteError
+    if arcpyModule is None:
+        import arcpy
+        arcpy.env.overwriteOutput = True
+        arcpyModule = arcpy
+        # Catch arcpy errors from now on
+        ExecuteError = arcpy.ExecuteError
+    return arcpyModule
+# End of get arcpy function
+
+
+# Start of add message function
+def addMessage(message):
+    if isGeoprocessing():
+        getArcpy().AddMessage(message)
+    else:
+        messages.append((0, message))
+        writeConsole(sys.stdout, message)
+# End of add message function
+
+
+# Start of add warning function
+def addWarning(message):
+    if isGeoprocessing():
+        getArcpy().AddWarning(message)
+    else:
+        messages.append((1, message))
+        writeConsole(sys.stderr, message, "Warning: ")
+# End of add warning function
+
+
+# Start of add error function
+def addError(message):
+    if isGeoprocessing():
+        getArcpy().AddError(message)
+    else:
+        messages.append((2, message))
+        writeConsole(sys.stderr, message, "Error: ")
+# End of add error function
+
+
+# Start of write console function
+def writeConsole(stream, message, prefix=""):
+    # Encode for the console so server messages with non-ASCII characters can be printed
+    if isinstance(message, unicode):
+        message = message.encode(getattr(stream, "encoding", None) or "utf-8", "replace")
+    print >> stream, prefix + str(message)
+# End of write console function
+
+
+# Start of get messages function
+def getMessages(severity=0):
+    # Messages at or above the severity, as arcpy.GetMessages does
+    if isGeoprocessing():
+        return getArcpy().GetMessages(severity)
+    return "\n".join((message if isinstance(message, basestring) else str(message)) for messageSeverity, message in messages if messageSeverity >= severity)
+# End of get messages function
+
+
+# Start of get parameters function
+def getParameters():
+    # Tool parameters, or the command line arguments when not running as a geoprocessing tool
+    if isGeoprocessing():
+        arcpy = getArcpy()
+        return tuple(arcpy.GetParameterAsText(i)
+            for i in range(arcpy.GetArgumentCount()))
+    return tuple(sys.argv[1:])
+# End of get parameters function
+
+
+# Start of set parameter function
+def setParameter(index, value):
+    # Output parameters only exist when running as a geoprocessing tool
+    if isGeoprocessing():
+        getArcpy().SetParameterAsText(index, value)
+# End of set parameter function
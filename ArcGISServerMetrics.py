@@ -0,0 +1,227 @@
+#-------------------------------------------------------------
+# Name:       ArcGIS Server Metrics
+# Purpose:    Append-only time series store for the results of the availability checks. Each sample
+#             is a fixed size record (time, series, state, seconds) in a ring buffered binary file, so
+#             the file never grows past its capacity and months of checks can be charted without
+#             parsing logs. Can also write the latest samples as a Prometheus textfile exporter file.
+#             Run from the command prompt to export the samples to CSV and summarise uptime.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import os
+import sys
+import csv
+import json
+import math
+import time
+import struct
+import datetime
+
+# Set variables
+# Samples kept before the oldest are overwritten, at 20 bytes each
+defaultCapacity = 1000000
+# File header - magic, version, record size, capacity, samples written, next record to write
+headerFormat = "<4sIIIQQ"
+headerSize = struct.calcsize(headerFormat)
+fileMagic = "AGSM"
+fileVersion = 1
+# Record - time in seconds since 1970, series number, seconds (NaN if not measured), state number
+recordFormat = "<dIfB3x"
+recordSize = struct.calcsize(recordFormat)
+# States are stored as their position in this list, new states must only be added to the end
+states = ["UNKNOWN", "AVAILABLE", "ERROR", "STARTED", "STOPPED", "HEALTHY", "SLOW", "FAILED"]
+# States counted as up
+upStates = ["AVAILABLE", "STARTED", "HEALTHY", "SLOW"]
+
+
+# Start of append samples function
+# samples is a list of (time, site, service, state, seconds), with service "" for the site itself
+def appendSamples(storeFile, samples, capacity=defaultCapacity):
+    if (len(samples) == 0):
+        return
+    seriesNumbers = getSeriesNumbers(storeFile, [getSeriesName(site, service) for sampleTime, site, service, state, seconds in samples])
+
+    # Create the file if it does not exist, otherwise use the capacity it was created with
+    if not os.path.exists(storeFile):
+        with open(storeFile, "wb") as f:
+            f.write(struct.pack(headerFormat, fileMagic, fileVersion, recordSize, int(capacity), 0, 0))
+    with open(storeFile, "r+b") as f:
+        magic, version, storedRecordSize, capacity, written, nextRecord = readHeader(f, storeFile)
+        for sampleTime, site, service, state, seconds in samples:
+            if state not in states:
+                state = "UNKNOWN"
+            if seconds is None:
+                seconds = float("nan")
+            # Overwrite the oldest sample once the file is full
+            f.seek(headerSize + nextRecord * recordSize)
+            f.write(struct.pack(recordFormat, float(sampleTime), seriesNumbers[getSeriesName(site, service)], float(seconds), states.index(state)))
+            nextRecord = (nextRecord + 1) % capacity
+            written += 1
+        f.seek(0)
+        f.write(struct.pack(headerFormat, magic, version, storedRecordSize, capacity, written, nextRecord))
+# End of append samples function
+
+
+# Start of read samples function
+# Returns a list of (time, site, service, state, seconds) from oldest to newest, optionally only for a site/service and time range
+def readSamples(storeFile, site=None, service=None, startTime=None, endTime=None):
+    seriesNames = readSeries(storeFile)
+    samples = []
+    with open(storeFile, "rb") as f:
+        magic, version, storedRecordSize, capacity, written, nextRecord = readHeader(f, storeFile)
+        # Start from the oldest sample, which is the next to be overwritten once the file is full
+        if (written > capacity):
+            recordOrder = range(nextRecord, capacity) + range(0, nextRecord)
+        else:
+            recordOrder = range(0, nextRecord)
+        f.seek(headerSize)
+        records = f.read(capacity * recordSize)
+
+    for record in recordOrder:
+        sampleTime, seriesNumber, seconds, stateNumber = struct.unpack_from(recordFormat, records, record * recordSize)
+        if ((startTime is not None) and (sampleTime < startTime)) or ((endTime is not None) and (sampleTime > endTime)):
+            continue
+        sampleSite, sampleService = splitSeriesName(seriesNames[seriesNumber])
+        if ((site is not None) and (sampleSite != site)) or ((service is not None) and (sampleService != service)):
+            continue
+        samples.append((sampleTime, sampleSite, sampleService, states[stateNumber] if stateNumber < len(states) else "UNKNOWN", None if math.isnan(seconds) else seconds))
+    return samples
+# End of read samples function
+
+
+# Start of read header function
+def readHeader(f, storeFile):
+    header = f.read(headerSize)
+    if (len(header) < headerSize):
+        raise ValueError(storeFile + " is not a metrics file")
+    magic, version, storedRecordSize, capacity, written, nextRecord = struct.unpack(headerFormat, header)
+    if (magic != fileMagic) or (storedRecordSize != recordSize):
+        raise ValueError(storeFile + " is not a metrics file")
+    return magic, version, storedRecordSize, capacity, written, nextRecord
+# End of read header function
+
+
+# Start of get series name function
+def getSeriesName(site, service):
+    # Site and service separated by a space, which URLs and service names can't contain
+    return (site + " " + service) if service else site
+# End of get series name function
+
+
+# Start of split series name function
+def splitSeriesName(seriesName):
+    parts = seriesName.split(" ", 1)
+    return parts[0], parts[1] if len(parts) > 1 else ""
+# End of split series name function
+
+
+# Start of read series function
+def readSeries(storeFile):
+    # Series names are kept in a file beside the store, the position in the list is the series number
+    try:
+        with open(storeFile + ".series", "r") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return []
+# End of read series function
+
+
+# Start of get series numbers function
+def getSeriesNumbers(storeFile, seriesNames):
+    # Look up the number for each series, adding any new series to the end of the list
+    storedNames = readSeries(storeFile)
+    seriesNumbers = dict((seriesName, seriesNumber) for seriesNumber, seriesName in enumerate(storedNames))
+    newNames = [seriesName for seriesName in sorted(set(seriesNames)) if seriesName not in seriesNumbers]
+    if (len(newNames) > 0):
+        for seriesName in newNames:
+            seriesNumbers[seriesName] = len(storedNames)
+            storedNames.append(seriesName)
+        tempFile = storeFile + ".series.tmp"
+        with open(tempFile, "w") as f:
+            json.dump(storedNames, f)
+        if (os.name == "nt") and os.path.exists(storeFile + ".series"):
+            os.remove(storeFile + ".series")
+        os.rename(tempFile, storeFile + ".series")
+    return seriesNumbers
+# End of get series numbers function
+
+
+# Start of write Prometheus file function
+# Writes the samples from the latest check in the Prometheus text format, for the node exporter textfile collector
+def writePrometheusFile(prometheusFile, samples):
+    lines = ["# HELP arcgis_up Whether the ArcGIS Server site or service is up (1) or down (0).",
+             "# TYPE arcgis_up gauge"]
+    for sampleTime, site, service, state, seconds in samples:
+        lines.append("arcgis_up{" + getLabels(site, service, state) + "} " + ("1" if state in upStates else "0"))
+    lines.append("# HELP arcgis_response_seconds Seconds the last site check or service probe took.")
+    lines.append("# TYPE arcgis_response_seconds gauge")
+    for sampleTime, site, service, state, seconds in samples:
+        if seconds is not None:
+            lines.append("arcgis_response_seconds{" + getLabels(site, service, state) + "} " + repr(float(seconds)))
+    lines.append("# HELP arcgis_last_check_timestamp_seconds Time of the last check.")
+    lines.append("# TYPE arcgis_last_check_timestamp_seconds gauge")
+    lines.append("arcgis_last_check_timestamp_seconds " + repr(float(max(sample[0] for sample in samples) if samples else time.time())))
+
+    # Write to a temporary file and rename it so the collector never reads a half written file
+    tempFile = prometheusFile + ".tmp"
+    with open(tempFile, "wb") as f:
+        f.write(("\n".join(lines) + "\n").encode("utf-8"))
+    if (os.name == "nt") and os.path.exists(prometheusFile):
+        os.remove(prometheusFile)
+    os.rename(tempFile, prometheusFile)
+# End of write Prometheus file function
+
+
+# Start of get labels function
+def getLabels(site, service, state):
+    labels = [("site", site), ("service", service), ("state", state)]
+    return ",".join(name + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"' for name, value in labels)
+# End of get labels function
+
+
+# Start of export samples function
+def exportSamples(storeFile, csvFile, startTime=None):
+    samples = readSamples(storeFile, startTime=startTime)
+    with open(csvFile, "wb") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Time", "Site", "Service", "State", "Seconds"])
+        for sampleTime, site, service, state, seconds in samples:
+            writer.writerow([datetime.datetime.fromtimestamp(sampleTime).strftime("%Y-%m-%d %H:%M:%S"), site.encode("utf-8"), service.encode("utf-8"), state, "" if seconds is None else round(seconds, 4)])
+    return samples
+# End of export samples function
+
+
+# Start of summarise samples function
+def summariseSamples(samples):
+    # Uptime and median response time of each site and service
+    seriesSamples = {}
+    for sampleTime, site, service, state, seconds in samples:
+        seriesSamples.setdefault((site, service), []).append((state, seconds))
+    summary = []
+    for (site, service), values in sorted(seriesSamples.items()):
+        upCount = len([state for state, seconds in values if state in upStates])
+        measured = sorted(seconds for state, seconds in values if seconds is not None)
+        summary.append({'site': site, 'service': service, 'samples': len(values), 'uptime': 100.0 * upCount / len(values),
+                        'medianSeconds': measured[len(measured) // 2] if measured else None})
+    return summary
+# End of summarise samples function
+
+
+# Export the samples from the command prompt
+# e.g. python ArcGISServerMetrics.py C:\Temp\Availability.metrics C:\Temp\Availability.csv 30
+# (metrics file, CSV file to write, only samples from the last number of days)
+if __name__ == '__main__':
+    args = sys.argv
+    if (len(args) < 3):
+        print "Usage: python ArcGISServerMetrics.py metricsFile csvFile [days]"
+    else:
+        startTime = (time.time() - float(args[3]) * 86400) if len(args) > 3 else None
+        summary = summariseSamples(exportSamples(args[1], args[2], startTime))
+        for series in summary:
+            print "{0:>7.3f}% up  median {1:>8} seconds  {2} samples  {3} {4}".format(series['uptime'], "-" if series['medianSeconds'] is None else "%.3f" % series['medianSeconds'], series['samples'], series['site'], series['service'])
@@ -1,6 +1,13 @@
 #-------------------------------------------------------------
 # Name:       ArcGIS Server Permissions 
-# Purpose:    Checks ArcGIS server service or folder for any permission changes.     
+# Purpose:    Checks ArcGIS server service or folder for any permission changes. Can also audit the
+#             permissions on every folder and service in the site against a baseline, comparing hashed
+#             snapshots so only the folders that changed are expanded, and keep a history of the changes.
+#             Each audit updates an index of the folders and services each principal can access, which
+#             can be queried without contacting the server. Can also set the permissions on the site to
+#             match a desired state file, making only the permission changes needed, and list the services
+#             whose own permissions override the ones on their folder. On ArcGIS Server 10.2+ the permissions
+#             on the services in a folder are read from the folder report in one request.
 # Author:     Shaun Weston (shaun_weston@eagle.co.nz)
 # Date Created:    03/05/2014
 # Last Updated:    18/05/2014
@@ -9,17 +16,26 @@
 # Python Version:   2.7
 #--------------------------------
 
-# Import modules and enable data to be overwritten
+# Import modules
 import os
 import sys
+import csv
+import time
 import datetime
-import smtplib
-import httplib
 import json
+import socket
+import httplib
 import urllib
 import urlparse
-import arcpy
-arcpy.env.overwriteOutput = True
+import functools
+from multiprocessing.pool import ThreadPool
+import ArcGISServerConnection
+import ArcGISServerToken
+import ArcGISServerCatalog
+import PermissionSnapshot
+import PermissionIndex
+import ArcGISServerAlerts
+import ArcGISServerMessages
 
 # Set variables
 logging = "false"
@@ -30,10 +46,40 @@ emailUser = ""
 emailPassword = ""
 emailSubject = ""
 emailMessage = ""
+emailServer = "smtp.gmail.com"
+emailPort = 587
+emailTLS = "true"
+alertStateFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ArcGISServerPermissionsAlerts.json") # Last known result of each permission check, so emails are only sent when it changes
+healthyStatuses = ["AVAILABLE", "APPLIED", "NO PERMISSIONS", "MATCHES BASELINE"] # Statuses that do not need an alert
+tokenCacheFile = "" # ArcGISServerToken.defaultCacheFile to keep tokens between runs
+catalogFile = "" # ArcGISServerCatalog.defaultCatalogFile to keep the list of folders and services between runs
+auditBaselineFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ArcGISServerPermissionsBaseline.json") # Permissions on every folder and service that the audit is compared to
+auditHistoryFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ArcGISServerPermissionsHistory.json") # Changes to the permissions from one audit to the next, blank to not keep a history
+auditIndexFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ArcGISServerPermissionsIndex.json") # Folders and services each principal can access, updated by each audit
+auditMatrixFile = "" # CSV file to write the principal by resource matrix to when auditing
+auditConcurrency = 8 # Number of permission requests to send at the same time when auditing
+auditFolderExclusions = ["System", "Utilities"] # Folders managed by ArcGIS Server that are not audited
+reportSupported = {} # Whether each server has the services report resource, found when the server first answers a report request
+enforceConcurrency = 4 # Number of folders and services to change the permissions on at the same time when enforcing
+enforceLogFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ArcGISServerPermissionsEnforce.csv") # Result of every permission change made or planned when enforcing
 output = None
+runErrors = [] # Errors logged during the current check, sent with the alerts
 
 # Start of main function
-def mainFunction(agsServerSite,username,password,service,permissionExpecting): # Get parameters from ArcGIS Desktop tool by seperating by comma e.g. (var1 is 1st parameter,var2 is 2nd parameter,var3 is 3rd parameter)  
+# service can be "audit" to compare the permissions on every folder and service to the baseline file, or
+# "baseline" to save the current permissions as the baseline, permissionExpecting is not used for either.
+# service can also be "access" to list what the principal in permissionExpecting can access, "principals" to list
+# who can access the folder or service in permissionExpecting, or "public" to list what everyone can access.
+# These are answered from the index kept by the last audit without contacting the server.
+# service can also be "enforce" to change the permissions to match the desired state file in permissionExpecting,
+# or "dryrun" to list the changes that would be made without making them, or "effective" to list the services
+# whose own permissions override the ones they would inherit from their folder
+def mainFunction(agsServerSite,username,password,service,permissionExpecting="",baselineFile=""): # Get parameters from ArcGIS Desktop tool by seperating by comma e.g. (var1 is 1st parameter,var2 is 2nd parameter,var3 is 3rd parameter)  
+    # Result of the permission check, or -1 if the site could not be checked
+    checkResult = -1
+    # Status of each grant when auditing
+    auditStatuses = None
+    del runErrors[:]
     try:
         # Log start
         if (logging == "true") or (sendErrorEmail == "true"):
@@ -56,11 +102,28 @@ def mainFunction(agsServerSite,username,password,service,permissionExpecting): #
         if not context.endswith('admin/'):
             context += 'admin/'
 
+        # If querying the index from the last audit
+        if (service in ["access", "principals", "public"]):
+            queryIndex(agsServerSite, service, permissionExpecting)
+            token = -1
         # Get token
-        token = getToken(username, password, serverName, serverPort, protocol)
+        else:
+            token = getToken(username, password, serverName, serverPort, protocol)
+
+        # If auditing the whole site
+        if (token != -1) and (service in ["audit", "baseline"]):
+            auditStatuses = auditSite(serverName, serverPort, protocol, token, agsServerSite, baselineFile or auditBaselineFile, service == "baseline")
+
+        # If listing the services that override the permissions on their folder
+        elif (token != -1) and (service == "effective"):
+            evaluatePermissions(serverName, serverPort, protocol, token)
+
+        # If setting the permissions from a desired state file
+        elif (token != -1) and (service in ["enforce", "dryrun"]):
+            enforcePermissions(serverName, serverPort, protocol, token, permissionExpecting, service == "dryrun")
 
         # If token received
-        if (token != -1):
+        elif (token != -1):
             # Check permissions on service
             permissionsSet = checkPermissions(serverName, serverPort, protocol, service, token)
             
@@ -72,21 +135,23 @@ def mainFunction(agsServerSite,username,password,service,permissionExpecting): #
                 for permission in permissionsSet:
                     # If permission expecting is applied to service
                     if (permissionExpecting == permission):
-                        arcpy.AddMessage(permissionExpecting + " is applied to the service or folder...")
+                        ArcGISServerMessages.addMessage(permissionExpecting + " is applied to the service or folder...")
                         # If logging
                         if (logging == "true") or (sendErrorEmail == "true"):
                             loggingFunction(logFile,"info",permissionExpecting + " is applied to the service or folder...")
                         # Add to permissions number
                         permissionsNum = permissionsNum + 1
+                checkResult = "APPLIED" if (permissionsNum > 0) else "NOT APPLIED"
                 # If permission is not applied
                 if (permissionsNum == 0):
-                    arcpy.AddWarning(permissionExpecting + " is not applied to the service or folder...")
+                    ArcGISServerMessages.addWarning(permissionExpecting + " is not applied to the service or folder...")
                     # If logging
                     if (logging == "true") or (sendErrorEmail == "true"):
                         loggingFunction(logFile,"error",permissionExpecting + " is not applied to the service or folder...")
                         sys.exit()                    
             else:
-                arcpy.AddWarning("No permissions set to the service or folder...")
+                checkResult = "NO PERMISSIONS"
+                ArcGISServerMessages.addWarning("No permissions set to the service or folder...")
                 # If logging
                 if (logging == "true") or (sendErrorEmail == "true"):
                     loggingFunction(logFile,"warning","No permissions set to the service or folder...")               
@@ -96,7 +161,7 @@ def mainFunction(agsServerSite,username,password,service,permissionExpecting): #
         if __name__ == '__main__':
             # Return the output if there is any
             if output:
-                arcpy.SetParameterAsText(1, output)
+                ArcGISServerMessages.setParameter(1, output)
         # Otherwise return the result          
         else:
             # Return the output if there is any
@@ -107,22 +172,593 @@ def mainFunction(agsServerSite,username,password,service,permissionExpecting): #
             loggingFunction(logFile,"end","")        
         pass
     # If arcpy error
-    except arcpy.ExecuteError:
+    except ArcGISServerMessages.ExecuteError:
         # Show the message
-        arcpy.AddError(arcpy.GetMessages(2))        
+        ArcGISServerMessages.addError(ArcGISServerMessages.getMessages(2))        
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):
-            loggingFunction(logFile,"error",arcpy.GetMessages(2))
+            loggingFunction(logFile,"error",ArcGISServerMessages.getMessages(2))
     # If python error
     except Exception as e:
         # Show the message
-        arcpy.AddError(e.args[0])          
+        ArcGISServerMessages.addError(e.args[0])          
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error",e.args[0])
+    finally:
+        # Email if the permission has been removed or put back since the last check
+        if (service in ["access", "principals", "public"]):
+            pass
+        elif (service in ["audit", "baseline", "enforce", "dryrun", "effective"]):
+            sendAuditAlerts(agsServerSite, auditStatuses)
+        else:
+            sendAlerts(agsServerSite, service, permissionExpecting, checkResult)
 # End of main function
 
 
+# Start of send alerts function
+def sendAlerts(agsServerSite, service, permissionExpecting, checkResult):
+    if (sendErrorEmail != "true"):
+        return []
+    if (checkResult == -1):
+        # Only alert if the check failed with an error
+        if (len(runErrors) == 0):
+            return []
+        statuses = {agsServerSite: "ERROR"}
+    else:
+        statuses = {agsServerSite: "AVAILABLE", agsServerSite + " " + service + " " + permissionExpecting: checkResult}
+
+    try:
+        alertState = ArcGISServerAlerts.readAlertState(alertStateFile)
+        alerts = ArcGISServerAlerts.getTransitions(alertState, statuses, healthyStatuses, {agsServerSite: "; ".join(str(error) for error in runErrors)})
+        ArcGISServerAlerts.writeAlertState(alertStateFile, alertState)
+        # Send all the alerts in one email
+        if (len(alerts) > 0):
+            ArcGISServerMessages.addMessage("Sending email...")
+            ArcGISServerAlerts.sendEmail(emailServer, emailPort, emailUser, emailPassword, emailTo, emailSubject, emailMessage + "\n\n" + "\n".join(alerts), emailTLS == "true")
+    except Exception as e:
+        ArcGISServerMessages.addError("Unable to send alerts - " + str(e))
+        return []
+    return alerts
+# End of send alerts function
+
+
+# Start of send audit alerts function
+def sendAuditAlerts(agsServerSite, auditStatuses):
+    if (sendErrorEmail != "true"):
+        return []
+    if (auditStatuses is None):
+        # Only alert if the audit failed with an error
+        if (len(runErrors) == 0):
+            return []
+        statuses = {agsServerSite: "ERROR"}
+        prunePrefixes = []
+    else:
+        statuses = dict(auditStatuses)
+        statuses[agsServerSite] = "AVAILABLE"
+        # Forget grants that are no longer in the baseline or on the site
+        prunePrefixes = [agsServerSite + " permissions"]
+
+    try:
+        alertState = ArcGISServerAlerts.readAlertState(alertStateFile)
+        # Only the grants on resources that differ from the baseline are audited, so any other grant alerted on before now matches it
+        for name, previousStatus in alertState['statuses'].items():
+            if (auditStatuses is not None) and name.startswith(agsServerSite + " permissions ") and (name not in statuses) and (previousStatus not in healthyStatuses):
+                statuses[name] = "MATCHES BASELINE"
+        alerts = ArcGISServerAlerts.getTransitions(alertState, statuses, healthyStatuses, {agsServerSite: "; ".join(str(error) for error in runErrors)}, prunePrefixes)
+        ArcGISServerAlerts.writeAlertState(alertStateFile, alertState)
+        # Send all the alerts in one email
+        if (len(alerts) > 0):
+            ArcGISServerMessages.addMessage("Sending email...")
+            ArcGISServerAlerts.sendEmail(emailServer, emailPort, emailUser, emailPassword, emailTo, emailSubject, emailMessage + "\n\n" + "\n".join(alerts), emailTLS == "true")
+    except Exception as e:
+        ArcGISServerMessages.addError("Unable to send alerts - " + str(e))
+        return []
+    return alerts
+# End of send audit alerts function
+
+
+# Start of audit site function
+# Returns the status of each grant in the baseline or on the site, keyed by "site permissions resource principal"
+def auditSite(serverName, serverPort, protocol, token, agsServerSite, baselineFile, updateBaseline=False):
+    auditStart = datetime.datetime.now()
+    permissionMatrix = getPermissionMatrix(serverName, serverPort, protocol, token)
+    if (permissionMatrix == -1):
+        return None
+    grantCount = sum(len(principals) for principals in permissionMatrix.values())
+    writeMatrixFile(permissionMatrix)
+    snapshot = PermissionSnapshot.createSnapshot(permissionMatrix)
+
+    # Keep the changes since the last audit
+    if auditHistoryFile:
+        changedResources = PermissionSnapshot.appendHistory(auditHistoryFile, permissionMatrix, time.time(), snapshot)
+        if changedResources:
+            ArcGISServerMessages.addMessage(str(len(changedResources)) + " folders and services have changed since the last audit...")
+    # Update the index of what each principal can access
+    if auditIndexFile:
+        updateAccessIndex(agsServerSite, permissionMatrix, snapshot)
+
+    # Save the permissions as the baseline if asked to or if there is no baseline yet
+    baseline = readBaseline(baselineFile)
+    if updateBaseline or (baseline is None):
+        writeBaseline(baselineFile, agsServerSite, permissionMatrix, snapshot)
+        ArcGISServerMessages.addMessage("Saved " + str(grantCount) + " permissions on " + str(len(permissionMatrix)) + " folders and services as the baseline (" + str((datetime.datetime.now() - auditStart).seconds) + " seconds)...")
+        if (logging == "true"):
+            loggingFunction(logFile,"info","Saved " + str(grantCount) + " permissions on " + str(len(permissionMatrix)) + " folders and services as the baseline")
+        baseline = {'permissions': permissionMatrix, 'snapshot': snapshot}
+
+    # Compare the root digest to the baseline, then only the permissions in folders whose digest has changed
+    changedFolders, changedResources = PermissionSnapshot.getChangedResources(baseline['snapshot'], snapshot)
+    changes = diffPermissions(baseline['permissions'], permissionMatrix, changedResources)
+    auditStatuses = {}
+    for resource in changedResources:
+        for principal in baseline['permissions'].get(resource, {}).keys() + permissionMatrix.get(resource, {}).keys():
+            auditStatuses[agsServerSite + " permissions " + resource + " " + principal] = "MATCHES BASELINE"
+    for change, resource, principal, isAllowed in changes:
+        auditStatuses[agsServerSite + " permissions " + resource + " " + principal] = change
+        ArcGISServerMessages.addWarning(change + " - " + resource + " - " + principal + " " + ("allowed" if isAllowed else "denied") + "...")
+
+    if (len(changes) > 0):
+        summary = str(len([change for change in changes if change[0] == "ADDED"])) + " permissions added, " + str(len([change for change in changes if change[0] == "REMOVED"])) + " removed and " + str(len([change for change in changes if change[0] == "CHANGED"])) + " changed since the baseline in " + str(len(changedFolders)) + " folders"
+        ArcGISServerMessages.addWarning(summary + "...")
+        # If logging
+        if (logging == "true"):
+            loggingFunction(logFile,"warning",summary + " - " + "; ".join(change + " " + resource + " " + principal for change, resource, principal, isAllowed in changes))
+    else:
+        ArcGISServerMessages.addMessage("All " + str(grantCount) + " permissions on " + str(len(permissionMatrix)) + " folders and services match the baseline (" + str((datetime.datetime.now() - auditStart).seconds) + " seconds)...")
+        # If logging
+        if (logging == "true"):
+            loggingFunction(logFile,"info","All " + str(grantCount) + " permissions match the baseline")
+    return auditStatuses
+# End of audit site function
+
+
+# Start of update access index function
+def updateAccessIndex(agsServerSite, permissionMatrix, snapshot):
+    indexFile = readIndexFile(auditIndexFile)
+    # Only index the resources that have changed since the last audit of the site
+    if (indexFile is not None) and (indexFile['site'] == agsServerSite):
+        PermissionIndex.updateIndex(indexFile['index'], permissionMatrix, snapshot)
+    else:
+        indexFile = {'site': agsServerSite, 'index': PermissionIndex.buildIndex(permissionMatrix, snapshot)}
+    indexFile['updated'] = datetime.datetime.now().strftime("%d/%m/%Y - %H:%M:%S")
+    writeIndexFile(auditIndexFile, indexFile)
+# End of update access index function
+
+
+# Start of query index function
+def queryIndex(agsServerSite, query, queryValue):
+    indexFile = readIndexFile(auditIndexFile)
+    if (indexFile is None) or (indexFile['site'] != agsServerSite):
+        ArcGISServerMessages.addError("There is no permissions index for " + agsServerSite + ". Please run an audit of the site first.")
+        # Log error
+        if (logging == "true") or (sendErrorEmail == "true"):
+            loggingFunction(logFile,"error","There is no permissions index for " + agsServerSite + ". Please run an audit of the site first.")
+            sys.exit()
+        return None
+    index = indexFile['index']
+    if (query == "access"):
+        results = PermissionIndex.getResources(index, queryValue)
+        ArcGISServerMessages.addMessage(queryValue + " can access " + str(len(results)) + " folders and services (index updated " + indexFile['updated'] + ")...")
+    elif (query == "principals"):
+        results = PermissionIndex.getPrincipals(index, queryValue)
+        ArcGISServerMessages.addMessage(str(len(results)) + " principals can access " + queryValue + " (index updated " + indexFile['updated'] + ")...")
+    else:
+        results = PermissionIndex.getPublicResources(index)
+        ArcGISServerMessages.addMessage(str(len(results)) + " folders and services can be accessed by everyone (index updated " + indexFile['updated'] + ")...")
+    # Show where each grant comes from if it is inherited
+    for result, source in sorted(results.items()):
+        if (query == "principals"):
+            ArcGISServerMessages.addMessage(result + ((" - inherited from " + source) if source != queryValue else ""))
+        else:
+            ArcGISServerMessages.addMessage(result + ((" - inherited from " + source) if source != result else ""))
+    return results
+# End of query index function
+
+
+# Start of read index file function
+def readIndexFile(indexFile):
+    try:
+        with open(indexFile, "r") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+# End of read index file function
+
+
+# Start of write index file function
+def writeIndexFile(indexFile, indexContents):
+    # Write to a temporary file first so the index is never left half written
+    tempFile = indexFile + ".tmp"
+    with open(tempFile, "w") as f:
+        json.dump(indexContents, f)
+    if (os.name == "nt") and os.path.exists(indexFile):
+        os.remove(indexFile)
+    os.rename(tempFile, indexFile)
+# End of write index file function
+
+
+# Start of evaluate permissions function
+# Works out the effective permissions on every folder and service and lists the ones that override their folder.
+# Returns the overrides, or -1 if the permissions could not be read
+def evaluatePermissions(serverName, serverPort, protocol, token):
+    evaluateStart = datetime.datetime.now()
+    permissionMatrix = getPermissionMatrix(serverName, serverPort, protocol, token)
+    if (permissionMatrix == -1):
+        return -1
+    overrides = PermissionIndex.getOverrides(permissionMatrix)
+    inheritedCount = len([resource for resource, principals in permissionMatrix.items() if (resource != "/") and (len(principals) == 0)])
+
+    for resource, parentSource, addedPrincipals, removedPrincipals in overrides:
+        differences = [principal + (" allowed" if isAllowed else " denied") for principal, isAllowed in sorted(addedPrincipals.items())] + \
+                      ["no " + principal for principal in sorted(removedPrincipals)]
+        ArcGISServerMessages.addWarning(resource + " overrides the permissions on " + (parentSource or "the root") + " - " + ", ".join(differences) + "...")
+    summary = str(len(permissionMatrix) - 1) + " folders and services, " + str(inheritedCount) + " inherit their permissions, " + str(len(overrides)) + " override them (" + str((datetime.datetime.now() - evaluateStart).seconds) + " seconds)"
+    ArcGISServerMessages.addMessage(summary + "...")
+    # If logging
+    if (logging == "true"):
+        loggingFunction(logFile,"info",summary + ("" if len(overrides) == 0 else " - " + "; ".join(override[0] for override in overrides)))
+    return overrides
+# End of evaluate permissions function
+
+
+# Start of enforce permissions function
+# Makes the permissions on each folder and service in the desired state file match it, adding and removing only
+# the principals that differ. Returns the number of changes that failed, or -1 if the permissions could not be read
+def enforcePermissions(serverName, serverPort, protocol, token, desiredStateFile, dryRun=False):
+    enforceStart = datetime.datetime.now()
+    try:
+        desiredMatrix = readDesiredState(desiredStateFile)
+    except (IOError, OSError, ValueError), e:
+        ArcGISServerMessages.addError("Unable to read the desired state file " + desiredStateFile + " - " + str(e))
+        # Log error
+        if (logging == "true") or (sendErrorEmail == "true"):
+            loggingFunction(logFile,"error","Unable to read the desired state file " + desiredStateFile + " - " + str(e))
+            sys.exit()
+        return -1
+
+    # Only read the permissions on the folders and services in the file
+    permissionMatrix = getPermissionMatrix(serverName, serverPort, protocol, token, sorted(desiredMatrix))
+    if (permissionMatrix == -1):
+        return -1
+    permissionCalls = getPermissionCalls(desiredMatrix, permissionMatrix)
+    if (len(permissionCalls) == 0):
+        ArcGISServerMessages.addMessage("The permissions on all " + str(len(desiredMatrix)) + " folders and services match the desired state...")
+        return 0
+
+    # Change each resource on its own thread, adding before removing so a resource is never left open to more than it should be
+    resourceCalls = {}
+    for permissionCall in permissionCalls:
+        resourceCalls.setdefault(permissionCall[0], []).append(permissionCall)
+    if dryRun:
+        callResults = [(permissionCall, "DRY RUN", 0.0) for permissionCall in permissionCalls]
+    else:
+        pool = ThreadPool(max(1, min(int(enforceConcurrency), len(resourceCalls))))
+        try:
+            resourceResults = pool.map(functools.partial(applyPermissionCalls, serverName, serverPort, protocol, token), [resourceCalls[resource] for resource in sorted(resourceCalls)])
+        finally:
+            pool.close()
+            pool.join()
+        callResults = [callResult for results in resourceResults for callResult in results]
+
+    for (resource, operation, principal, isAllowed), result, seconds in callResults:
+        message = result + " - " + operation + " " + principal + ((" (allowed)" if isAllowed else " (denied)") if operation == "add" else "") + " on " + resource
+        if (result in ["OK", "DRY RUN"]):
+            ArcGISServerMessages.addMessage(message + "...")
+        else:
+            ArcGISServerMessages.addWarning(message + "...")
+    writeEnforceLog(callResults)
+
+    failedCount = len([callResult for callResult in callResults if callResult[1] not in ["OK", "DRY RUN"]])
+    summary = str(len(permissionCalls)) + " permission changes " + ("planned" if dryRun else "made") + " on " + str(len(resourceCalls)) + " folders and services (" + str((datetime.datetime.now() - enforceStart).seconds) + " seconds)"
+    if (failedCount > 0):
+        ArcGISServerMessages.addError(str(failedCount) + " of " + summary)
+        # Log error
+        if (logging == "true") or (sendErrorEmail == "true"):
+            loggingFunction(logFile,"error",str(failedCount) + " of " + summary + " failed")
+    else:
+        ArcGISServerMessages.addMessage(summary + "...")
+        # If logging
+        if (logging == "true"):
+            loggingFunction(logFile,"info",summary)
+    return failedCount
+# End of enforce permissions function
+
+
+# Start of read desired state function
+# The desired state file is JSON of {resource: {principal: isAllowed}} or {resource: [principal, ...]}, with resources
+# named as in the audit ("/", "Folder", "Folder/Service.MapServer"). A baseline file saved by the audit can also be used
+def readDesiredState(desiredStateFile):
+    with open(desiredStateFile, "r") as f:
+        desiredState = json.load(f)
+    if ('site' in desiredState) and ('permissions' in desiredState):
+        desiredState = desiredState['permissions']
+    desiredMatrix = {}
+    for resource, principals in desiredState.items():
+        if isinstance(principals, list):
+            principals = dict((principal, True) for principal in principals)
+        desiredMatrix[resource.strip("/") or "/"] = principals
+    return desiredMatrix
+# End of read desired state function
+
+
+# Start of get permission calls function
+# Returns the fewest (resource, "add"/"remove", principal, isAllowed) calls to change the permissions to the desired state
+def getPermissionCalls(desiredMatrix, permissionMatrix):
+    permissionCalls = []
+    for resource in sorted(desiredMatrix):
+        desiredPrincipals = desiredMatrix[resource]
+        principals = permissionMatrix.get(resource, {})
+        for principal in sorted(desiredPrincipals):
+            if (principals.get(principal) != desiredPrincipals[principal]):
+                permissionCalls.append((resource, "add", principal, desiredPrincipals[principal]))
+        for principal in sorted(principals):
+            if principal not in desiredPrincipals:
+                permissionCalls.append((resource, "remove", principal, principals[principal]))
+    return permissionCalls
+# End of get permission calls function
+
+
+# Start of apply permission calls function
+# Makes the permission changes on one resource in order. Returns a list of (call, result, seconds)
+def applyPermissionCalls(serverName, serverPort, protocol, token, permissionCalls):
+    callResults = []
+    for resource, operation, principal, isAllowed in permissionCalls:
+        callStart = datetime.datetime.now()
+        parameters = {'token': token, 'f': 'json', 'principal': principal.encode('utf-8')}
+        if (operation == "add"):
+            parameters['isAllowed'] = "true" if isAllowed else "false"
+        url = "/arcgis/admin/services/" + ("" if resource == "/" else resource + "/") + "permissions/" + operation
+        try:
+            response, data = postToServer(serverName, serverPort, protocol, url, urllib.urlencode(parameters), False)
+            if (response.status != 200):
+                result = "HTTP " + str(response.status) + " " + response.reason
+            else:
+                dataObject = json.loads(data)
+                result = "OK" if (dataObject.get('status') == "success") else "; ".join(dataObject.get('messages', ["Failed"]))
+        except (httplib.HTTPException, socket.error, ValueError), e:
+            result = str(e) or type(e).__name__
+        elapsed = datetime.datetime.now() - callStart
+        callResults.append(((resource, operation, principal, isAllowed), result, elapsed.seconds + elapsed.microseconds / 1000000.0))
+    return callResults
+# End of apply permission calls function
+
+
+# Start of write enforce log function
+def writeEnforceLog(callResults):
+    if not enforceLogFile:
+        return
+    newFile = not os.path.exists(enforceLogFile)
+    with open(enforceLogFile, "ab") as f:
+        writer = csv.writer(f)
+        if newFile:
+            writer.writerow(["Time", "Resource", "Operation", "Principal", "Allowed", "Result", "Seconds"])
+        callTime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for (resource, operation, principal, isAllowed), result, seconds in callResults:
+            writer.writerow([callTime, resource.encode("utf-8"), operation, principal.encode("utf-8"), "true" if isAllowed else "false", result.encode("utf-8") if isinstance(result, unicode) else result, round(seconds, 3)])
+# End of write enforce log function
+
+
+# Start of get permission matrix function
+# Returns {resource: {principal: isAllowed}} for the resources given, or the root ("/"), every folder and every service in the site
+def getPermissionMatrix(serverName, serverPort, protocol, token, resources=None):
+    siteKey = (protocol, serverName, str(serverPort))
+    # Read the permissions on each folder and the services in it together, unless the server does not have the folder report
+    if (resources is None) and (reportSupported.get(siteKey) != False):
+        permissionMatrix = getFolderPermissionMatrix(serverName, serverPort, protocol, token)
+        if (permissionMatrix is None):
+            # Only fall back for good if the server says it has no report and it has never worked on this server
+            if (reportSupported.get(siteKey) is None):
+                reportSupported[siteKey] = False
+        elif (permissionMatrix != -1):
+            reportSupported[siteKey] = True
+            return permissionMatrix
+        # If the folders could not be read this time, read every folder and service on its own for this run only
+
+    if (resources is None):
+        # Read the folders and services in the site now, so new and deleted services are picked up
+        try:
+            catalog = ArcGISServerCatalog.refreshCatalog(serverName, serverPort, protocol, token, catalogFile)
+        except (httplib.HTTPException, socket.error, ValueError), e:
+            ArcGISServerMessages.addError("Unable to get the folders and services in the site - " + str(e))
+            # Log error
+            if (logging == "true") or (sendErrorEmail == "true"):
+                loggingFunction(logFile,"error","Unable to get the folders and services in the site - " + str(e))
+                sys.exit()
+            return -1
+        resources = ["/"]
+        for folder in catalog['folders']:
+            if (folder in auditFolderExclusions):
+                continue
+            if folder:
+                resources.append(folder)
+            resources.extend((folder + "/" if folder else "") + service for service in catalog['services'][folder])
+
+    # Get the permissions on every resource at the same time
+    pool = ThreadPool(max(1, int(auditConcurrency)))
+    try:
+        permissionResults = pool.map(functools.partial(getResourcePermissions, serverName, serverPort, protocol, token), resources)
+    finally:
+        pool.close()
+        pool.join()
+
+    permissionMatrix = {}
+    errors = []
+    for resource, (permissions, error) in zip(resources, permissionResults):
+        if error:
+            errors.append(resource + " - " + error)
+        else:
+            permissionMatrix[resource] = getPrincipals(permissions)
+    # Don't compare part of the site, it would look like permissions had been removed
+    if (len(errors) > 0):
+        ArcGISServerMessages.addError("Unable to get the permissions on " + str(len(errors)) + " folders and services - " + "; ".join(errors[:10]))
+        # Log error
+        if (logging == "true") or (sendErrorEmail == "true"):
+            loggingFunction(logFile,"error","Unable to get the permissions on " + str(len(errors)) + " folders and services - " + "; ".join(errors[:10]))
+            sys.exit()
+        return -1
+    return permissionMatrix
+# End of get permission matrix function
+
+
+# Start of get folder permission matrix function
+# Returns {resource: {principal: isAllowed}} for the whole site, reading the permissions on each folder and the folder report
+# of its services, two requests a folder. Returns None if the server has no folder report, or -1 if the folders could not be read.
+# Errors are left for the caller to report once it has read the folders and services one by one instead
+def getFolderPermissionMatrix(serverName, serverPort, protocol, token):
+    # List the folders now, so new and deleted folders are picked up
+    try:
+        rootListing = ArcGISServerCatalog.getListing(serverName, serverPort, protocol, token, "")
+    except (httplib.HTTPException, socket.error, ValueError), e:
+        ArcGISServerMessages.addWarning("Unable to get the folders in the site, reading each folder and service instead - " + str(e))
+        return -1
+    folders = [""] + [folder for folder in rootListing['folders'] if folder not in auditFolderExclusions]
+
+    # Get the permissions on every folder at the same time
+    pool = ThreadPool(max(1, min(int(auditConcurrency), len(folders))))
+    try:
+        folderResults = pool.map(functools.partial(getFolderPermissions, serverName, serverPort, protocol, token), folders)
+    finally:
+        pool.close()
+        pool.join()
+
+    permissionMatrix = {}
+    errors = []
+    for folder, (folderMatrix, error) in zip(folders, folderResults):
+        if error:
+            errors.append((folder or "/") + " - " + error)
+        elif (folderMatrix is None):
+            return None
+        else:
+            permissionMatrix.update(folderMatrix)
+    # Don't compare part of the site, it would look like permissions had been removed
+    if (len(errors) > 0):
+        ArcGISServerMessages.addWarning("Unable to get the permissions on " + str(len(errors)) + " folders, reading each folder and service instead - " + "; ".join(errors[:10]))
+        return -1
+    return permissionMatrix
+# End of get folder permission matrix function
+
+
+# Start of get folder permissions function
+# Returns {resource: {principal: isAllowed}} for a folder ("" for the root) and the services in it, and an error message
+# if they could not be read. Returns None for the permissions and no error if the server has no folder report or it does not include them
+def getFolderPermissions(serverName, serverPort, protocol, token, folder):
+    permissions, error = getResourcePermissions(serverName, serverPort, protocol, token, folder or "/")
+    if error:
+        return None, error
+    folderMatrix = {(folder or "/"): getPrincipals(permissions)}
+
+    # Get the permissions on all the services in the folder from the report (ArcGIS Server 10.2+)
+    params = urllib.urlencode({'token': token, 'f': 'json', 'parameters': json.dumps(["permissions"])})
+    url = "/arcgis/admin/services/" + (folder + "/" if folder else "") + "report"
+    try:
+        response, data = postToServer(serverName, serverPort, protocol, url, params)
+        # The server does not have the report (ArcGIS Server 10.1)
+        if (response.status == 404):
+            return None, None
+        if (response.status != 200):
+            return None, "HTTP " + str(response.status) + " " + response.reason
+        dataObject = json.loads(data)
+    except (httplib.HTTPException, socket.error, ValueError), e:
+        return None, str(e) or type(e).__name__
+    # The server answered without a report, unless it was an error other than not found
+    if ('reports' not in dataObject) and (dataObject.get('code', 404) != 404):
+        return None, "; ".join(dataObject.get('messages', ["No report returned"]))
+    if ('reports' not in dataObject) or any('permissions' not in eachService for eachService in dataObject['reports']):
+        return None, None
+    for eachService in dataObject['reports']:
+        folderMatrix[(folder + "/" if folder else "") + eachService['serviceName'] + "." + eachService['type']] = getPrincipals(eachService['permissions'])
+    return folderMatrix, None
+# End of get folder permissions function
+
+
+# Start of get principals function
+def getPrincipals(permissions):
+    # {principal: isAllowed} from a list of permissions
+    return dict((permission['principal'], permission.get('permission', {}).get('isAllowed', True)) for permission in permissions)
+# End of get principals function
+
+
+# Start of get resource permissions function
+# Returns the permissions on the root ("/"), a folder or a service, and an error message if they could not be read
+def getResourcePermissions(serverName, serverPort, protocol, token, resource):
+    params = urllib.urlencode({'token': token, 'f': 'json'})
+    url = "/arcgis/admin/services/" + ("" if resource == "/" else resource + "/") + "permissions"
+    try:
+        response, data = postToServer(serverName, serverPort, protocol, url, params)
+        if (response.status != 200):
+            return None, "HTTP " + str(response.status) + " " + response.reason
+        dataObject = json.loads(data)
+    except (httplib.HTTPException, socket.error, ValueError), e:
+        return None, str(e) or type(e).__name__
+    if ('permissions' not in dataObject):
+        return None, "; ".join(dataObject.get('messages', ["No permissions returned"]))
+    return dataObject['permissions'], None
+# End of get resource permissions function
+
+
+# Start of diff permissions function
+# Returns a list of (change, resource, principal, isAllowed) for grants ADDED, REMOVED or CHANGED (allowed/denied) since the baseline,
+# only comparing the resources given if there are any
+def diffPermissions(baselineMatrix, permissionMatrix, resources=None):
+    changes = []
+    if (resources is None):
+        resources = set(baselineMatrix) | set(permissionMatrix)
+    for resource in sorted(resources):
+        baselinePrincipals = baselineMatrix.get(resource, {})
+        principals = permissionMatrix.get(resource, {})
+        for principal in sorted(set(baselinePrincipals) | set(principals)):
+            if principal not in baselinePrincipals:
+                changes.append(("ADDED", resource, principal, principals[principal]))
+            elif principal not in principals:
+                changes.append(("REMOVED", resource, principal, baselinePrincipals[principal]))
+            elif (principals[principal] != baselinePrincipals[principal]):
+                changes.append(("CHANGED", resource, principal, principals[principal]))
+    return changes
+# End of diff permissions function
+
+
+# Start of read baseline function
+def readBaseline(baselineFile):
+    try:
+        with open(baselineFile, "r") as f:
+            baseline = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    # Hash baselines saved before snapshots were kept
+    if ('snapshot' not in baseline):
+        baseline['snapshot'] = PermissionSnapshot.createSnapshot(baseline['permissions'])
+    return baseline
+# End of read baseline function
+
+
+# Start of write baseline function
+def writeBaseline(baselineFile, agsServerSite, permissionMatrix, snapshot):
+    # Write to a temporary file first so the baseline is never left half written
+    tempFile = baselineFile + ".tmp"
+    with open(tempFile, "w") as f:
+        json.dump({'site': agsServerSite, 'created': datetime.datetime.now().strftime("%d/%m/%Y - %H:%M:%S"), 'permissions': permissionMatrix, 'snapshot': snapshot}, f, indent=1, sort_keys=True)
+    if (os.name == "nt") and os.path.exists(baselineFile):
+        os.remove(baselineFile)
+    os.rename(tempFile, baselineFile)
+# End of write baseline function
+
+
+# Start of write matrix file function
+def writeMatrixFile(permissionMatrix):
+    if not auditMatrixFile:
+        return
+    # A row for each principal and a column for each resource, Allowed/Denied where the principal has a permission
+    resources = sorted(permissionMatrix)
+    principals = sorted(set(principal for principalGrants in permissionMatrix.values() for principal in principalGrants))
+    with open(auditMatrixFile, "wb") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Principal"] + [resource.encode("utf-8") for resource in resources])
+        for principal in principals:
+            writer.writerow([principal.encode("utf-8")] + [("Allowed" if permissionMatrix[resource][principal] else "Denied") if principal in permissionMatrix[resource] else "" for resource in resources])
+# End of write matrix file function
+
+
 # Start of check permissions function
 def checkPermissions(serverName, serverPort, protocol, service, token):
     params = urllib.urlencode({'token': token, 'f': 'json'})
@@ -134,7 +770,7 @@ def checkPermissions(serverName, serverPort, protocol, service, token):
     try:
         response, data = postToServer(serverName, serverPort, protocol, url, params)
     except:
-        arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+        ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
@@ -143,15 +779,15 @@ def checkPermissions(serverName, serverPort, protocol, service, token):
 
     # If there is an error
     if (response.status != 200):
-        arcpy.AddError("Error getting checking permissions.")
-        arcpy.AddError(str(data))
+        ArcGISServerMessages.addError("Error getting checking permissions.")
+        ArcGISServerMessages.addError(str(data))
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error checking permissions.")
             sys.exit()
         return -1
     if (not assertJsonSuccess(data)):
-        arcpy.AddError("Error checking permissions. Please check if the server is running and ensure that the username/password provided are correct.")
+        ArcGISServerMessages.addError("Error checking permissions. Please check if the server is running and ensure that the username/password provided are correct.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error checking permissions. Please check if the server is running and ensure that the username/password provided are correct.")  
@@ -172,6 +808,12 @@ def checkPermissions(serverName, serverPort, protocol, service, token):
 
 # Start of get token function
 def getToken(username, password, serverName, serverPort, protocol):
+    # Use the cached token for the site if it has not expired
+    tokenSite = protocol + "://" + serverName + ":" + str(serverPort)
+    token = ArcGISServerToken.getCachedToken(tokenSite, username, password, "referer:backuputility", tokenCacheFile, lambda: getToken(username, password, serverName, serverPort, protocol))
+    if token:
+        return token
+
     params = urllib.urlencode({'username': username.decode(sys.stdin.encoding or sys.getdefaultencoding()).encode('utf-8'), 'password': password.decode(sys.stdin.encoding or sys.getdefaultencoding()).encode('utf-8'),'client': 'referer','referer':'backuputility','f': 'json'})
            
     # Construct URL to get a token
@@ -180,7 +822,7 @@ def getToken(username, password, serverName, serverPort, protocol):
     try:
         response, data = postToServer(serverName, serverPort, protocol, url, params)
     except:
-        arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+        ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
@@ -188,15 +830,15 @@ def getToken(username, password, serverName, serverPort, protocol):
         return -1    
     # If there is an error getting the token
     if (response.status != 200):
-        arcpy.AddError("Error while generating the token.")
-        arcpy.AddError(str(data))
+        ArcGISServerMessages.addError("Error while generating the token.")
+        ArcGISServerMessages.addError(str(data))
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error while generating the token.")
             sys.exit()
         return -1
     if (not assertJsonSuccess(data)):
-        arcpy.AddError("Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
+        ArcGISServerMessages.addError("Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
@@ -209,45 +851,29 @@ def getToken(username, password, serverName, serverPort, protocol):
 
         # Return the token if available
         if "error" in dataObject:
-            arcpy.AddError("Error retrieving token.")
+            ArcGISServerMessages.addError("Error retrieving token.")
             # Log error
             if (logging == "true") or (sendErrorEmail == "true"):       
                 loggingFunction(logFile,"error","Error retrieving token.")
                 sys.exit()
             return -1        
         else:
+            # Cache the token until it expires
+            ArcGISServerToken.storeToken(tokenSite, username, password, "referer:backuputility", dataObject['token'], dataObject.get('expires'), tokenCacheFile, lambda: getToken(username, password, serverName, serverPort, protocol))
             return dataObject['token']
 # End of get token function
 
 
 # Start of HTTP POST request to the server function
-def postToServer(serverName, serverPort, protocol, url, params):
-    # If on standard port
-    if (serverPort == -1 and protocol == 'http'):
-        serverPort = 80
-
-    # If on secure port
-    if (serverPort == -1 and protocol == 'https'):
-        serverPort = 443
-        
-    if (protocol == 'http'):
-        httpConn = httplib.HTTPConnection(serverName, int(serverPort))
-
-    if (protocol == 'https'):
-        httpConn = httplib.HTTPSConnection(serverName, int(serverPort))
-        
+def postToServer(serverName, serverPort, protocol, url, params, idempotent=True):
     headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain",'referer':'backuputility','referrer':'backuputility'}
      
     # URL encode the resource URL
     url = urllib.quote(url.encode('utf-8'))
 
-    # Build the connection to add the roles to the server
-    httpConn.request("POST", url, params, headers) 
-
-    response = httpConn.getresponse()
-    data = response.read()
-
-    httpConn.close()
+    # Post to the server over a pooled connection
+    # Requests that only read from the server can be retried if they fail, changes are sent once
+    response, data = ArcGISServerConnection.request(serverName, serverPort, protocol, "POST", url, params, headers, idempotent=idempotent)
 
     # Return response
     return (response, data)
@@ -288,7 +914,7 @@ def splitSiteURL(siteURL):
         # Return variables
         return protocol, serverName, serverPort, context  
     except:
-        arcpy.AddError("The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
+        ArcGISServerMessages.addError("The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
@@ -304,7 +930,7 @@ def assertJsonSuccess(data):
         if ('messages' in obj):
             errMsgs = obj['messages']
             for errMsg in errMsgs:
-                arcpy.AddError(errMsg)
+                ArcGISServerMessages.addError(errMsg)
                 # Log error
                 if (logging == "true") or (sendErrorEmail == "true"):       
                     loggingFunction(logFile,"error",errMsg)
@@ -340,21 +966,8 @@ def loggingFunction(logFile,result,info):
             f.write("Error: " + str(info) + "\n")        
             f.write("---" + "\n")
     if (result == "error") and (sendErrorEmail == "true"):            
-        # Send an email
-        arcpy.AddMessage("Sending email...")
-        # Server and port information
-        smtpserver = smtplib.SMTP("smtp.gmail.com",587) 
-        smtpserver.ehlo()
-        smtpserver.starttls() 
-        smtpserver.ehlo
-        # Login with sender email address and password
-        smtpserver.login(emailUser, emailPassword)
-        # Email content
-        header = 'To:' + emailTo + '\n' + 'From: ' + emailUser + '\n' + 'Subject:' + emailSubject + '\n'
-        message = header + '\n' + emailMessage + '\n' + '\n' + info
-        # Send the email and close the connection
-        smtpserver.sendmail(emailUser, emailTo, message)
-        smtpserver.close()                
+        # Keep the error to send with the alerts at the end of the check
+        runErrors.append(info)
 # End of logging function    
 
 # This test allows the script to be used from the operating
@@ -363,7 +976,6 @@ def loggingFunction(logFile,result,info):
 # another script
 if __name__ == '__main__':
     # Arguments are optional - If running from ArcGIS Desktop tool, parameters will be loaded into *argv
-    argv = tuple(arcpy.GetParameterAsText(i)
-        for i in range(arcpy.GetArgumentCount()))
+    argv = ArcGISServerMessages.getParameters()
     mainFunction(*argv)
     
@@ -0,0 +1,516 @@
+#-------------------------------------------------------------
+# Name:       ArcGIS Server Stand-In
+# Purpose:    Local stand-in for the ArcGIS Server admin and REST endpoints used by the admin
+#             toolkit, so the tools can be tested and benchmarked without a live ArcGIS Server.
+#             Emulates generateToken, services and folders, status, folder reports, start/stop/delete,
+#             permissions, logs/query, security users/roles, machines and exportSite/importSite, with a
+#             configurable number of services and machines, response latency and failure injection. Also has a
+#             local SMTP server that keeps the emails sent to it, for testing alerts.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import re
+import sys
+import ast
+import json
+import base64
+import math
+import time
+import random
+import urllib
+import urlparse
+import smtpd
+import asyncore
+import threading
+import SocketServer
+import BaseHTTPServer
+
+# Set variables
+siteUsername = "siteadmin"
+sitePassword = "adm1n"
+serviceTypes = ["MapServer", "MapServer", "MapServer", "GPServer", "GeocodeServer"]
+millisecondsOfLogs = 604800000 # One week
+# 1x1 PNG returned by map exports
+exportImage = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==")
+
+
+# Start of create site function
+# serviceCount services are spread evenly over the root and folderCount folders. stoppedRate is the
+# fraction of services that are stopped, logMessageCount the number of log messages over the last week.
+# Set reportSupported to false to emulate a 10.1 server without the services report resource.
+# slowRate and brokenRate are the fractions of started services whose REST requests take slowSeconds
+# longer or return an error, to test health probes. Set dropDeleteResponses to true to delete services
+# but close the connection without responding, as if it was lost before the response arrived.
+def createSite(serviceCount=10, folderCount=5, latency=0.0, failureRate=0.0, stoppedRate=0.0, logMessageCount=1000, seed=1, reportSupported=True,
+               slowRate=0.0, brokenRate=0.0, slowSeconds=1.0, machineCount=1, dropDeleteResponses=False):
+    random.seed(seed)
+    folders = ["Folder" + str(number) for number in range(1, folderCount + 1)]
+    site = {'latency': float(latency), 'failureRate': float(failureRate), 'folders': folders, 'services': {}, 'serviceOrder': [],
+            'folderPermissions': dict((folder, [{'principal': 'esriEveryone', 'permission': {'isAllowed': True}}]) for folder in folders),
+            'rootPermissions': [{'principal': 'esriEveryone', 'permission': {'isAllowed': True}}],
+            'users': {}, 'roles': {}, 'tokens': {}, 'requestCount': 0, 'failureCount': 0, 'lock': threading.Lock(),
+            'logMessageCount': int(logMessageCount), 'logStart': int(time.time() * 1000), 'reportSupported': reportSupported,
+            'dropDeleteResponses': dropDeleteResponses, 'machines': []}
+    # Each machine is served on its own port, a machine that is down returns 503 for everything and
+    # serviceStates overrides the state of a service on that machine e.g. {"Folder1/Service1.MapServer": "STOPPED"}
+    for number in range(1, int(machineCount) + 1):
+        site['machines'].append({'machineName': "MACHINE" + str(number), 'port': None, 'state': "STARTED", 'down': False, 'serviceStates': {}})
+
+    for number in range(int(serviceCount)):
+        # Every (folders + 1)th service goes in the root folder
+        folderNumber = number % (folderCount + 1)
+        folder = "" if folderNumber == 0 else folders[folderNumber - 1]
+        serviceType = serviceTypes[number % len(serviceTypes)]
+        serviceKey = addService(site, folder, "Service" + str(number), serviceType, "STOPPED" if random.random() < stoppedRate else "STARTED")
+        site['services'][serviceKey]['delay'] = float(slowSeconds) if random.random() < slowRate else 0.0
+        site['services'][serviceKey]['broken'] = random.random() < brokenRate
+    return site
+# End of create site function
+
+
+# Start of add service function
+def addService(site, folder, serviceName, serviceType, state="STARTED"):
+    serviceKey = (folder + "/" if folder else "") + serviceName + "." + serviceType
+    site['services'][serviceKey] = {'folderName': folder, 'serviceName': serviceName, 'type': serviceType, 'state': state, 'permissions': [], 'delay': 0.0, 'broken': False}
+    site['serviceOrder'].append(serviceKey)
+    return serviceKey
+# End of add service function
+
+
+# Start of route request function
+# Returns the HTTP status and the object to send back as JSON for a request path and its parameters,
+# or a string to send back as an image
+def routeRequest(site, path, params, machineName=None):
+    # Token requests
+    if path in ["/arcgis/admin/generateToken", "/arcgis/tokens/generateToken"]:
+        return generateToken(site, params)
+
+    # REST service details and operations
+    if path.startswith("/arcgis/rest/services/"):
+        return getServiceDetails(site, path[len("/arcgis/rest/services/"):], params)
+
+    if not path.startswith("/arcgis/admin"):
+        return 404, {'status': 'error', 'messages': ['Resource not found'], 'code': 404}
+
+    # Everything else in the admin API needs a valid token, except creating a site
+    if path != "/arcgis/admin/createNewSite" and params.get('token') not in site['tokens']:
+        # A token the site did not issue, e.g. one from before a restart, is invalid rather than missing
+        if params.get('token'):
+            return 200, {'status': 'error', 'messages': ['Invalid token.'], 'code': 498}
+        return 200, {'status': 'error', 'messages': ['Token Required'], 'code': 499}
+
+    if path == "/arcgis/admin/services" or path.startswith("/arcgis/admin/services/"):
+        return routeServices(site, [part for part in path[len("/arcgis/admin/services"):].split("/") if part], params, machineName)
+    if path == "/arcgis/admin/machines" or path.startswith("/arcgis/admin/machines/"):
+        return routeMachines(site, [part for part in path[len("/arcgis/admin/machines"):].split("/") if part])
+    if path == "/arcgis/admin/logs/query":
+        return queryLogs(site, params)
+    if path.startswith("/arcgis/admin/security/"):
+        return routeSecurity(site, path[len("/arcgis/admin/security/"):], params)
+    if path == "/arcgis/admin/exportSite":
+        return 200, {'status': 'success', 'location': params.get('location', '') + "\\standin.agssite"}
+    if path == "/arcgis/admin/importSite":
+        return 200, {'status': 'success', 'result': [{'source': 'SITE', 'messages': [{'level': 'INFO', 'message': 'Import operation completed in 1 seconds.'}]}]}
+    if path == "/arcgis/admin/createNewSite":
+        return 200, {'status': 'success'}
+    if path == "/arcgis/admin/system/webadaptors/register":
+        return 200, {'status': 'success'}
+    return 404, {'status': 'error', 'messages': ['Resource not found'], 'code': 404}
+# End of route request function
+
+
+# Start of generate token function
+def generateToken(site, params):
+    if (params.get('username') != siteUsername) or (params.get('password') != sitePassword):
+        return 200, {'status': 'error', 'messages': ['Unable to generate token.', 'Invalid username or password.'], 'code': 400}
+    token = "%032x" % random.getrandbits(128)
+    expiration = int(params.get('expiration', 60))
+    with site['lock']:
+        site['tokens'][token] = True
+    return 200, {'token': token, 'expires': int(time.time() * 1000) + expiration * 60000}
+# End of generate token function
+
+
+# Start of route services function
+def routeServices(site, parts, params, machineName=None):
+    # Root folder listing
+    if (len(parts) == 0):
+        return 200, getFolderListing(site, "")
+
+    # Report on the services in the root folder
+    if (parts == ["report"]) and site['reportSupported']:
+        return 200, getFolderReport(site, "", machineName)
+
+    # Folder resources
+    if parts[0] in site['folders'] or parts[0] in ["System", "Utilities"]:
+        folder = parts[0]
+        if (len(parts) == 1):
+            return 200, getFolderListing(site, folder)
+        if (parts[1:] == ["report"]) and site['reportSupported']:
+            return 200, getFolderReport(site, folder, machineName)
+        if (parts[1] == "permissions"):
+            return routePermissions(site['folderPermissions'].setdefault(folder, []), parts[2:], params)
+        # Otherwise the rest of the path is a service in the folder
+        serviceKey = folder + "/" + parts[1]
+        operation = parts[2:]
+    elif (parts[0] == "permissions"):
+        return routePermissions(site['rootPermissions'], parts[1:], params)
+    else:
+        serviceKey = parts[0]
+        operation = parts[1:]
+
+    service = site['services'].get(serviceKey)
+    if service is None:
+        return 200, {'status': 'error', 'messages': ['Service ' + serviceKey + ' not found.'], 'code': 404}
+    if (len(operation) == 0):
+        return 200, {'serviceName': service['serviceName'], 'type': service['type'], 'folderName': service['folderName']}
+    if (operation[0] == "status"):
+        return 200, {'configuredState': service['state'], 'realTimeState': getServiceState(site, serviceKey, machineName)}
+    if (operation[0] in ["start", "stop"]):
+        service['state'] = "STARTED" if operation[0] == "start" else "STOPPED"
+        return 200, {'status': 'success'}
+    if (operation[0] == "delete"):
+        with site['lock']:
+            del site['services'][serviceKey]
+            site['serviceOrder'].remove(serviceKey)
+        return 200, {'status': 'success'}
+    if (operation[0] == "permissions"):
+        return routePermissions(service['permissions'], operation[1:], params)
+    return 404, {'status': 'error', 'messages': ['Resource not found'], 'code': 404}
+# End of route services function
+
+
+# Start of get folder listing function
+def getFolderListing(site, folder):
+    services = [{'folderName': site['services'][serviceKey]['folderName'], 'serviceName': site['services'][serviceKey]['serviceName'], 'type': site['services'][serviceKey]['type']}
+                for serviceKey in site['serviceOrder'] if site['services'][serviceKey]['folderName'] == folder]
+    listing = {'folderName': folder or "/", 'services': services}
+    if (folder == ""):
+        listing['folders'] = site['folders'] + ["System", "Utilities"]
+    return listing
+# End of get folder listing function
+
+
+# Start of route machines function
+def routeMachines(site, parts):
+    # Machines in the site
+    if (len(parts) == 0):
+        return 200, {'machines': [{'machineName': machine['machineName'], 'adminURL': "http://127.0.0.1:" + str(machine['port']) + "/arcgis/admin"} for machine in site['machines']]}
+    machine = getMachine(site, parts[0])
+    if machine is None:
+        return 200, {'status': 'error', 'messages': ['Machine ' + parts[0] + ' not found.'], 'code': 404}
+    if (parts[1:] == ["status"]):
+        return 200, {'configuredState': "STARTED", 'realTimeState': machine['state']}
+    if (len(parts) == 1):
+        return 200, {'machineName': machine['machineName'], 'adminURL': "http://127.0.0.1:" + str(machine['port']) + "/arcgis/admin", 'configuredState': "STARTED"}
+    return 404, {'status': 'error', 'messages': ['Resource not found'], 'code': 404}
+# End of route machines function
+
+
+# Start of get machine function
+def getMachine(site, machineName):
+    for machine in site['machines']:
+        if (machine['machineName'] == machineName):
+            return machine
+    return None
+# End of get machine function
+
+
+# Start of get service state function
+def getServiceState(site, serviceKey, machineName=None):
+    # State of the service on the machine the request was sent to, if it is different to the site
+    machine = getMachine(site, machineName) if machineName else None
+    if machine is not None:
+        return machine['serviceStates'].get(serviceKey, site['services'][serviceKey]['state'])
+    return site['services'][serviceKey]['state']
+# End of get service state function
+
+
+# Start of get folder report function
+def getFolderReport(site, folder, machineName=None):
+    # Details and status of every service in the folder, as returned by the 10.2+ report resource
+    reports = []
+    for serviceKey in site['serviceOrder']:
+        service = site['services'][serviceKey]
+        if (service['folderName'] == folder):
+            reports.append({'folderName': folder or "/", 'serviceName': service['serviceName'], 'type': service['type'],
+                            'status': {'configuredState': service['state'], 'realTimeState': getServiceState(site, serviceKey, machineName)},
+                            'permissions': service['permissions']})
+    return {'reports': reports}
+# End of get folder report function
+
+
+# Start of route permissions function
+def routePermissions(permissions, operation, params):
+    if (len(operation) == 0):
+        return 200, {'permissions': permissions}
+    principal = params.get('principal')
+    if (operation[0] == "add"):
+        isAllowed = params.get('isAllowed', 'true').lower() == 'true'
+        permissions[:] = [permission for permission in permissions if permission['principal'] != principal]
+        permissions.append({'principal': principal, 'permission': {'isAllowed': isAllowed}})
+        return 200, {'status': 'success'}
+    if (operation[0] == "remove"):
+        permissions[:] = [permission for permission in permissions if permission['principal'] != principal]
+        return 200, {'status': 'success'}
+    return 404, {'status': 'error', 'messages': ['Resource not found'], 'code': 404}
+# End of route permissions function
+
+
+# Start of route security function
+def routeSecurity(site, resource, params):
+    if (resource == "users/add"):
+        user = json.loads(params.get('user', '{}'))
+        site['users'][user.get('username')] = user
+        return 200, {'status': 'success'}
+    if (resource == "roles/add"):
+        role = json.loads(params.get('Role', params.get('role', '{}')))
+        site['roles'][role.get('rolename')] = {'privilege': None, 'users': []}
+        return 200, {'status': 'success'}
+    if (resource == "roles/assignPrivilege"):
+        site['roles'].setdefault(params.get('rolename'), {'privilege': None, 'users': []})['privilege'] = params.get('privilege')
+        return 200, {'status': 'success'}
+    if (resource == "roles/addUsersToRole"):
+        site['roles'].setdefault(params.get('rolename'), {'privilege': None, 'users': []})['users'].extend(params.get('users', '').split(","))
+        return 200, {'status': 'success'}
+    if (resource == "users/getUsers"):
+        return 200, {'users': site['users'].values()}
+    if (resource == "roles/getRoles"):
+        return 200, {'roles': [{'rolename': rolename} for rolename in site['roles']]}
+    return 404, {'status': 'error', 'messages': ['Resource not found'], 'code': 404}
+# End of route security function
+
+
+# Start of query logs function
+# Log messages are generated on the fly, message i is logged at logStart - i * spacing milliseconds
+def queryLogs(site, params):
+    messageCount = site['logMessageCount']
+    spacing = max(1, millisecondsOfLogs // max(1, messageCount))
+    startTime = int(params.get('startTime', site['logStart']))
+    endTime = int(params.get('endTime', site['logStart'] - millisecondsOfLogs))
+    pageSize = min(10000, int(params.get('pageSize', 1000)))
+
+    # If the filter asks for particular services, log all messages against the first one
+    source = None
+    try:
+        logFilter = ast.literal_eval(params.get('filter', '{}'))
+        if isinstance(logFilter.get('services'), list) and len(logFilter['services']) > 0:
+            source = logFilter['services'][0]
+    except (ValueError, SyntaxError, AttributeError):
+        pass
+
+    # Work out the messages in the time window
+    firstMessage = max(0, int(math.ceil((site['logStart'] - startTime) / float(spacing))))
+    lastMessage = min(messageCount - 1, int(math.floor((site['logStart'] - endTime) / float(spacing))))
+    pageEnd = min(lastMessage, firstMessage + pageSize - 1)
+
+    serviceKeys = site['serviceOrder'] or ["SampleWorldCities.MapServer"]
+    logMessages = []
+    for index in range(firstMessage, pageEnd + 1):
+        logMessages.append(getLogMessage(site['logStart'] - index * spacing, index, source or serviceKeys[index % len(serviceKeys)]))
+
+    response = {'hasMore': pageEnd < lastMessage, 'startTime': startTime, 'logMessages': logMessages}
+    response['endTime'] = logMessages[-1]['time'] if logMessages else endTime
+    return 200, response
+# End of query logs function
+
+
+# Start of get log message function
+def getLogMessage(messageTime, index, source):
+    logMessage = {'type': 'FINE', 'time': messageTime, 'source': source, 'machine': 'STANDIN', 'user': '', 'code': 100004, 'process': '1234', 'thread': str(index % 16), 'methodName': ''}
+    # Alternate between the end of a draw and the extent drawn
+    if (index % 2 == 0):
+        logMessage['message'] = "End ExportMapImage"
+        logMessage['elapsed'] = str(0.05 + (index * 37 % 1000) / 1000.0)
+    else:
+        x = 1570000 + (index * 7919 % 100000)
+        y = 5170000 + (index * 104729 % 100000)
+        logMessage['message'] = "Extent:{0},{1},{2},{3};Size:1024,768;Scale:{4}".format(x, y, x + 2000, y + 1500, 2000 * (1 + index % 50))
+        logMessage['elapsed'] = ""
+    return logMessage
+# End of get log message function
+
+
+# Start of get service details function
+def getServiceDetails(site, servicePath, params):
+    # The path is folder/name/type, followed by the operation if there is one
+    parts = [part for part in servicePath.split("/") if part]
+    typeIndex = [index for index, part in enumerate(parts) if part.endswith("Server")]
+    if (len(typeIndex) == 0) or (typeIndex[0] == 0):
+        return 200, {'folders': site['folders'], 'services': getFolderListing(site, "")['services']}
+    typeIndex = typeIndex[0]
+    serviceKey = "/".join(parts[:typeIndex - 1] + [parts[typeIndex - 1] + "." + parts[typeIndex]])
+    operation = parts[typeIndex + 1:]
+    service = site['services'].get(serviceKey)
+    if service is None:
+        return 200, {'error': {'code': 404, 'message': 'Service not found', 'details': []}}
+    if (service['state'] != "STARTED"):
+        return 200, {'error': {'code': 500, 'message': 'Service ' + serviceKey + ' not started', 'details': []}}
+
+    # Slow and broken services
+    if (service['delay'] > 0):
+        time.sleep(service['delay'])
+    if service['broken']:
+        return 200, {'error': {'code': 500, 'message': 'Error performing operation', 'details': []}}
+
+    if (operation == ["export"]) and (service['type'] == "MapServer"):
+        if (params.get('f') == "image"):
+            return 200, exportImage
+        return 200, {'href': '/arcgis/rest/directories/arcgisoutput/export.png', 'width': 1, 'height': 1}
+    if (len(operation) == 2) and (operation[1] == "query") and (service['type'] == "MapServer"):
+        if (params.get('returnCountOnly', "").lower() == "true"):
+            return 200, {'count': 100}
+        return 200, {'features': []}
+    if (len(operation) > 0):
+        return 200, {'error': {'code': 400, 'message': 'Unable to complete operation', 'details': []}}
+    return 200, {'serviceDescription': '', 'fullExtent': {'xmin': 1560000.0, 'ymin': 5160000.0, 'xmax': 1690000.0, 'ymax': 5290000.0, 'spatialReference': {'wkid': 2193}}}
+# End of get service details function
+
+
+# Start of stand-in request handler class
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # Keep connections open between requests like ArcGIS Server does
+    protocol_version = "HTTP/1.1"
+    # Send each response in one write rather than a packet per header
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.handleRequest("")
+
+    def do_POST(self):
+        self.handleRequest(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    def handleRequest(self, body):
+        site = self.server.site
+        machine = getMachine(site, self.server.machineName)
+        splitPath = urlparse.urlsplit(self.path)
+        params = dict(urlparse.parse_qsl(splitPath.query))
+        params.update(dict(urlparse.parse_qsl(body)))
+        path = re.sub("/+", "/", urllib.unquote(splitPath.path)).rstrip("/")
+
+        with site['lock']:
+            site['requestCount'] += 1
+        # Add the latency, varying it by up to half either way
+        if (site['latency'] > 0):
+            time.sleep(site['latency'] * random.uniform(0.5, 1.5))
+
+        # A machine that is down does not respond to anything
+        if (machine is not None) and machine['down']:
+            status, responseObject = 503, {'status': 'error', 'messages': ['Service unavailable'], 'code': 503}
+        # Fail some of the requests
+        elif (random.random() < site['failureRate']):
+            with site['lock']:
+                site['failureCount'] += 1
+            status, responseObject = 500, {'status': 'error', 'messages': ['Injected failure'], 'code': 500}
+        else:
+            status, responseObject = routeRequest(site, path, params, self.server.machineName)
+            # Lose the response to a delete that was carried out
+            if site['dropDeleteResponses'] and path.endswith("/delete") and (status == 200) and (responseObject.get('status') == "success"):
+                self.close_connection = 1
+                return
+
+        if isinstance(responseObject, str):
+            responseBody = responseObject
+            contentType = "image/png"
+        else:
+            responseBody = json.dumps(responseObject)
+            contentType = "text/plain;charset=UTF-8"
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(responseBody)))
+        self.end_headers()
+        self.wfile.write(responseBody)
+
+    def log_message(self, format, *args):
+        # Keep the console quiet
+        pass
+# End of stand-in request handler class
+
+
+# Start of stand-in server class
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Machine the server is, and the servers for the other machines in the site
+    machineName = None
+    machineServers = []
+
+    def shutdown(self):
+        # Stop the other machines in the site as well
+        for machineServer in self.machineServers:
+            machineServer.shutdown()
+            machineServer.server_close()
+        SocketServer.TCPServer.shutdown(self)
+# End of stand-in server class
+
+
+# Start of start server function
+# Starts the stand-in in a background thread and returns the server, its site and port.
+# Use port 0 to pick a free port. Call server.shutdown() to stop it. With machineCount
+# above 1 the other machines in the site are started on free ports.
+def startServer(port=0, **siteOptions):
+    site = createSite(**siteOptions)
+    servers = []
+    for machine in site['machines']:
+        server = StandInServer(("127.0.0.1", int(port) if len(servers) == 0 else 0), StandInHandler)
+        server.site = site
+        server.machineName = machine['machineName']
+        machine['port'] = server.server_address[1]
+        serverThread = threading.Thread(target=server.serve_forever)
+        serverThread.daemon = True
+        serverThread.start()
+        servers.append(server)
+    servers[0].machineServers = servers[1:]
+    return servers[0], site, servers[0].server_address[1]
+# End of start server function
+
+
+# Start of stand-in SMTP server class
+class StandInSMTPServer(smtpd.SMTPServer):
+    def __init__(self, address):
+        smtpd.SMTPServer.__init__(self, address, None)
+        self.messages = []
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        # Keep the email rather than sending it on
+        self.messages.append({'from': mailfrom, 'to': rcpttos, 'data': data})
+# End of stand-in SMTP server class
+
+
+# Start of start SMTP server function
+# Starts the SMTP stand-in in a background thread and returns the server, the list its emails are added to
+# and its port. Call server.close() to stop it.
+def startSMTPServer(port=0):
+    server = StandInSMTPServer(("127.0.0.1", int(port)))
+    serverThread = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.1})
+    serverThread.daemon = True
+    serverThread.start()
+    return server, server.messages, server.socket.getsockname()[1]
+# End of start SMTP server function
+
+
+# Run the stand-in from the command prompt
+# e.g. python ArcGISServerStandIn.py 6080 1000 0.01 0.05
+# (port, number of services, latency in seconds, fraction of requests to fail)
+if __name__ == '__main__':
+    args = sys.argv
+    port = int(args[1]) if len(args) > 1 else 6080
+    serviceCount = int(args[2]) if len(args) > 2 else 10
+    latency = float(args[3]) if len(args) > 3 else 0.0
+    failureRate = float(args[4]) if len(args) > 4 else 0.0
+    server = StandInServer(("127.0.0.1", port), StandInHandler)
+    server.site = createSite(serviceCount, latency=latency, failureRate=failureRate)
+    server.machineName = server.site['machines'][0]['machineName']
+    server.site['machines'][0]['port'] = port
+    print "ArcGIS Server stand-in running at http://localhost:{0}/arcgis with {1} services (user {2}, password {3})".format(port, serviceCount, siteUsername, sitePassword)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
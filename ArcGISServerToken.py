@@ -0,0 +1,216 @@
+#-------------------------------------------------------------
+# Name:       ArcGIS Server Token
+# Purpose:    Caches the tokens generated by ArcGIS Server for each site and user until shortly
+#             before they expire, so the admin toolkit scripts only call generateToken when
+#             needed. Tokens can optionally be kept in a local file to share them between runs.
+#             A token the server rejects (e.g. after a restart) is dropped from the cache and renewed,
+#             and requests still using it are sent with the new token.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import os
+import json
+import time
+import urllib
+import hashlib
+import threading
+
+# Set variables
+# Seconds before a token expires that it will be refreshed
+refreshSeconds = 120
+# Seconds to keep a token for if the server does not say when it expires
+defaultExpirySeconds = 900
+# Default location of the token cache file, in the user's profile so only they can read it
+defaultCacheFile = os.path.join(os.path.expanduser("~"), ".ArcGISAdminToolkitTokens.json")
+
+# Tokens cached for this process, keyed by a hash of the site, user, password and client
+cachedTokens = {}
+cacheLock = threading.Lock()
+# Details and the function to get a new token for the token handed out for each site and user, and the new token
+# for the last token renewed for each. Only the latest token for each is kept, so neither grows in a long running script
+watchedTokens = {}
+renewedTokens = {}
+renewLock = threading.RLock()
+# Error codes and messages the server returns for a token that is invalid or has expired
+rejectedCodes = [498, 499]
+rejectedMessages = ["invalid token", "token expired", "token has expired"]
+
+
+# Start of get cache key function
+def getCacheKey(site, username, password, client):
+    # Hash the details so the password is never written to the cache file
+    cacheKey = "|".join([site, username, password, client])
+    if isinstance(cacheKey, unicode):
+        cacheKey = cacheKey.encode("utf-8")
+    return hashlib.sha256(cacheKey).hexdigest()
+# End of get cache key function
+
+
+# Start of get cached token function
+# renewFunction gets a new token if the server rejects this one, e.g. the script's get token function
+def getCachedToken(site, username, password, client, cacheFile=None, renewFunction=None):
+    cacheKey = getCacheKey(site, username, password, client)
+    with cacheLock:
+        cachedToken = cachedTokens.get(cacheKey)
+        # If not in memory, look in the cache file
+        if (not isValid(cachedToken)) and cacheFile:
+            cachedToken = readCacheFile(cacheFile).get(cacheKey)
+            if isValid(cachedToken):
+                cachedTokens[cacheKey] = cachedToken
+        if isValid(cachedToken):
+            watchToken(cachedToken['token'], cacheKey, site, username, password, client, cacheFile, renewFunction)
+            return cachedToken['token']
+    return None
+# End of get cached token function
+
+
+# Start of store token function
+# expires is the time in milliseconds the server reported the token expires at
+def storeToken(site, username, password, client, token, expires=None, cacheFile=None, renewFunction=None):
+    if not expires:
+        expires = (time.time() + defaultExpirySeconds) * 1000
+    cachedToken = {'token': token, 'expires': int(expires)}
+    cacheKey = getCacheKey(site, username, password, client)
+    with cacheLock:
+        cachedTokens[cacheKey] = cachedToken
+        if cacheFile:
+            fileTokens = readCacheFile(cacheFile)
+            fileTokens[cacheKey] = cachedToken
+            writeCacheFile(cacheFile, fileTokens)
+        watchToken(token, cacheKey, site, username, password, client, cacheFile, renewFunction)
+# End of store token function
+
+
+# Start of watch token function
+def watchToken(token, cacheKey, site, username, password, client, cacheFile, renewFunction):
+    if (renewFunction is None) or (token in watchedTokens):
+        return
+    # Stop watching the token this one replaced in the cache
+    for watchedToken in [watchedToken for watchedToken, details in watchedTokens.items() if details['cacheKey'] == cacheKey]:
+        watchedTokens.pop(watchedToken, None)
+    watchedTokens[token] = {'cacheKey': cacheKey, 'details': (site, username, password, client, cacheFile), 'renew': renewFunction}
+# End of watch token function
+
+
+# Start of is token rejected function
+# Whether a response says the token sent with the request is invalid or has expired
+def isTokenRejected(status, data):
+    if status in rejectedCodes:
+        return True
+    # Error responses are small, so don't look through large responses such as pages of logs
+    if (not data) or (len(data) > 4096) or (data.lstrip()[:1] != "{"):
+        return False
+    try:
+        dataObject = json.loads(data)
+    except ValueError:
+        return False
+    if not isinstance(dataObject, dict):
+        return False
+    error = dataObject.get('error', dataObject)
+    if not isinstance(error, dict):
+        return False
+    messages = [error.get('message', "")] + list(error.get('messages', None) or []) + list(error.get('details', None) or [])
+    return (error.get('code') in rejectedCodes) or any(rejectedMessage in unicode(message).lower() for message in messages for rejectedMessage in rejectedMessages)
+# End of is token rejected function
+
+
+# Start of find token function
+# Returns the watched token sent in the URL or body of a request, or None if there isn't one
+def findToken(url, body):
+    for token in watchedTokens.keys():
+        for tokenText in [token, urllib.quote_plus(token)]:
+            if (tokenText in url) or (body and tokenText in body):
+                return token
+    return None
+# End of find token function
+
+
+# Start of renew token function
+# Drops a token the server rejected from the cache and gets a new one. Returns the new token, or None if it can't be renewed
+def renewToken(token):
+    # Only renew each token once, other requests that were rejected at the same time use the same new token
+    with renewLock:
+        if token in renewedTokens:
+            return renewedTokens[token]['token']
+        watchedToken = watchedTokens.get(token)
+        if watchedToken is None:
+            return None
+        clearToken(*watchedToken['details'])
+        newToken = watchedToken['renew']()
+        if (not newToken) or (newToken == -1) or (newToken == token):
+            return None
+        # Requests are only still being sent with the token just renewed, not ones renewed before it
+        for renewedToken in [renewedToken for renewedToken, renewal in renewedTokens.items() if renewal['cacheKey'] == watchedToken['cacheKey']]:
+            renewedTokens.pop(renewedToken, None)
+        renewedTokens[token] = {'cacheKey': watchedToken['cacheKey'], 'token': newToken}
+        return newToken
+# End of renew token function
+
+
+# Start of replace tokens function
+# Returns the URL and body of a request with any renewed token replaced by its new token
+def replaceTokens(url, body, token=None, newToken=None):
+    replacements = [(token, newToken)] if token else [(renewedToken, renewal['token']) for renewedToken, renewal in renewedTokens.items()]
+    for oldToken, replacementToken in replacements:
+        for oldText, newText in [(oldToken, replacementToken), (urllib.quote_plus(oldToken), urllib.quote_plus(replacementToken))]:
+            url = url.replace(oldText, newText)
+            if body:
+                body = body.replace(oldText, newText)
+    return url, body
+# End of replace tokens function
+
+
+# Start of clear token function
+def clearToken(site, username, password, client, cacheFile=None):
+    cacheKey = getCacheKey(site, username, password, client)
+    with cacheLock:
+        cachedTokens.pop(cacheKey, None)
+        if cacheFile:
+            fileTokens = readCacheFile(cacheFile)
+            if fileTokens.pop(cacheKey, None):
+                writeCacheFile(cacheFile, fileTokens)
+# End of clear token function
+
+
+# Start of is valid function
+def isValid(cachedToken):
+    # Valid if the token does not expire within the refresh period
+    return (cachedToken is not None) and (cachedToken['expires'] - (refreshSeconds * 1000) > time.time() * 1000)
+# End of is valid function
+
+
+# Start of read cache file function
+def readCacheFile(cacheFile):
+    try:
+        with open(cacheFile, "r") as f:
+            fileTokens = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    # Drop any expired tokens
+    return dict((cacheKey, cachedToken) for cacheKey, cachedToken in fileTokens.items() if isValid(cachedToken))
+# End of read cache file function
+
+
+# Start of write cache file function
+def writeCacheFile(cacheFile, fileTokens):
+    tempFile = cacheFile + ".tmp"
+    try:
+        # Create the file readable by the current user only
+        fileDescriptor = os.open(tempFile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        with os.fdopen(fileDescriptor, "w") as f:
+            json.dump(fileTokens, f)
+        os.chmod(tempFile, 0600)
+        # Replace the previous file
+        if (os.name == "nt") and os.path.exists(cacheFile):
+            os.remove(cacheFile)
+        os.rename(tempFile, cacheFile)
+    except (IOError, OSError):
+        # The cache is only an optimisation, so carry on without it
+        pass
+# End of write cache file function
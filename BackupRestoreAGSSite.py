@@ -16,17 +16,17 @@
 # Python Version:   2.7
 #--------------------------------
 
-# Import modules and enable data to be overwritten
+# Import modules
 import os
 import sys
 import datetime
 import json
 import smtplib
-import httplib
 import urllib
 import urlparse
-import arcpy
-arcpy.env.overwriteOutput = True
+import ArcGISServerConnection
+import ArcGISServerToken
+import ArcGISServerMessages
 
 # Set variables
 logging = "true"
@@ -37,6 +37,8 @@ emailUser = ""
 emailPassword = ""
 emailSubject = ""
 emailMessage = ""
+tokenCacheFile = "" # ArcGISServerToken.defaultCacheFile to keep tokens between runs
+siteOperationTimeout = 7200 # Seconds to wait for a backup, restore or new site to finish, other requests use ArcGISServerConnection.readTimeout
 output = None
 
 # Start of main function
@@ -68,10 +70,10 @@ def mainFunction(agsServerSite,username,password,backupRestore,backupFolder,back
         # If site not created created   
         if token == -1:
             # Create new site
-            arcpy.AddMessage("Creating site...")
+            ArcGISServerMessages.addMessage("Creating site...")
             siteResult = createSite(username,password,serverName, serverPort, protocol)
         else:    
-            arcpy.AddMessage("Site already created...")
+            ArcGISServerMessages.addMessage("Site already created...")
             
         # If backing up site
         if (backupRestore == "Backup"):
@@ -85,13 +87,15 @@ def mainFunction(agsServerSite,username,password,backupRestore,backupFolder,back
             token = getToken(username, password, serverName, serverPort, protocol)            
             # Restore the site
             restoreSite(serverName, serverPort, protocol, context, token, backupFile, restoreReport)   
+            # Tokens from before the restore may no longer be accepted by the restored site
+            ArcGISServerToken.clearToken(protocol + "://" + serverName + ":" + str(serverPort), username, password, "referer:backuputility", tokenCacheFile)
 
             # If restoring a web adaptor
             if (restoreWebAdaptor == "true"):
                 # Get token
                 token = getToken(username, password, serverName, serverPort, protocol)
                 # Register the web adaptor
-                arcpy.AddMessage("Registering the web adaptor...")                
+                ArcGISServerMessages.addMessage("Registering the web adaptor...")                
                 registerWebAdaptor(serverName, serverPort, protocol, token)            
         # --------------------------------------- End of code --------------------------------------- #  
             
@@ -99,7 +103,7 @@ def mainFunction(agsServerSite,username,password,backupRestore,backupFolder,back
         if __name__ == '__main__':
             # Return the output if there is any
             if output:
-                arcpy.SetParameterAsText(1, output)
+                ArcGISServerMessages.setParameter(1, output)
         # Otherwise return the result          
         else:
             # Return the output if there is any
@@ -110,16 +114,16 @@ def mainFunction(agsServerSite,username,password,backupRestore,backupFolder,back
             loggingFunction(logFile,"end","")        
         pass
     # If arcpy error
-    except arcpy.ExecuteError:
+    except ArcGISServerMessages.ExecuteError:
         # Show the message
-        arcpy.AddError(arcpy.GetMessages(2))        
+        ArcGISServerMessages.addError(ArcGISServerMessages.getMessages(2))        
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):
-            loggingFunction(logFile,"error",arcpy.GetMessages(2))
+            loggingFunction(logFile,"error",ArcGISServerMessages.getMessages(2))
     # If python error
     except Exception as e:
         # Show the message
-        arcpy.AddError(e.args[0])          
+        ArcGISServerMessages.addError(e.args[0])          
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):     
             loggingFunction(logFile,"error",e.args[0])
@@ -136,13 +140,13 @@ def backupSite(serverName, serverPort, protocol, context, token, backupFolder):
         backupFolder = backupFolder.decode(sys.stdin.encoding or sys.getdefaultencoding()).encode('utf-8')
         params = urllib.urlencode({'token': token, 'f': 'json', 'location': backupFolder})
 
-        arcpy.AddMessage("Backing up the ArcGIS Server site running at " + serverName + "...")
+        ArcGISServerMessages.addMessage("Backing up the ArcGIS Server site running at " + serverName + "...")
 
         try:
             # Post to server
-            response, data = postToServer(serverName, serverPort, protocol, backupURL, params)
+            response, data = postToServer(serverName, serverPort, protocol, backupURL, params, siteOperationTimeout)
         except:
-            arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+            ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
             # Log error
             if (logging == "true") or (sendErrorEmail == "true"):       
                 loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")            
@@ -150,15 +154,15 @@ def backupSite(serverName, serverPort, protocol, context, token, backupFolder):
 
         # If there is an error
         if (response.status != 200):
-            arcpy.AddError("Unable to back up the ArcGIS Server site running at " + serverName)
-            arcpy.AddError(str(data))
+            ArcGISServerMessages.addError("Unable to back up the ArcGIS Server site running at " + serverName)
+            ArcGISServerMessages.addError(str(data))
             # Log error
             if (logging == "true") or (sendErrorEmail == "true"):       
                 loggingFunction(logFile,"error","Unable to back up the ArcGIS Server site running at " + serverName)              
             return -1
         
         if (not assertJsonSuccess(data)):
-            arcpy.AddError("Unable to back up the ArcGIS Server site running at " + serverName)
+            ArcGISServerMessages.addError("Unable to back up the ArcGIS Server site running at " + serverName)
             # Log error
             if (logging == "true") or (sendErrorEmail == "true"):       
                 loggingFunction(logFile,"error","Unable to back up the ArcGIS Server site running at " + serverName)            
@@ -166,9 +170,9 @@ def backupSite(serverName, serverPort, protocol, context, token, backupFolder):
         # On successful backup
         else:
             dataObject = json.loads(data)
-            arcpy.AddMessage("ArcGIS Server site has been successfully backed up and is available at this location: " + dataObject['location'] + "...")
+            ArcGISServerMessages.addMessage("ArcGIS Server site has been successfully backed up and is available at this location: " + dataObject['location'] + "...")
     else:
-        arcpy.AddError("Please define a folder for the backup to be exported to.");
+        ArcGISServerMessages.addError("Please define a folder for the backup to be exported to.");
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Please define a folder for the backup to be exported to.")        
@@ -181,8 +185,8 @@ def restoreSite(serverName, serverPort, protocol, context, token, backupFile, re
         # Get restore url
         restoreURL = context + "importSite"
 
-        arcpy.AddMessage("Beginning to restore the ArcGIS Server site running on " + serverName + " using the site backup available at: " + backupFile + "...")
-        arcpy.AddMessage("This operation can take some time. You will not receive any status messages and will not be able to access the site until the operation is complete...")
+        ArcGISServerMessages.addMessage("Beginning to restore the ArcGIS Server site running on " + serverName + " using the site backup available at: " + backupFile + "...")
+        ArcGISServerMessages.addMessage("This operation can take some time. You will not receive any status messages and will not be able to access the site until the operation is complete...")
 
         # Setup parameters
         backupFile = backupFile.decode(sys.stdin.encoding or sys.getdefaultencoding()).encode('utf-8')
@@ -190,9 +194,9 @@ def restoreSite(serverName, serverPort, protocol, context, token, backupFile, re
 
         try:
             # Post to server
-            response, data = postToServer(serverName, serverPort, protocol, restoreURL, params)
+            response, data = postToServer(serverName, serverPort, protocol, restoreURL, params, siteOperationTimeout)
         except:
-            arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+            ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
             # Log error
             if (logging == "true") or (sendErrorEmail == "true"):       
                 loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")            
@@ -200,16 +204,16 @@ def restoreSite(serverName, serverPort, protocol, context, token, backupFile, re
 
         # If there is an error 
         if (response.status != 200):
-            arcpy.AddError("The restore of the ArcGIS Server site " + serverName + " failed.")
-            arcpy.AddError(str(data))
+            ArcGISServerMessages.addError("The restore of the ArcGIS Server site " + serverName + " failed.")
+            ArcGISServerMessages.addError(str(data))
             # Log error
             if (logging == "true") or (sendErrorEmail == "true"):       
                 loggingFunction(logFile,"error","The restore of the ArcGIS Server site " + serverName + " failed.")              
             return -1
 
         if (not assertJsonSuccess(data)):
-            arcpy.AddError("The restore of the ArcGIS Server site " + serverName + " failed.")
-            arcpy.AddError(str(data))
+            ArcGISServerMessages.addError("The restore of the ArcGIS Server site " + serverName + " failed.")
+            ArcGISServerMessages.addError(str(data))
             # Log error
             if (logging == "true") or (sendErrorEmail == "true"):       
                 loggingFunction(logFile,"error","The restore of the ArcGIS Server site " + serverName + " failed.")               
@@ -231,7 +235,7 @@ def restoreSite(serverName, serverPort, protocol, context, token, backupFile, re
                     if ('Import operation completed in ' in message['message'] and message['level'] == 'INFO' and result['source'] == 'SITE') :
                         # Get message operation time
                         restoreOpTime = message['message']
-                        arcpy.AddMessage("ArcGIS Server site has been successfully restored. " + message['message'])
+                        ArcGISServerMessages.addMessage("ArcGIS Server site has been successfully restored. " + message['message'])
                     else:
                         # Append in messages
                         msgList.append(message['message'])  
@@ -256,15 +260,15 @@ def restoreSite(serverName, serverPort, protocol, context, token, backupFile, re
                             reportFile.write("\n\n")
                             count = count + 1
                     reportFile.close()
-                    arcpy.AddMessage("A file with the report from the restore utility has been saved at: " + restoreReport) 
+                    ArcGISServerMessages.addMessage("A file with the report from the restore utility has been saved at: " + restoreReport) 
                 except:
-                    arcpy.AddError("Unable to save the report file at: " + restoreReport + " Please verify this location is available.")
+                    ArcGISServerMessages.addError("Unable to save the report file at: " + restoreReport + " Please verify this location is available.")
                     # Log error
                     if (logging == "true") or (sendErrorEmail == "true"):       
                         loggingFunction(logFile,"error","Unable to save the report file at: " + restoreReport + " Please verify this location is available.")                       
                     return
     else:
-        arcpy.AddError("Please define a ArcGIS Server site backup file.");
+        ArcGISServerMessages.addError("Please define a ArcGIS Server site backup file.");
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Please define a ArcGIS Server site backup file.")        
@@ -281,9 +285,9 @@ def createSite(username, password, serverName, serverPort, protocol):
 
     # Post to the server
     try:
-        response, data = postToServer(serverName, serverPort, protocol, url, params)
+        response, data = postToServer(serverName, serverPort, protocol, url, params, siteOperationTimeout)
     except:
-        arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+        ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")                    
@@ -291,8 +295,8 @@ def createSite(username, password, serverName, serverPort, protocol):
 
     # If there is an error creating the site
     if (response.status != 200):
-        arcpy.AddError("Error creating site.")
-        arcpy.AddError(str(data))
+        ArcGISServerMessages.addError("Error creating site.")
+        ArcGISServerMessages.addError(str(data))
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error creating site.")          
@@ -303,7 +307,7 @@ def createSite(username, password, serverName, serverPort, protocol):
     else: 
         dataObject = json.loads(data)
 
-        arcpy.AddMessage("Site created successfully...")
+        ArcGISServerMessages.addMessage("Site created successfully...")
         return     
 # End of create site function
 
@@ -319,7 +323,7 @@ def registerWebAdaptor(serverName, serverPort, protocol, token):
     try:
         response, data = postToServer(serverName, serverPort, protocol, url, params)
     except:
-        arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+        ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")            
@@ -327,14 +331,14 @@ def registerWebAdaptor(serverName, serverPort, protocol, token):
 
     # If there is an error registering web adaptor
     if (response.status != 200):
-        arcpy.AddError("Error registering web adaptor.")
-        arcpy.AddError(str(data))
+        ArcGISServerMessages.addError("Error registering web adaptor.")
+        ArcGISServerMessages.addError(str(data))
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error registering web adaptor.")          
         return -1
     if (not assertJsonSuccess(data)):
-        arcpy.AddError("Error registering web adaptor. Please check if the server is running and ensure that the username/password provided are correct.")
+        ArcGISServerMessages.addError("Error registering web adaptor. Please check if the server is running and ensure that the username/password provided are correct.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error registering web adaptor. Please check if the server is running and ensure that the username/password provided are correct.")   
@@ -343,13 +347,19 @@ def registerWebAdaptor(serverName, serverPort, protocol, token):
     else: 
         dataObject = json.loads(data)
 
-        arcpy.AddMessage("Web adaptor registered successfully...")
+        ArcGISServerMessages.addMessage("Web adaptor registered successfully...")
         return     
 # End of register web adaptor function
 
 
 # Start of get token function
 def getToken(username, password, serverName, serverPort, protocol):
+    # Use the cached token for the site if it has not expired
+    tokenSite = protocol + "://" + serverName + ":" + str(serverPort)
+    token = ArcGISServerToken.getCachedToken(tokenSite, username, password, "referer:backuputility", tokenCacheFile, lambda: getToken(username, password, serverName, serverPort, protocol))
+    if token:
+        return token
+
     params = urllib.urlencode({'username': username.decode(sys.stdin.encoding or sys.getdefaultencoding()).encode('utf-8'), 'password': password.decode(sys.stdin.encoding or sys.getdefaultencoding()).encode('utf-8'),'client': 'referer','referer':'backuputility','f': 'json'})
            
     # Construct URL to get a token
@@ -358,21 +368,21 @@ def getToken(username, password, serverName, serverPort, protocol):
     try:
         response, data = postToServer(serverName, serverPort, protocol, url, params)
     except:
-        arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+        ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
         return -1    
     # If there is an error getting the token
     if (response.status != 200):
-        arcpy.AddError("Error while generating the token.")
-        arcpy.AddError(str(data))
+        ArcGISServerMessages.addError("Error while generating the token.")
+        ArcGISServerMessages.addError(str(data))
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error while generating the token.")        
         return -1
     if (not assertJsonSuccess(data)):
-        arcpy.AddError("Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
+        ArcGISServerMessages.addError("Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.") 
@@ -384,44 +394,27 @@ def getToken(username, password, serverName, serverPort, protocol):
 
         # Return the token if available
         if "error" in dataObject:
-            arcpy.AddError("Error retrieving token.")
+            ArcGISServerMessages.addError("Error retrieving token.")
             # Log error
             if (logging == "true") or (sendErrorEmail == "true"):       
                 loggingFunction(logFile,"error","Error retrieving token.")             
             return -1        
         else:
+            # Cache the token until it expires
+            ArcGISServerToken.storeToken(tokenSite, username, password, "referer:backuputility", dataObject['token'], dataObject.get('expires'), tokenCacheFile, lambda: getToken(username, password, serverName, serverPort, protocol))
             return dataObject['token']
 # End of get token function
 
 
 # Start of HTTP POST request to the server function
-def postToServer(serverName, serverPort, protocol, url, params):
-    # If on standard port
-    if (serverPort == -1 and protocol == 'http'):
-        serverPort = 80
-
-    # If on secure port
-    if (serverPort == -1 and protocol == 'https'):
-        serverPort = 443
-        
-    if (protocol == 'http'):
-        httpConn = httplib.HTTPConnection(serverName, int(serverPort))
-
-    if (protocol == 'https'):
-        httpConn = httplib.HTTPSConnection(serverName, int(serverPort))
-        
+def postToServer(serverName, serverPort, protocol, url, params, timeout=None):
     headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain",'referer':'backuputility','referrer':'backuputility'}
      
     # URL encode the resource URL
     url = urllib.quote(url.encode('utf-8'))
 
-    # Build the connection to add the roles to the server
-    httpConn.request("POST", url, params, headers) 
-
-    response = httpConn.getresponse()
-    data = response.read()
-
-    httpConn.close()
+    # Post to the server over a pooled connection
+    response, data = ArcGISServerConnection.request(serverName, serverPort, protocol, "POST", url, params, headers, timeout)
 
     # Return response
     return (response, data)
@@ -462,7 +455,7 @@ def splitSiteURL(siteURL):
         # Return variables
         return protocol, serverName, serverPort, context  
     except:
-        arcpy.AddError("The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
+        ArcGISServerMessages.addError("The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
         return None, None, None, None
 # End of split URL function
 
@@ -474,7 +467,7 @@ def assertJsonSuccess(data):
         if ('messages' in obj):
             errMsgs = obj['messages']
             for errMsg in errMsgs:
-                arcpy.AddError(errMsg)
+                ArcGISServerMessages.addError(errMsg)
                 # Log error
                 if (logging == "true") or (sendErrorEmail == "true"):       
                     loggingFunction(logFile,"error",errMsg)                
@@ -510,7 +503,7 @@ def loggingFunction(logFile,result,info):
             f.write("---" + "\n")
     if (result == "error") and (sendErrorEmail == "true"):            
         # Send an email
-        arcpy.AddMessage("Sending email...")
+        ArcGISServerMessages.addMessage("Sending email...")
         # Server and port information
         smtpserver = smtplib.SMTP("smtp.gmail.com",587) 
         smtpserver.ehlo()
@@ -532,7 +525,6 @@ def loggingFunction(logFile,result,info):
 # another script
 if __name__ == '__main__':
     # Arguments are optional - If running from ArcGIS Desktop tool, parameters will be loaded into *argv
-    argv = tuple(arcpy.GetParameterAsText(i)
-        for i in range(arcpy.GetArgumentCount()))
+    argv = ArcGISServerMessages.getParameters()
     mainFunction(*argv)
     
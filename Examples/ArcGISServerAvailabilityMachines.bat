@@ -0,0 +1,9 @@
+REM ----- Check the services on each machine in the ArcGIS Server site -----
+C:\Python27\ArcGIS10.2\python "C:\Development\Projects\ArcGIS Admin Toolkit\ArcGISServerAvailability.py" ^
+ "http://Laptop-SFW:6080/arcgis" ^
+ "siteadmin" ^
+ "adm1n" ^
+ "" ^
+ "" ^
+ "" ^
+ "true"
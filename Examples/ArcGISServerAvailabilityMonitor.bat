@@ -0,0 +1,7 @@
+REM ----- Keep checking ArcGIS Server and services are running every 30 seconds -----
+C:\Python27\ArcGIS10.2\python "C:\Development\Projects\ArcGIS Admin Toolkit\ArcGISServerAvailability.py" ^
+ "http://Laptop-SFW:6080/arcgis" ^
+ "siteadmin" ^
+ "adm1n" ^
+ "" ^
+ "30"
\ No newline at end of file
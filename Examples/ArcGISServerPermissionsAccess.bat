@@ -0,0 +1,7 @@
+REM ----- List the folders and services a role can access, from the index kept by the last permissions audit -----
+C:\Python27\ArcGIS10.2\python "C:\Data\Tools & Scripts\ArcGIS Admin Toolkit\ArcGISServerPermissions.py" ^
+ "http://localhost:6080/arcgis" ^
+ "" ^
+ "" ^
+ "access" ^
+ "editors"
\ No newline at end of file
@@ -0,0 +1,8 @@
+REM ----- Audit the permissions on every folder and service in an ArcGIS Server site -----
+C:\Python27\ArcGIS10.2\python "C:\Data\Tools & Scripts\ArcGIS Admin Toolkit\ArcGISServerPermissions.py" ^
+ "http://localhost:6080/arcgis" ^
+ "siteadmin" ^
+ "adm1n" ^
+ "audit" ^
+ "" ^
+ "C:\Data\Tools & Scripts\ArcGIS Admin Toolkit\ArcGISServerPermissionsBaseline.json"
\ No newline at end of file
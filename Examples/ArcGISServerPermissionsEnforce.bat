@@ -0,0 +1,7 @@
+REM ----- Set the permissions on an ArcGIS Server site to match a desired state file, use "dryrun" to list the changes only -----
+C:\Python27\ArcGIS10.2\python "C:\Data\Tools & Scripts\ArcGIS Admin Toolkit\ArcGISServerPermissions.py" ^
+ "http://localhost:6080/arcgis" ^
+ "siteadmin" ^
+ "adm1n" ^
+ "enforce" ^
+ "C:\Data\Tools & Scripts\ArcGIS Admin Toolkit\DesiredPermissions.json"
\ No newline at end of file
@@ -0,0 +1,2 @@
+REM --- Benchmark the admin toolkit against the local ArcGIS Server stand-in ---
+"C:\PYTHON27\ArcGIS10.2\python.exe" "C:\Data\Development\Esri Projects\ArcGIS Admin Toolkit\ArcGISServerBenchmark.py" 10,1000,10000 0.005 0.01 "C:\Temp\Benchmark.csv"
@@ -10,19 +10,17 @@
 # Python Version:   2.7
 #--------------------------------
 
-# Import modules and enable data to be overwritten
+# Import modules
 import os
 import sys
 import logging
 import smtplib
-import httplib
 import json
 import urllib
 import urlparse
-import arcpy
-
-# Enable data to be overwritten
-arcpy.env.overwriteOutput = True
+import ArcGISServerConnection
+import ArcGISServerToken
+import ArcGISServerMessages
 
 # Set global variables
 enableLogging = "false" # Use logger.info("Example..."), logger.warning("Example..."), logger.error("Example...")
@@ -33,6 +31,7 @@ emailUser = ""
 emailPassword = ""
 emailSubject = ""
 emailMessage = ""
+tokenCacheFile = "" # ArcGISServerToken.defaultCacheFile to keep tokens between runs
 output = None
 
 # Start of main function
@@ -105,9 +104,9 @@ def mainFunction(agsServerSite,username,password,usersCSV): # Get parameters fro
                 count +=1
 
             # Call functions to add users and roles
-            addRoles(roles,token,serverName,serverPort)
-            addUsers(users,token,serverName,serverPort)
-            addUserToRoles(addUserRole,token,serverName,serverPort)
+            addRoles(roles,token,serverName,serverPort,protocol)
+            addUsers(users,token,serverName,serverPort,protocol)
+            addUserToRoles(addUserRole,token,serverName,serverPort,protocol)
             
         # --------------------------------------- End of code --------------------------------------- #  
             
@@ -115,7 +114,7 @@ def mainFunction(agsServerSite,username,password,usersCSV): # Get parameters fro
         if __name__ == '__main__':
             # Return the output if there is any
             if output:
-                arcpy.SetParameterAsText(1, output)
+                ArcGISServerMessages.setParameter(1, output)
         # Otherwise return the result          
         else:
             # Return the output if there is any
@@ -130,10 +129,10 @@ def mainFunction(agsServerSite,username,password,usersCSV): # Get parameters fro
             logger.removeHandler(logMessage)
         pass
     # If arcpy error
-    except arcpy.ExecuteError:           
+    except ArcGISServerMessages.ExecuteError:           
         # Build and show the error message
-        errorMessage = arcpy.GetMessages(2)   
-        arcpy.AddError(errorMessage)           
+        errorMessage = ArcGISServerMessages.getMessages(2)   
+        ArcGISServerMessages.addError(errorMessage)           
         # Logging
         if (enableLogging == "true"):
             # Log error          
@@ -153,7 +152,7 @@ def mainFunction(agsServerSite,username,password,usersCSV): # Get parameters fro
                 errorMessage = str(e.args[i])
             else:
                 errorMessage = errorMessage + " " + str(e.args[i])
-        arcpy.AddError(errorMessage)              
+        ArcGISServerMessages.addError(errorMessage)              
         # Logging
         if (enableLogging == "true"):
             # Log error            
@@ -168,7 +167,7 @@ def mainFunction(agsServerSite,username,password,usersCSV): # Get parameters fro
 
 
 # Start of Add roles to ArcGIS Server function
-def addRoles(roleDict, token, serverName, serverPort):  
+def addRoles(roleDict, token, serverName, serverPort, protocol):  
     for item in roleDict.keys():
         # Build the dictionary with the role name and description
         roleToAdd = {"rolename":item}
@@ -181,26 +180,19 @@ def addRoles(roleDict, token, serverName, serverPort):
         params = urllib.urlencode({'token':token,'f':'json','Role':jsRole})
         headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain"}
 
-        # Build the connection to add the roles to the server
-        httpRoleConn = httplib.HTTPConnection(serverName, serverPort)
-        httpRoleConn.request("POST",addroleURL,params,headers)
+        # Post to the server over a pooled connection to add the roles
+        response, data = ArcGISServerConnection.request(serverName, serverPort, protocol, "POST", addroleURL, params, headers)
 
-        response = httpRoleConn.getresponse()
         if (response.status != 200):
-            httpRoleConn.close()
-            arcpy.AddError("Could not add role...")
+            ArcGISServerMessages.addError("Could not add role...")
             return
         else:
-            data = response.read()
-            
             # Check that data returned is not an error object
             if not assertJsonSuccess(data):          
-                arcpy.AddError("Error when adding role. " + str(data))
+                ArcGISServerMessages.addError("Error when adding role. " + str(data))
                 return
             else:
-                arcpy.AddMessage("Added role successfully...")
-
-        httpRoleConn.close()
+                ArcGISServerMessages.addMessage("Added role successfully...")
 
         # Assign a privilege to the recently added role 
         assignAdminUrl = "/arcgis/admin/security/roles/assignPrivilege"
@@ -208,31 +200,24 @@ def addRoles(roleDict, token, serverName, serverPort):
             
         headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain"}
 
-        # Build the connection to assign the privilege
-        httpRoleAdminConn = httplib.HTTPConnection(serverName, serverPort)
-        httpRoleAdminConn.request("POST",assignAdminUrl,params,headers)
+        # Post to the server over a pooled connection to assign the privilege
+        response, data = ArcGISServerConnection.request(serverName, serverPort, protocol, "POST", assignAdminUrl, params, headers)
 
-        response = httpRoleAdminConn.getresponse()
         if (response.status != 200):
-            httpRoleAdminConn.close()
-            arcpy.AddError("Could not assign privilege to role.")
+            ArcGISServerMessages.addError("Could not assign privilege to role.")
             return
         else:
-            data = response.read()
-            
             # Check that data returned is not an error object
             if not assertJsonSuccess(data):          
-                arcpy.AddError("Error when assigning privileges to role. " + str(data))
+                ArcGISServerMessages.addError("Error when assigning privileges to role. " + str(data))
                 return
             else:
-                arcpy.AddMessage("Assigned privileges to role successfully...")
-
-        httpRoleAdminConn.close()
+                ArcGISServerMessages.addMessage("Assigned privileges to role successfully...")
 # End of Add roles to ArcGIS Server function
 
 
 # Start of Add users to ArcGIS Server function
-def addUsers(userDict,token, serverName, serverPort):
+def addUsers(userDict,token, serverName, serverPort, protocol):
     for userAdd in userDict:
         jsUser = json.dumps(userDict[userAdd])
         
@@ -241,16 +226,13 @@ def addUsers(userDict,token, serverName, serverPort):
         params = urllib.urlencode({'token':token,'f':'json','user':jsUser})
         headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain"}
 
-        # Build the connection to add the users
-        httpRoleConn = httplib.HTTPConnection(serverName, serverPort)
-        httpRoleConn.request("POST",addUserURL,params,headers)
-
-        httpRoleConn.close()
+        # Post to the server over a pooled connection to add the users
+        response, data = ArcGISServerConnection.request(serverName, serverPort, protocol, "POST", addUserURL, params, headers)
 # End of Add roles to ArcGIS Server function
 
 
 # Start of Add user to roles function
-def addUserToRoles(userRoleDict,token, serverName, serverPort):
+def addUserToRoles(userRoleDict,token, serverName, serverPort, protocol):
     for userRole in userRoleDict.keys():
 
         # Using the current role build the URL to assign the right users to the role
@@ -258,31 +240,30 @@ def addUserToRoles(userRoleDict,token, serverName, serverPort):
         params = urllib.urlencode({'token':token,'f':'json',"rolename":userRole,"users":userRoleDict[userRole]})
         headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain"}
     
-        # Build the connection
-        httpRoleConn = httplib.HTTPConnection(serverName, serverPort)
-        httpRoleConn.request("POST",addUserURL,params,headers)
+        # Post to the server over a pooled connection
+        response, data = ArcGISServerConnection.request(serverName, serverPort, protocol, "POST", addUserURL, params, headers)
 
-        response = httpRoleConn.getresponse()
         if (response.status != 200):
-            httpRoleConn.close()
-            arcpy.AddError("Could not add user to role...")
+            ArcGISServerMessages.addError("Could not add user to role...")
             return
         else:
-            data = response.read()
-            
             # Check that data returned is not an error object
             if not assertJsonSuccess(data):          
-                arcpy.AddError("Error when adding user to role. " + str(data))
+                ArcGISServerMessages.addError("Error when adding user to role. " + str(data))
                 return
             else:
-                arcpy.AddMessage("Added user to role successfully...")
-                    
-        httpRoleConn.close()
+                ArcGISServerMessages.addMessage("Added user to role successfully...")
 # End of Add user to roles function
 
         
 # Start of get token function
 def getToken(username, password, serverName, serverPort, protocol):
+    # Use the cached token for the site if it has not expired
+    tokenSite = protocol + "://" + serverName + ":" + str(serverPort)
+    token = ArcGISServerToken.getCachedToken(tokenSite, username, password, "referer:backuputility", tokenCacheFile, lambda: getToken(username, password, serverName, serverPort, protocol))
+    if token:
+        return token
+
     params = urllib.urlencode({'username': username.decode(sys.stdin.encoding or sys.getdefaultencoding()).encode('utf-8'), 'password': password.decode(sys.stdin.encoding or sys.getdefaultencoding()).encode('utf-8'),'client': 'referer','referer':'backuputility','f': 'json'})
            
     # Construct URL to get a token
@@ -291,7 +272,7 @@ def getToken(username, password, serverName, serverPort, protocol):
     try:
         response, data = postToServer(serverName, serverPort, protocol, url, params)
     except:
-        arcpy.AddError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
+        ArcGISServerMessages.addError("Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Unable to connect to the ArcGIS Server site on " + serverName + ". Please check if the server is running.")
@@ -299,15 +280,15 @@ def getToken(username, password, serverName, serverPort, protocol):
         return -1    
     # If there is an error getting the token
     if (response.status != 200):
-        arcpy.AddError("Error while generating the token.")
-        arcpy.AddError(str(data))
+        ArcGISServerMessages.addError("Error while generating the token.")
+        ArcGISServerMessages.addError(str(data))
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error while generating the token.")
             sys.exit()
         return -1
     if (not assertJsonSuccess(data)):
-        arcpy.AddError("Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
+        ArcGISServerMessages.addError("Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","Error while generating the token. Please check if the server is running and ensure that the username/password provided are correct.")
@@ -320,45 +301,28 @@ def getToken(username, password, serverName, serverPort, protocol):
 
         # Return the token if available
         if "error" in dataObject:
-            arcpy.AddError("Error retrieving token.")
+            ArcGISServerMessages.addError("Error retrieving token.")
             # Log error
             if (logging == "true") or (sendErrorEmail == "true"):       
                 loggingFunction(logFile,"error","Error retrieving token.")
                 sys.exit()
             return -1        
         else:
+            # Cache the token until it expires
+            ArcGISServerToken.storeToken(tokenSite, username, password, "referer:backuputility", dataObject['token'], dataObject.get('expires'), tokenCacheFile, lambda: getToken(username, password, serverName, serverPort, protocol))
             return dataObject['token']
 # End of get token function
 
 
 # Start of HTTP POST request to the server function
 def postToServer(serverName, serverPort, protocol, url, params):
-    # If on standard port
-    if (serverPort == -1 and protocol == 'http'):
-        serverPort = 80
-
-    # If on secure port
-    if (serverPort == -1 and protocol == 'https'):
-        serverPort = 443
-        
-    if (protocol == 'http'):
-        httpConn = httplib.HTTPConnection(serverName, int(serverPort))
-
-    if (protocol == 'https'):
-        httpConn = httplib.HTTPSConnection(serverName, int(serverPort))
-        
     headers = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain",'referer':'backuputility','referrer':'backuputility'}
      
     # URL encode the resource URL
     url = urllib.quote(url.encode('utf-8'))
 
-    # Build the connection to add the roles to the server
-    httpConn.request("POST", url, params, headers) 
-
-    response = httpConn.getresponse()
-    data = response.read()
-
-    httpConn.close()
+    # Post to the server over a pooled connection
+    response, data = ArcGISServerConnection.request(serverName, serverPort, protocol, "POST", url, params, headers)
 
     # Return response
     return (response, data)
@@ -399,7 +363,7 @@ def splitSiteURL(siteURL):
         # Return variables
         return protocol, serverName, serverPort, context  
     except:
-        arcpy.AddError("The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
+        ArcGISServerMessages.addError("The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
         # Log error
         if (logging == "true") or (sendErrorEmail == "true"):       
             loggingFunction(logFile,"error","The ArcGIS Server site URL should be in the format http(s)://<host>:<port>/arcgis")
@@ -415,7 +379,7 @@ def assertJsonSuccess(data):
         if ('messages' in obj):
             errMsgs = obj['messages']
             for errMsg in errMsgs:
-                arcpy.AddError(errMsg)
+                ArcGISServerMessages.addError(errMsg)
                 # Log error
                 if (logging == "true") or (sendErrorEmail == "true"):       
                     loggingFunction(logFile,"error",errMsg)
@@ -447,7 +411,7 @@ def setLogging(logFile):
 # Start of send email function
 def sendEmail(message):
     # Send an email
-    arcpy.AddMessage("Sending email...")
+    ArcGISServerMessages.addMessage("Sending email...")
     # Server and port information
     smtpServer = smtplib.SMTP("smtp.gmail.com",587) 
     smtpServer.ehlo()
@@ -468,7 +432,6 @@ def sendEmail(message):
 # another script
 if __name__ == '__main__':
     # Arguments are optional - If running from ArcGIS Desktop tool, parameters will be loaded into *argv
-    argv = tuple(arcpy.GetParameterAsText(i)
-        for i in range(arcpy.GetArgumentCount()))
+    argv = ArcGISServerMessages.getParameters()
     mainFunction(*argv)
     
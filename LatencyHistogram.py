@@ -0,0 +1,95 @@
+#-------------------------------------------------------------
+# Name:       Latency Histogram
+# Purpose:    Fixed-bucket log histogram used to keep latency statistics in bounded memory.
+#             Buckets grow by a fixed factor so percentiles are accurate to within a few percent,
+#             and histograms from separate runs can be merged by adding bucket counts.
+#             Histograms are plain dictionaries so they can be saved as JSON.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import math
+
+# Set variables
+# Upper bound of the first bucket in seconds, and the factor each bucket grows by
+minimumSeconds = 0.001
+bucketGrowth = 1.1
+# Number of buckets, anything slower than the last bucket (about an hour) is counted in it
+bucketCount = 160
+
+
+# Start of new histogram function
+def newHistogram():
+    # Bucket counts are keyed by the bucket index as a string so the histogram can be saved as JSON
+    return {'count': 0, 'total': 0.0, 'max': 0.0, 'buckets': {}}
+# End of new histogram function
+
+
+# Start of get bucket function
+def getBucket(seconds):
+    if (seconds <= minimumSeconds):
+        return 0
+    return min(bucketCount - 1, int(math.ceil(math.log(seconds / minimumSeconds, bucketGrowth))))
+# End of get bucket function
+
+
+# Start of get bucket bounds function
+def getBucketBounds(bucket):
+    if (bucket == 0):
+        return 0.0, minimumSeconds
+    return minimumSeconds * (bucketGrowth ** (bucket - 1)), minimumSeconds * (bucketGrowth ** bucket)
+# End of get bucket bounds function
+
+
+# Start of add value function
+def addValue(histogram, seconds):
+    bucket = str(getBucket(seconds))
+    histogram['buckets'][bucket] = histogram['buckets'].get(bucket, 0) + 1
+    histogram['count'] += 1
+    histogram['total'] += seconds
+    histogram['max'] = max(histogram['max'], seconds)
+# End of add value function
+
+
+# Start of merge histograms function
+def mergeHistograms(histogram, otherHistogram):
+    for bucket, count in otherHistogram['buckets'].items():
+        histogram['buckets'][bucket] = histogram['buckets'].get(bucket, 0) + count
+    histogram['count'] += otherHistogram['count']
+    histogram['total'] += otherHistogram['total']
+    histogram['max'] = max(histogram['max'], otherHistogram['max'])
+    return histogram
+# End of merge histograms function
+
+
+# Start of get percentile function
+def getPercentile(histogram, percent):
+    if (histogram['count'] == 0):
+        return 0.0
+    # Find the bucket holding the value at the percentile rank
+    rank = max(1, int(math.ceil((percent / 100.0) * histogram['count'])))
+    runningCount = 0
+    for bucket in sorted(int(bucket) for bucket in histogram['buckets']):
+        runningCount += histogram['buckets'][str(bucket)]
+        if (runningCount >= rank):
+            lowerBound, upperBound = getBucketBounds(bucket)
+            # Use the middle of the bucket, but never more than the slowest value seen
+            return min(histogram['max'], (lowerBound + upperBound) / 2)
+    return histogram['max']
+# End of get percentile function
+
+
+# Start of get buckets function
+def getBuckets(histogram):
+    # Return a list of (lower seconds, upper seconds, count) for the buckets with values in them
+    buckets = []
+    for bucket in sorted(int(bucket) for bucket in histogram['buckets']):
+        lowerBound, upperBound = getBucketBounds(bucket)
+        buckets.append((lowerBound, upperBound, histogram['buckets'][str(bucket)]))
+    return buckets
+# End of get buckets function
@@ -0,0 +1,154 @@
+#-------------------------------------------------------------
+# Name:       Permission Index
+# Purpose:    Index from each principal (user or role) to the folders and services it can access on an
+#             ArcGIS Server site, built from the permissions read by the permissions audit. A folder or
+#             service with no permissions of its own inherits them from its folder, and a folder from
+#             the root, so grants on a folder are indexed against every service that inherits them.
+#             The index is updated for the resources that changed since it was built rather than being
+#             built again, and questions like "what can this role access" are answered from it locally.
+#             Also works out the effective permissions on each service, and which services have permissions
+#             of their own that override the ones on their folder.
+#             Indexes are plain dictionaries so they can be saved as JSON.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import PermissionSnapshot
+
+# Set variables
+# Principal that gives everyone access, including anonymous users
+publicPrincipal = "esriEveryone"
+
+
+# Start of get parent resource function
+def getParentResource(resource):
+    # Services inherit from their folder, folders and services in the root folder from the root ("/")
+    if (resource == "/"):
+        return None
+    folder = PermissionSnapshot.getResourceFolder(resource)
+    if (folder == resource):
+        return "/"
+    return folder
+# End of get parent resource function
+
+
+# Start of get permission source function
+def getPermissionSource(permissionMatrix, resource):
+    # The resource the permissions come from, the first of the resource and its parents that has permissions of its own
+    source = resource
+    while (source is not None) and (len(permissionMatrix.get(source, {})) == 0):
+        source = getParentResource(source)
+    return source
+# End of get permission source function
+
+
+# Start of build index function
+# permissionMatrix is {resource: {principal: isAllowed}}. Returns {'resources': {resource: {principal: source}},
+# 'principals': {principal: {resource: source}}, 'snapshot': snapshot of the permissions}, where source is the
+# resource the grant is on, i.e. the resource itself or the folder or root it is inherited from
+def buildIndex(permissionMatrix, snapshot=None):
+    index = {'resources': {}, 'principals': {}, 'snapshot': snapshot or PermissionSnapshot.createSnapshot(permissionMatrix)}
+    for resource in permissionMatrix:
+        indexResource(index, permissionMatrix, resource)
+    return index
+# End of build index function
+
+
+# Start of update index function
+# Updates the index for the resources that have changed since it was built. Returns the resources indexed again
+def updateIndex(index, permissionMatrix, snapshot=None):
+    if (snapshot is None):
+        snapshot = PermissionSnapshot.createSnapshot(permissionMatrix)
+    changedFolders, changedResources = PermissionSnapshot.getChangedResources(index['snapshot'], snapshot)
+    if (len(changedResources) == 0):
+        return []
+
+    # A change to a folder or the root also changes what the resources inheriting from it can be accessed by
+    updateResources = set(changedResources)
+    if ("/" in updateResources):
+        updateResources.update(index['resources'])
+        updateResources.update(permissionMatrix)
+    for resource in changedResources:
+        if (resource != "/") and (PermissionSnapshot.getResourceFolder(resource) == resource):
+            updateResources.update(index['snapshot']['resources'].get(resource, {}))
+            updateResources.update(snapshot['resources'].get(resource, {}))
+
+    for resource in updateResources:
+        unindexResource(index, resource)
+        if resource in permissionMatrix:
+            indexResource(index, permissionMatrix, resource)
+    index['snapshot'] = snapshot
+    return sorted(updateResources)
+# End of update index function
+
+
+# Start of index resource function
+def indexResource(index, permissionMatrix, resource):
+    source = getPermissionSource(permissionMatrix, resource)
+    # Denied permissions don't give access
+    principals = dict((principal, source) for principal, isAllowed in permissionMatrix.get(source, {}).items() if isAllowed)
+    index['resources'][resource] = principals
+    for principal in principals:
+        index['principals'].setdefault(principal, {})[resource] = source
+# End of index resource function
+
+
+# Start of unindex resource function
+def unindexResource(index, resource):
+    for principal in index['resources'].pop(resource, {}):
+        principalResources = index['principals'].get(principal, {})
+        principalResources.pop(resource, None)
+        if (len(principalResources) == 0):
+            index['principals'].pop(principal, None)
+# End of unindex resource function
+
+
+# Start of get resources function
+# Returns {resource: source} for the folders and services the principal can access, source being where the grant is
+def getResources(index, principal):
+    return dict(index['principals'].get(principal, {}))
+# End of get resources function
+
+
+# Start of get principals function
+# Returns {principal: source} for the principals that can access the folder or service
+def getPrincipals(index, resource):
+    return dict(index['resources'].get(resource, {}))
+# End of get principals function
+
+
+# Start of get public resources function
+def getPublicResources(index):
+    return getResources(index, publicPrincipal)
+# End of get public resources function
+
+
+# Start of get effective permissions function
+# Returns the resource the permissions on a folder or service come from and its {principal: isAllowed}
+def getEffectivePermissions(permissionMatrix, resource):
+    source = getPermissionSource(permissionMatrix, resource)
+    return source, dict(permissionMatrix.get(source, {}))
+# End of get effective permissions function
+
+
+# Start of get overrides function
+# Returns (resource, parent source, {principal: isAllowed} added, {principal: isAllowed} removed) for every folder or service
+# whose own permissions differ from the ones it would inherit. Principals added include ones changed between allowed and denied
+def getOverrides(permissionMatrix):
+    overrides = []
+    for resource in sorted(permissionMatrix):
+        principals = permissionMatrix[resource]
+        if (resource == "/") or (len(principals) == 0):
+            continue
+        parentSource, parentPrincipals = getEffectivePermissions(permissionMatrix, getParentResource(resource))
+        if (principals != parentPrincipals):
+            overrides.append((resource, parentSource,
+                              dict((principal, isAllowed) for principal, isAllowed in principals.items() if parentPrincipals.get(principal) != isAllowed),
+                              dict((principal, isAllowed) for principal, isAllowed in parentPrincipals.items() if principal not in principals)))
+    return overrides
+# End of get overrides function
@@ -0,0 +1,167 @@
+#-------------------------------------------------------------
+# Name:       Permission Snapshot
+# Purpose:    Hashed snapshots of the permissions on an ArcGIS Server site, used by the permissions
+#             audit. Each folder or service has a hash of its permissions, each folder a digest of
+#             the hashes in it and the site a root digest of the folder digests, so two snapshots
+#             that match are compared with one digest and only the folders whose digest moved are
+#             expanded. History is kept as a file of deltas from one audit to the next.
+#             Snapshots are plain dictionaries so they can be saved as JSON.
+# Author:     Eagle Technology
+# Date Created:    18/10/2026
+# Last Updated:    18/10/2026
+# Copyright:   (c) Eagle Technology
+# ArcGIS Version:   10.1+
+# Python Version:   2.7
+#--------------------------------
+
+# Import modules
+import os
+import json
+import hashlib
+
+# Set variables
+# Deltas kept in a history file, older deltas are folded into the first full copy of the permissions
+maxHistoryDeltas = 1000
+
+
+# Start of get resource folder function
+def getResourceFolder(resource):
+    # The root permissions ("/") and services in the root folder ("Service.MapServer") are in the root folder "/",
+    # a folder's own permissions ("Folder") and its services ("Folder/Service.MapServer") are in that folder.
+    # Folder names can't contain a full stop, so a resource with one and no slash is a root service
+    if ("/" in resource.strip("/")):
+        return resource.split("/")[0]
+    if (resource == "/") or ("." in resource):
+        return "/"
+    return resource
+# End of get resource folder function
+
+
+# Start of hash permissions function
+def hashPermissions(principals):
+    # principals is {principal: isAllowed}, hashed in principal order so the same permissions always hash the same
+    return hashlib.sha1(json.dumps(sorted(principals.items()), separators=(",", ":")).encode("utf-8")).hexdigest()
+# End of hash permissions function
+
+
+# Start of hash digests function
+def hashDigests(digests):
+    return hashlib.sha1("\n".join(name + " " + digest for name, digest in sorted(digests.items())).encode("utf-8")).hexdigest()
+# End of hash digests function
+
+
+# Start of create snapshot function
+# permissionMatrix is {resource: {principal: isAllowed}}. Returns {'root': digest, 'folders': {folder: digest},
+# 'resources': {folder: {resource: hash}}}
+def createSnapshot(permissionMatrix):
+    resourceHashes = {}
+    for resource, principals in permissionMatrix.items():
+        resourceHashes.setdefault(getResourceFolder(resource), {})[resource] = hashPermissions(principals)
+    folderDigests = dict((folder, hashDigests(hashes)) for folder, hashes in resourceHashes.items())
+    return {'root': hashDigests(folderDigests), 'folders': folderDigests, 'resources': resourceHashes}
+# End of create snapshot function
+
+
+# Start of get changed resources function
+# Returns the folders whose digest changed and the resources in them whose hash changed, added or removed
+# resources included. Nothing past the root digest is compared if it matches
+def getChangedResources(previousSnapshot, snapshot):
+    if (previousSnapshot['root'] == snapshot['root']):
+        return [], []
+    changedFolders = sorted(folder for folder in set(previousSnapshot['folders']) | set(snapshot['folders'])
+                            if previousSnapshot['folders'].get(folder) != snapshot['folders'].get(folder))
+    changedResources = []
+    for folder in changedFolders:
+        previousHashes = previousSnapshot['resources'].get(folder, {})
+        hashes = snapshot['resources'].get(folder, {})
+        changedResources.extend(sorted(resource for resource in set(previousHashes) | set(hashes)
+                                       if previousHashes.get(resource) != hashes.get(resource)))
+    return changedFolders, changedResources
+# End of get changed resources function
+
+
+# Start of read history function
+# Returns the latest audit in the history file, or the latest at or before atTime, as {'time': time, 'root': digest,
+# 'permissions': {resource: {principal: isAllowed}}, 'deltas': number of deltas read}. Returns None if there is no history
+def readHistory(historyFile, atTime=None):
+    history = None
+    try:
+        with open(historyFile, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if (atTime is not None) and (entry['time'] > atTime):
+                    break
+                if (history is None):
+                    # The first line is a full copy of the permissions
+                    history = entry
+                    history['deltas'] = 0
+                    continue
+                history['permissions'].update(entry['permissions'])
+                for resource in entry.get('removed', []):
+                    history['permissions'].pop(resource, None)
+                history['time'] = entry['time']
+                history['root'] = entry['root']
+                history['deltas'] += 1
+    except (IOError, OSError):
+        pass
+    return history
+# End of read history function
+
+
+# Start of append history function
+# Adds the permissions from an audit to the history file as the changes since the previous audit. Returns the
+# resources that changed since then, or None if there was no history
+def appendHistory(historyFile, permissionMatrix, auditTime, snapshot=None):
+    if (snapshot is None):
+        snapshot = createSnapshot(permissionMatrix)
+    history = readHistory(historyFile)
+    if (history is None):
+        writeHistory(historyFile, [{'time': auditTime, 'root': snapshot['root'], 'permissions': permissionMatrix}])
+        return None
+    # Nothing more to compare or write if the root digest has not moved
+    if (history['root'] == snapshot['root']):
+        return []
+
+    changedFolders, changedResources = getChangedResources(createSnapshot(history['permissions']), snapshot)
+    delta = {'time': auditTime, 'root': snapshot['root'],
+             'permissions': dict((resource, permissionMatrix[resource]) for resource in changedResources if resource in permissionMatrix),
+             'removed': [resource for resource in changedResources if resource not in permissionMatrix]}
+
+    # Fold the oldest deltas into the first full copy once there are too many
+    if (history['deltas'] >= maxHistoryDeltas):
+        compactHistory(historyFile, maxHistoryDeltas // 2)
+    with open(historyFile, "a") as f:
+        f.write(json.dumps(delta, sort_keys=True) + "\n")
+    return changedResources
+# End of append history function
+
+
+# Start of compact history function
+def compactHistory(historyFile, keepDeltas):
+    with open(historyFile, "r") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    foldCount = max(0, len(entries) - 1 - keepDeltas)
+    firstEntry = entries[0]
+    for entry in entries[1:1 + foldCount]:
+        firstEntry['permissions'].update(entry['permissions'])
+        for resource in entry.get('removed', []):
+            firstEntry['permissions'].pop(resource, None)
+        firstEntry['time'] = entry['time']
+        firstEntry['root'] = entry['root']
+    writeHistory(historyFile, [firstEntry] + entries[1 + foldCount:])
+# End of compact history function
+
+
+# Start of write history function
+def writeHistory(historyFile, entries):
+    # Write to a temporary file first so the history is never left half written
+    tempFile = historyFile + ".tmp"
+    with open(tempFile, "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, sort_keys=True) + "\n")
+    if (os.name == "nt") and os.path.exists(historyFile):
+        os.remove(historyFile)
+    os.rename(tempFile, historyFile)
+# End of write history function